@@ -1,14 +1,30 @@
 import os
 import sqlite3
-import pandas as pd
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from datetime import datetime
 from pydantic import BaseModel
-from google import genai
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
 
 # Configuration
 BOT_DB = "crypto_bot.db"
+GEMINI_MODEL = "gemini-flash-latest"
+SIGNAL_LOOKBACK = 240        # Ticks summarized for get_trading_signal (~4h of 1-minute ticks)
+FALLBACK_POINTS = 12         # Ticks the local fallback compares (its original 1-hour window)
+PROMPT_CANDLES = 48          # Candles in the prompt before the token budget trims them
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", 600))
+LLM_DEADLINE = float(os.getenv("LLM_DEADLINE_SECONDS", 8))  # Past this the local signal is returned instead
+LLM_WORKERS = 8
+
+# Gemini calls run here so the caller can stop waiting at LLM_DEADLINE
+_llm_pool = ThreadPoolExecutor(LLM_WORKERS, thread_name_prefix="gemini")
+
+# One genai client per API key, reused across calls and Streamlit reruns.
+# google-genai itself is only imported when the first client is built.
+_clients = {}
 
 # Define Pydantic model for structured output
 class TradingSignal(BaseModel):
@@ -16,77 +32,222 @@ class TradingSignal(BaseModel):
     confidence: int
     reasoning: str
 
-def fetch_recent_history(coin_symbol):
+def _ring_window(coin_symbol, n):
+    """Latest `n` (ts, price, volume) views from the collector's shared-memory ring, or None to use SQLite."""
+    import tick_ring
+    ring = tick_ring.get_ring()
+    if ring is None:
+        return None
+    window = ring.window(coin_symbol, n)
+    if window is None or len(window[0]) < n:
+        return None
+    return window
+
+def _local_datetimes(ts):
+    """Epoch seconds -> naive local datetime64 (what SQLite's 'localtime' modifier yields)."""
+    import numpy as np
+    first, last = time.localtime(int(ts[0])).tm_gmtoff, time.localtime(int(ts[-1])).tm_gmtoff
+    if first == last:
+        return (ts + first).astype("datetime64[s]").astype("datetime64[ns]")
+    # The window spans a DST change: convert tick by tick
+    return np.array([datetime.fromtimestamp(t) for t in ts.tolist()], dtype="datetime64[ns]")
+
+def fetch_recent_history(coin_symbol, limit=12):
     """
-    Queries the SQLite price_history table and returns the last 12 entries (1 hour of data).
+    Returns the last `limit` entries (12 = the original 1 hour of data), from the
+    collector's shared-memory tick ring when it holds them, else from the SQLite ticks table.
     """
+    window = _ring_window(coin_symbol, limit)
+    if window is not None:
+        ts, prices, _ = window
+        return [{"price_usd": float(p), "timestamp": datetime.fromtimestamp(int(t)).strftime("%Y-%m-%d %H:%M:%S")}
+                for t, p in zip(ts, prices)]
     try:
         conn = sqlite3.connect(BOT_DB)
+        conn.row_factory = sqlite3.Row
         # We assume coin_symbol is stored in uppercase as per data_collector.py
         query = """
-            SELECT price_usd, timestamp 
-            FROM price_history 
-            WHERE coin_symbol = ? 
-            ORDER BY timestamp DESC 
-            LIMIT 12
+            SELECT t.price AS price_usd, datetime(t.ts, 'unixepoch', 'localtime') AS timestamp
+            FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+            WHERE c.symbol = ?
+            ORDER BY t.ts DESC
+            LIMIT ?
         """
-        df = pd.read_sql_query(query, conn, params=(coin_symbol.upper(),))
+        rows = conn.execute(query, (coin_symbol.upper(), limit)).fetchall()
         conn.close()
-        
-        if df.empty:
-            return []
             
         # Return in chronological order (oldest to newest)
-        return df.iloc[::-1].to_dict('records')
+        return [dict(row) for row in reversed(rows)]
     except Exception as e:
         print(f"Database error: {e}")
         return []
 
-def get_trading_signal(coin_symbol):
+def load_price_history(coin_symbol, limit=100):
     """
-    Analyzes the last 1 hour of price data using Gemini.
+    Returns the last `limit` local prices for a symbol as a chronological
+    DataFrame with `timestamp` (datetime) and `price` columns. Used by the dashboard charts.
     """
-    history = fetch_recent_history(coin_symbol)
-    
-    if not history:
-        return {"error": f"No recent price history found for {coin_symbol} in {BOT_DB}."}
-
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        return {"error": "API Key not found in environment variables."}
-
-    client = genai.Client(api_key=api_key)
-    
-    # Format history for the prompt
-    history_str = "\n".join([f"{item['timestamp']}: ${item['price_usd']:,.2f}" for item in history])
-    
-    prompt = f"""
-    Analyze the following 1-hour price trend for {coin_symbol}:
-    {history_str}
-
-    Is the price stabilizing, crashing, or pumping? 
-    Return a trading decision.
-    
-    Strictly return a JSON object with:
-    'action' (BUY/SELL/HOLD),
-    'confidence' (0-100),
-    'reasoning' (Brief explanation of the trend).
+    import pandas as pd
+    window = _ring_window(coin_symbol, limit)
+    if window is not None:
+        ts, prices, _ = window
+        return pd.DataFrame({"timestamp": _local_datetimes(ts), "price": prices})
+    conn = sqlite3.connect(BOT_DB)
+    query = """
+        SELECT datetime(t.ts, 'unixepoch', 'localtime') AS timestamp, t.price AS price
+        FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+        WHERE c.symbol = ?
+        ORDER BY t.ts DESC
+        LIMIT ?
     """
+    df = pd.read_sql_query(query, conn, params=(coin_symbol.upper(), limit))
+    conn.close()
+    if not df.empty:
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+    return df.iloc[::-1]
+
+def _get_client(api_key):
+    """Returns a cached genai client for the given key (created on first use)."""
+    client = _clients.get(api_key)
+    metrics.record_cache("genai_client", client is not None)
+    if client is None:
+        from google import genai
+        # HTTP timeout (ms) so a call abandoned at the deadline does not linger
+        client = genai.Client(api_key=api_key, http_options={"timeout": int(LLM_DEADLINE * 1000)})
+        _clients[api_key] = client
+    return client
 
+def _generate(client, prompt):
+    """Runs a structured Gemini call and records its latency and outcome."""
+    started = time.perf_counter()
+    outcome = "error"
     try:
         response = client.models.generate_content(
-            model='gemini-flash-latest',
+            model=GEMINI_MODEL,
             contents=prompt,
             config={
                 'response_mime_type': 'application/json',
                 'response_schema': TradingSignal,
             }
         )
+        outcome = "ok"
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None and usage.prompt_token_count:
+            metrics.LLM_PROMPT_TOKENS.observe(usage.prompt_token_count, source="billed")
+        return response
+    except Exception as e:
+        if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
+            outcome = "quota"
+        raise
+    finally:
+        metrics.LLM_LATENCY.observe(time.perf_counter() - started, model=GEMINI_MODEL, outcome=outcome)
+        metrics.LLM_REQUESTS.inc(outcome=outcome)
+
+def estimate_tokens(text):
+    """Rough prompt token count (numbers and separators tokenize at about 3 characters per token)."""
+    return len(text) // 3 + 1
+
+def _bps(values, base):
+    """Prices as whole basis points relative to `base`."""
+    import numpy as np
+    return np.rint((values / base - 1) * 1e4).astype(int)
+
+def _candles(prices, count):
+    """Downsamples prices into `count` o/h/l/c candles, each in bps of the first price (one-tick candles as one value)."""
+    import numpy as np
+    starts = np.unique(np.linspace(0, len(prices), count + 1).astype(int)[:-1])
+    ends = np.append(starts[1:], len(prices)) - 1
+    base = prices[0]
+    o, c = _bps(prices[starts], base), _bps(prices[ends], base)
+    h = _bps(np.maximum.reduceat(prices, starts), base)
+    l = _bps(np.minimum.reduceat(prices, starts), base)
+    return " ".join(f"{e}" if s == t else f"{a}/{b}/{d}/{e}" for s, t, a, b, d, e in zip(starts, ends, o, h, l, c))
+
+def _indicators(prices):
+    """Indicator summary of the window; each only when there are enough ticks for it."""
+    import numpy as np
+    base = prices[0]
+    returns = np.diff(prices) / prices[:-1]
+    parts = [f"change {_bps(prices[-1:], base)[0]:+d}bp",
+             f"range {_bps(prices.max(), prices.min()):d}bp",
+             f"max drawdown {_bps((prices / np.maximum.accumulate(prices)).min(), 1.0):d}bp"]
+    if len(returns) >= 2:
+        parts.append(f"tick vol {returns.std() * 1e4:.1f}bp")
+    if len(returns) >= 14:
+        moves = returns[-14:]
+        gain, loss = moves[moves > 0].sum(), -moves[moves < 0].sum()
+        parts.append(f"RSI14 {100 * gain / (gain + loss) if gain + loss else 50:.0f}")
+    if len(prices) >= 60:
+        parts.append(f"SMA20/SMA60 {(prices[-20:].mean() / prices[-60:].mean() - 1) * 100:+.2f}%")
+    if len(prices) >= FALLBACK_POINTS:
+        parts.append(f"last {FALLBACK_POINTS} ticks {_bps(prices[-1:], prices[-FALLBACK_POINTS])[0]:+d}bp")
+    return ", ".join(parts)
+
+def build_signal_prompt(coin_symbol, history, budget=None):
+    """
+    Compact prompt for `history` (fetch_recent_history rows): downsampled
+    candles and indicators as basis points relative to the first price,
+    instead of one timestamped line per tick. Candles are halved until the
+    prompt fits `budget` tokens (dropped entirely if even 6 do not fit).
+    Returns (prompt, estimated_tokens).
+    """
+    import numpy as np
+    budget = budget or PROMPT_TOKEN_BUDGET
+    prices = np.array([item['price_usd'] for item in history], dtype=np.float64)
+    start, end = datetime.fromisoformat(history[0]['timestamp']), datetime.fromisoformat(history[-1]['timestamp'])
+    minutes = max((end - start).total_seconds() / 60, 1)
+    span = f"{minutes / 60:.1f}h" if minutes >= 120 else f"{minutes:.0f}min"
+    header = (f"{coin_symbol}: {len(prices)} ticks over {span} to {end:%H:%M}, "
+              f"first ${prices[0]:,.8g}, last ${prices[-1]:,.8g}. Values are basis points (bp) vs the first price.\n"
+              f"Indicators: {_indicators(prices)}.\n")
+    footer = ("Is the price stabilizing, crashing, or pumping? Return a trading decision as JSON: "
+              "'action' (BUY/SELL/HOLD), 'confidence' (0-100), 'reasoning' (brief explanation of the trend).")
+    count = min(PROMPT_CANDLES, len(prices))
+    while True:
+        candles = f"Candles o/h/l/c (single tick: close), {count} x {minutes / count:.0f}min: {_candles(prices, count)}\n" if count >= 6 else ""
+        prompt = header + candles + footer
+        tokens = estimate_tokens(prompt)
+        if tokens <= budget or not candles:
+            return prompt, tokens
+        count //= 2
+
+def _generate_within(client, prompt, deadline):
+    """_generate, but raises FutureTimeout once `deadline` seconds pass (the call finishes in the background)."""
+    return _llm_pool.submit(_generate, client, prompt).result(timeout=deadline)
+
+def get_trading_signal(coin_symbol, deadline=None):
+    """
+    Analyzes the last SIGNAL_LOOKBACK ticks using Gemini. Falls back to the
+    local technical signal when the quota is hit or no answer arrives by the deadline.
+    """
+    history = fetch_recent_history(coin_symbol, SIGNAL_LOOKBACK)
+
+    if not history:
+        return {"error": f"No recent price history found for {coin_symbol} in {BOT_DB}."}
+
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key:
+        return {"error": "API Key not found in environment variables."}
+
+    client = _get_client(api_key)
+    prompt, tokens = build_signal_prompt(coin_symbol, history)
+    metrics.LLM_PROMPT_TOKENS.observe(tokens, source="estimated")
+    metrics.LLM_CONTEXT_TICKS.inc(len(history))
+
+    try:
+        response = _generate_within(client, prompt, deadline or LLM_DEADLINE)
+        metrics.LLM_SIGNALS.inc(source="gemini")
         return response.parsed
+    except FutureTimeout:
+        # The call itself is still counted once in LLM_REQUESTS when it finishes
+        metrics.LLM_SIGNALS.inc(source="timeout_fallback")
+        return local_technical_fallback(history[-FALLBACK_POINTS:], coin_symbol)
     except Exception as e:
         if "429" in str(e) or "RESOURCE_EXHAUSTED" in str(e):
             # Quota hit - return a local technical fallback
-            return local_technical_fallback(history, coin_symbol)
+            metrics.LLM_SIGNALS.inc(source="quota_fallback")
+            return local_technical_fallback(history[-FALLBACK_POINTS:], coin_symbol)
+        metrics.LLM_SIGNALS.inc(source="error")
         return {"error": f"AI Signal Error: {str(e)}"}
 
 def local_technical_fallback(history, coin_symbol):
@@ -121,7 +282,7 @@ def analyze_market(price, change_24h, risk_tolerance):
     but now internally uses the structured TradingSignal schema.
     """
     api_key = os.getenv("GEMINI_API_KEY")
-    client = genai.Client(api_key=api_key)
+    client = _get_client(api_key)
     
     prompt = f"""
     Market Data:
@@ -133,14 +294,7 @@ def analyze_market(price, change_24h, risk_tolerance):
     """
 
     try:
-        response = client.models.generate_content(
-            model='gemini-flash-latest',
-            contents=prompt,
-            config={
-                'response_mime_type': 'application/json',
-                'response_schema': TradingSignal,
-            }
-        )
+        response = _generate(client, prompt)
         # Adapt matching for legacy 'decision' field if needed by the app
         res = response.parsed
         return res
@@ -0,0 +1,407 @@
+import argparse
+import bisect
+import heapq
+import itertools
+import sqlite3
+import time
+import metrics
+import database_manager
+from db_writer import execute_write
+
+# Configuration
+BOT_DB = "crypto_bot.db"
+SYNC_INTERVAL = 1.0        # Seconds between incremental rule syncs from trades.db
+POSITION_REFRESH = 30.0    # Seconds between re-reads of the positions PNL rules watch
+ALERT_COOLDOWN = 300       # Seconds before a repeating rule may fire again
+REARM_BAND = 0.001         # A repeating rule re-arms once the signal is back 0.1% inside its threshold
+MAX_MOVE_WINDOW = 1440     # Minutes of per-coin price history kept for MOVE rules
+GC_RATIO = 0.5             # Rebuild an index once more than half its entries are dead
+
+EVAL_LATENCY = metrics.REGISTRY.histogram(
+    "alert_engine_eval_seconds", "Rule evaluation time per tick.",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01))
+ALERTS_FIRED = metrics.REGISTRY.counter("alert_engine_fired_total", "Alert events recorded, per kind.")
+ALERTS_SUPPRESSED = metrics.REGISTRY.counter(
+    "alert_engine_suppressed_total", "Firings dropped as duplicates (same rule twice, or inside the cooldown).")
+ACTIVE_RULES = metrics.REGISTRY.gauge("alert_engine_active_rules", "Alert rules held in the indexes.")
+
+
+class Rule:
+    __slots__ = ("id", "account_id", "symbol", "kind", "threshold", "window", "position_id", "repeating",
+                 "level", "avg_price", "leverage", "last_fired")
+
+    def __init__(self, id, account_id, symbol, kind, threshold, window=None, position_id=None, repeating=False,
+                 avg_price=None, leverage=None, last_fired=None):
+        self.id = id
+        self.account_id = account_id
+        self.symbol = symbol
+        self.kind = kind
+        self.threshold = threshold
+        self.window = window
+        self.position_id = position_id
+        self.repeating = bool(repeating)
+        self.avg_price = avg_price
+        self.leverage = leverage or 1
+        self.last_fired = last_fired or 0
+        self.level = self._level()
+
+    def _level(self):
+        """The value of the rule's signal (price, or % move) at which it fires."""
+        if self.kind == "PNL":
+            if not self.avg_price:
+                return None
+            # Long position: pnl% = (price / entry - 1) * 100 * leverage
+            return self.avg_price * (1 + self.threshold / (100 * self.leverage))
+        return self.threshold
+
+    @property
+    def upward(self):
+        if self.kind in ("ABOVE", "BELOW"):
+            return self.kind == "ABOVE"
+        return self.threshold >= 0
+
+    def message(self, price, value):
+        if self.kind == "MOVE":
+            return f"{self.symbol} moved {value:+.2f}% in {self.window}m (now ${price:,.8g})"
+        if self.kind == "PNL":
+            pnl = (price / self.avg_price - 1) * 100 * self.leverage
+            return f"{self.symbol} position #{self.position_id} P&L {pnl:+.1f}% ({self.leverage}x, alert at {self.threshold:+.1f}%)"
+        return f"{self.symbol} {'above' if self.kind == 'ABOVE' else 'below'} ${self.threshold:,.8g} (now ${price:,.8g})"
+
+
+class ThresholdIndex:
+    """
+    Rules on one scalar signal (a coin's price, or its % move over one
+    window), in four heaps keyed so each top is the next rule the signal
+    would reach:
+      up          fires when value >= level          -> min-heap on level
+      down        fires when value <= level          -> max-heap on level
+      up_rearm    fired repeating rules, re-armed when the value drops back  -> max-heap
+      down_rearm  fired repeating rules, re-armed when the value climbs back -> min-heap
+    A tick pops only what it crosses, so its cost is O((fired + 1) log n).
+    Entries of deleted or recompiled rules are dropped lazily at the top.
+    """
+
+    # Heap name -> sign: entries are (sign * level, seq, rule)
+    HEAPS = {"up": 1, "down": -1, "up_rearm": -1, "down_rearm": 1}
+
+    def __init__(self):
+        self.up = []
+        self.down = []
+        self.up_rearm = []
+        self.down_rearm = []
+        self.dead = 0
+
+    def push(self, name, level, seq, rule):
+        heapq.heappush(getattr(self, name), (self.HEAPS[name] * level, seq, rule))
+
+    def compact(self, live):
+        for name in self.HEAPS:
+            heap = [entry for entry in getattr(self, name) if live.get(entry[2].id) is entry[2]]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self.dead = 0
+
+    def size(self):
+        return len(self.up) + len(self.down) + len(self.up_rearm) + len(self.down_rearm)
+
+
+class CoinAlerts:
+    """Per-coin indexes: one on the price (ABOVE/BELOW/PNL), one per MOVE window, plus recent prices for MOVE."""
+
+    def __init__(self):
+        self.price = ThresholdIndex()
+        self.moves = {}
+        self.last_ts = 0
+        self.seeded = False
+        self.history_ts = []
+        self.history_price = []
+
+    def index_for(self, rule):
+        if rule.kind == "MOVE":
+            return self.moves.setdefault(rule.window, ThresholdIndex())
+        return self.price
+
+    def indexes(self):
+        return [self.price] + list(self.moves.values())
+
+    def record(self, ts, price):
+        self.history_ts.append(ts)
+        self.history_price.append(price)
+        # Trim in bulk once the stale prefix is as long as the window we still need
+        cutoff = bisect.bisect_left(self.history_ts, ts - MAX_MOVE_WINDOW * 60 - 60)
+        if cutoff > len(self.history_ts) // 2:
+            del self.history_ts[:cutoff]
+            del self.history_price[:cutoff]
+
+    def move(self, ts, price, window):
+        """% change from the last price at or before `window` minutes ago, or None without that much history."""
+        i = bisect.bisect_right(self.history_ts, ts - window * 60) - 1
+        if i < 0:
+            return None
+        return (price / self.history_price[i] - 1) * 100
+
+
+class AlertEngine:
+    """
+    Evaluates every active alert rule against the tick stream. Firings are
+    deduplicated (duplicate rules collapse into one event, repeating rules
+    wait out ALERT_COOLDOWN) and recorded with database_manager.apply_alert_events
+    in one transaction per flush.
+    """
+
+    def __init__(self, db_name=None, price_db=BOT_DB):
+        self.db_name = db_name or database_manager.DB_NAME
+        self.price_db = price_db
+        self.coins = {}
+        self.rules = {}
+        self.pending = []
+        self.expired = []
+        self.seq = itertools.count()
+        self.rev = 0
+        self.last_sync = 0.0
+        self.last_refresh = 0.0
+
+    # --- RULE MAINTENANCE ---
+
+    def add(self, rule):
+        if rule.level is None:
+            # PNL rule whose position is gone (closed or never existed)
+            self.expired.append(rule.id)
+            return
+        if rule.id in self.rules:
+            self.remove(rule.id)
+        self.rules[rule.id] = rule
+        coin = self.coins.setdefault(rule.symbol, CoinAlerts())
+        if rule.kind == "MOVE" and not coin.seeded:
+            self._seed_history(rule.symbol, coin)
+        coin.index_for(rule).push("up" if rule.upward else "down", rule.level, next(self.seq), rule)
+
+    def remove(self, rule_id):
+        rule = self.rules.pop(rule_id, None)
+        if rule is not None:
+            self.coins[rule.symbol].index_for(rule).dead += 1
+
+    def _seed_history(self, symbol, coin):
+        """Recent stored prices, so MOVE rules work from the first tick instead of after a full window."""
+        conn = sqlite3.connect(self.price_db)
+        try:
+            rows = conn.execute('''
+                SELECT t.ts, t.price FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+                WHERE c.symbol = ? AND t.ts >= ? ORDER BY t.ts
+            ''', (symbol, int(time.time()) - MAX_MOVE_WINDOW * 60)).fetchall()
+        except sqlite3.OperationalError:
+            rows = []
+        finally:
+            conn.close()
+        coin.seeded = True
+        for ts, price in rows:
+            coin.history_ts.append(ts)
+            coin.history_price.append(price)
+        if rows:
+            coin.last_ts = max(coin.last_ts, rows[-1][0])
+
+    _RULE_QUERY = '''
+        SELECT a.id, a.account_id, a.symbol, a.kind, a.threshold, a.window_minutes, a.position_id, a.repeating,
+               p.avg_price, p.leverage, a.last_triggered, a.status, a.rev
+        FROM alerts a LEFT JOIN open_positions p ON p.id = a.position_id
+    '''
+
+    def _apply_row(self, row):
+        *fields, status, rev = row
+        if status == "ACTIVE":
+            # Rules are never edited, so a known id changed only by our own firing (last_triggered); keep its state
+            if fields[0] not in self.rules:
+                self.add(Rule(*fields))
+        else:
+            self.remove(fields[0])
+        self.rev = max(self.rev, rev)
+
+    def load(self):
+        """Rebuilds every index from the ACTIVE rules (start-up)."""
+        self.coins, self.rules = {}, {}
+        conn = sqlite3.connect(self.db_name, isolation_level=None)
+        try:
+            conn.execute("BEGIN")
+            self.rev = conn.execute("SELECT COALESCE(MAX(rev), 0) FROM alerts").fetchone()[0]
+            rows = conn.execute(self._RULE_QUERY + " WHERE a.status = 'ACTIVE'").fetchall()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        for row in rows:
+            self._apply_row(row)
+        self.last_sync = self.last_refresh = time.time()
+        ACTIVE_RULES.set(len(self.rules))
+        return len(rows)
+
+    def sync(self):
+        """Applies every rule change committed since the last sync (new, deleted, fired elsewhere)."""
+        conn = sqlite3.connect(self.db_name)
+        try:
+            rows = conn.execute(self._RULE_QUERY + " WHERE a.rev > ? ORDER BY a.rev", (self.rev,)).fetchall()
+        finally:
+            conn.close()
+        for row in rows:
+            self._apply_row(row)
+        self._gc()
+        self.last_sync = time.time()
+        ACTIVE_RULES.set(len(self.rules))
+        return len(rows)
+
+    def refresh_positions(self):
+        """Recompiles PNL rules whose position was averaged into, and expires those whose position closed."""
+        watched = [r for r in self.rules.values() if r.kind == "PNL"]
+        self.last_refresh = time.time()
+        if not watched:
+            return 0
+        conn = sqlite3.connect(self.db_name)
+        try:
+            positions = {pid: (avg, lev) for pid, avg, lev in
+                         conn.execute("SELECT id, avg_price, leverage FROM open_positions")}
+        finally:
+            conn.close()
+        changed = 0
+        for rule in watched:
+            avg_price, leverage = positions.get(rule.position_id, (None, None))
+            if (avg_price, leverage or 1) != (rule.avg_price, rule.leverage):
+                self.remove(rule.id)
+                self.add(Rule(rule.id, rule.account_id, rule.symbol, rule.kind, rule.threshold, rule.window,
+                              rule.position_id, rule.repeating, avg_price, leverage, rule.last_fired))
+                changed += 1
+        return changed
+
+    def _gc(self):
+        # Between ticks only: compaction rebuilds the heaps and is O(n)
+        for coin in self.coins.values():
+            for index in coin.indexes():
+                if index.dead > GC_RATIO * index.size():
+                    index.compact(self.rules)
+
+    # --- EVALUATION ---
+
+    def _fire(self, rule, ts, price, value):
+        if rule.repeating and ts - rule.last_fired < ALERT_COOLDOWN:
+            ALERTS_SUPPRESSED.inc(kind=rule.kind)
+        else:
+            self.pending.append((rule, ts, price, value))
+            # Only real firings start the cooldown, or frequent re-crossings would keep pushing it out
+            rule.last_fired = ts
+        if not rule.repeating:
+            self.remove(rule.id)
+
+    def _scan(self, index, value, ts, price):
+        rules = self.rules
+        # Fire: every rule the value reached, in threshold order
+        for name, rearm in (("up", "up_rearm"), ("down", "down_rearm")):
+            heap = getattr(index, name)
+            key = index.HEAPS[name] * value
+            while heap and heap[0][0] <= key:
+                _, _, rule = heapq.heappop(heap)
+                if rules.get(rule.id) is not rule:
+                    index.dead = max(index.dead - 1, 0)
+                    continue
+                self._fire(rule, ts, price, value)
+                if rule.repeating:
+                    # Hysteresis: park it until the signal comes back REARM_BAND inside the threshold
+                    band = abs(rule.level) * REARM_BAND
+                    index.push(rearm, rule.level - band if name == "up" else rule.level + band, next(self.seq), rule)
+                else:
+                    index.dead -= 1  # remove() counted the entry we just popped
+        # Re-arm: fired repeating rules the value has fallen (or climbed) back through
+        for name, armed in (("up_rearm", "up"), ("down_rearm", "down")):
+            heap = getattr(index, name)
+            key = index.HEAPS[name] * value
+            while heap and heap[0][0] <= key:
+                _, _, rule = heapq.heappop(heap)
+                if rules.get(rule.id) is not rule:
+                    index.dead = max(index.dead - 1, 0)
+                    continue
+                index.push(armed, rule.level, next(self.seq), rule)
+
+    def on_tick(self, symbol, ts, price):
+        """Evaluates one tick against the coin's indexes. Returns the number of firings queued."""
+        coin = self.coins.get(symbol)
+        if coin is None or ts <= coin.last_ts or not price:
+            return 0  # No rules, or a replayed snapshot (e.g. after a stream reconnect)
+        started = time.perf_counter()
+        queued = len(self.pending)
+        coin.last_ts = ts
+        self._scan(coin.price, price, ts, price)
+        if coin.moves:
+            for window, index in coin.moves.items():
+                if index.size():
+                    move = coin.move(ts, price, window)
+                    if move is not None:
+                        self._scan(index, move, ts, price)
+            coin.record(ts, price)
+        EVAL_LATENCY.observe(time.perf_counter() - started)
+        return len(self.pending) - queued
+
+    def flush(self):
+        """Records queued firings in one transaction, one event per group of duplicate rules. Returns events recorded."""
+        self._gc()
+        if not self.pending and not self.expired:
+            return 0
+        groups = {}
+        for rule, ts, price, value in self.pending:
+            key = (rule.account_id, rule.symbol, rule.kind, rule.threshold, rule.window, rule.position_id)
+            if key in groups:
+                groups[key][0].append(rule.id)
+                ALERTS_SUPPRESSED.inc(kind=rule.kind)
+            else:
+                groups[key] = ([rule.id], ts, price, rule.message(price, value), rule.kind)
+        events = [group[:4] for group in groups.values()]
+        try:
+            recorded = execute_write(self.db_name, "alert_events", database_manager.apply_alert_events,
+                                     events, self.expired)
+        except Exception as e:
+            # One-shot rules already left the indexes: keep their firings queued and retry next flush
+            print(f"Alert engine: recording {len(events)} events failed ({e}); retrying next flush")
+            return 0
+        self.pending, self.expired = [], []
+        for group in groups.values():
+            ALERTS_FIRED.inc(kind=group[4])
+        ACTIVE_RULES.set(len(self.rules))
+        return recorded
+
+    def process(self, ticks):
+        """One tick-stream event: sync rule changes if due, evaluate every tick, record the firings."""
+        now = time.time()
+        if now - self.last_sync >= SYNC_INTERVAL:
+            self.sync()
+        if now - self.last_refresh >= POSITION_REFRESH:
+            self.refresh_positions()
+        for tick in ticks:
+            self.on_tick(tick["symbol"], tick["ts"], tick["price"])
+        return self.flush()
+
+
+def run(url=None):
+    """Consumes the collector's SSE tick stream and evaluates alert rules until interrupted."""
+    import tick_stream
+    database_manager.init_db()
+    engine = AlertEngine()
+    print(f"Alert engine: {engine.load()} active rules loaded")
+
+    def on_ticks(ticks):
+        recorded = engine.process(ticks)
+        if recorded:
+            print(f"Alerts fired: {recorded}")
+
+    # Evaluation, syncing and recording all run on the ticker's thread, one event at a time
+    tick_stream.LiveTicker(url or tick_stream.TICK_STREAM_URL, on_ticks=on_ticks).start()
+    while True:
+        time.sleep(60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Price/move/P&L alert rule engine.")
+    parser.add_argument("--url", help="Tick stream base URL (default: TICK_STREAM_URL)")
+    parser.add_argument("--metrics-port", type=int, default=9114)
+    args = parser.parse_args()
+    metrics.start_metrics_server(args.metrics_port)
+    run(args.url)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 import streamlit as st
 import pandas as pd
-import io
 import os
 import sqlite3
-import plotly.graph_objects as go
+import time
+import requests
 from datetime import datetime
 from dotenv import load_dotenv
 from streamlit_autorefresh import st_autorefresh
-from crypto_data import get_coins_list, get_historical_data, get_dex_price
-from database_manager import init_db, log_trade, get_all_trades, get_wallet_balance, update_wallet_balance, get_open_positions, close_position
-from ai_brain import get_trading_signal
-from one_inch_wrapper import OneInchService
+from crypto_data import get_coins_list, get_historical_data, get_dex_price, resample_ohlc
+from database_manager import init_db, log_trade, get_all_trades, get_wallet_balance, get_open_positions, close_position, compute_positions_pnl, place_order, place_oco, cancel_order, get_orders, get_portfolio_summary, get_accounts, create_account, reset_account, add_alert, delete_alert, get_alerts, get_alert_events, LOT_METHOD, PAPER_STARTING_BALANCE
+from ai_brain import get_trading_signal, load_price_history, BOT_DB
 # from wallet_bridge import generate_trust_wallet_link
 from trust_wallet_bridge import generate_buy_link
+import metrics
+from tick_stream import LiveTicker
+
+_run_started = time.perf_counter()
 
 st.markdown("""
 <style>
@@ -35,8 +38,17 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # --- INITIALIZATION ---
-load_dotenv()
-init_db()
+APP_METRICS_PORT = int(os.getenv("APP_METRICS_PORT", 9109))
+COLLECTOR_METRICS_URL = os.getenv("COLLECTOR_METRICS_URL", "http://127.0.0.1:9108/metrics")
+
+@st.cache_resource
+def bootstrap():
+    """One-time process setup (env, schema, /metrics), shared by every session and rerun."""
+    load_dotenv()
+    init_db()
+    return metrics.start_metrics_server(APP_METRICS_PORT)
+
+bootstrap()
 
 st.set_page_config(
     page_title="Gravity Pulse | Crypto Terminal",
@@ -70,8 +82,21 @@ if mode:
     user_wallet = st.sidebar.text_input("Public Wallet Address", placeholder="0x...")
     if not user_wallet: st.sidebar.warning("Live Mode requires a wallet address.")
 
+# --- PAPER ACCOUNTS (each has its own wallet, positions and history) ---
+accounts_df = get_accounts()
+account_names = dict(zip(accounts_df['account_id'], accounts_df['name']))
+if 'created_account' in st.session_state:
+    # Select a just-created account (widget state can only be set before the widget renders)
+    st.session_state['account_id'] = st.session_state.pop('created_account')
+account_id = st.sidebar.selectbox("Account", list(account_names), format_func=lambda a: account_names[a], key="account_id")
+with st.sidebar.expander("➕ New Paper Account"):
+    new_account = st.text_input("Account Name", key="new_account_name")
+    if st.button("Create Account", use_container_width=True) and new_account.strip():
+        st.session_state['created_account'] = create_account(new_account.strip())
+        st.rerun()
+
 st.sidebar.divider()
-st.sidebar.info(f"Connected: **{mode_str} Mode**")
+st.sidebar.info(f"Connected: **{mode_str} Mode** · {account_names.get(account_id, 'Default')}")
 st.sidebar.caption(f"Last Sync: {datetime.now().strftime('%H:%M:%S')}")
 
 # --- CACHED DATA FETCHING ---
@@ -79,27 +104,290 @@ st.sidebar.caption(f"Last Sync: {datetime.now().strftime('%H:%M:%S')}")
 def fetch_pulse_history(coin_id, symbol):
     """Fetches high-density history from local DB combined with CoinGecko."""
     try:
-        conn = sqlite3.connect("crypto_bot.db")
-        # Query last 100 entries for the target symbol
-        query = "SELECT timestamp, price_usd as price FROM price_history WHERE UPPER(coin_symbol) = ? ORDER BY timestamp DESC LIMIT 100"
-        db_df = pd.read_sql_query(query, conn, params=(symbol.upper(),))
-        conn.close()
+        # Last 100 entries for the target symbol
+        db_df = load_price_history(symbol, limit=100)
         if not db_df.empty:
-            db_df['timestamp'] = pd.to_datetime(db_df['timestamp'])
-            return db_df.iloc[::-1]
+            return db_df
     except: pass
     return get_historical_data(coin_id, days=1)
 
+@st.cache_data(max_entries=16, show_spinner="Simulating 100k price paths...")
+def fetch_portfolio_risk(positions, marks, horizon_minutes, cov=None, samples=0):
+    """Monte Carlo VaR/liquidation report; recomputed only when the book, a mark price or the covariance changes."""
+    import risk
+    return risk.portfolio_risk([dict(p) for p in positions], dict(marks), horizon_minutes=horizon_minutes, cov=cov, samples=samples)
+
+@st.cache_data(ttl=5)
+def fetch_latest_db_prices():
+    """Symbol -> newest collected tick price, for when the live stream is down (one PK seek per coin)."""
+    try:
+        conn = sqlite3.connect(BOT_DB)
+        rows = conn.execute('''
+            SELECT c.symbol, (SELECT t.price FROM ticks t WHERE t.coin_id = c.coin_id ORDER BY t.ts DESC LIMIT 1)
+            FROM coins c
+        ''').fetchall()
+        conn.close()
+    except sqlite3.Error:
+        return {}
+    return {symbol: price for symbol, price in rows if price is not None}
+
+@st.cache_data(ttl=10, show_spinner=False)
+def fetch_collector_metrics():
+    """Parsed collector /metrics; cached so a collector that is down costs one timeout per 10 s, not one per rerun."""
+    try:
+        return metrics.parse_exposition(requests.get(COLLECTOR_METRICS_URL, timeout=1).text)
+    except Exception:
+        return []
+
 @st.cache_data(ttl=60)
 def fetch_market_overview():
     """Cached overview list for the main table."""
     return get_coins_list(per_page=100)
 
+# --- FIGURE BUILDERS (plotly is imported on first chart render) ---
+def build_price_figure(h_hist, chart_type, current_val):
+    """Line/Bar/Candle chart of the pulse history with the LIVE price marker."""
+    import plotly.graph_objects as go
+    fig = go.Figure()
+
+    if chart_type == "Line":
+        fig.add_trace(go.Scatter(
+            x=h_hist['timestamp'], y=h_hist['price'],
+            mode='lines', line=dict(color='#00ff7f', width=2),
+            name="Price"
+        ))
+    else:
+        ohlc = resample_ohlc(h_hist, '5min')
+        if chart_type == "Candle":
+            fig.add_trace(go.Candlestick(
+                x=ohlc['timestamp'], open=ohlc['open'], high=ohlc['high'],
+                low=ohlc['low'], close=ohlc['close'],
+                increasing_line_color='#00ff7f', decreasing_line_color='#ff4b4b',
+                name="OHLC"
+            ))
+        else:
+            fig.add_trace(go.Ohlc(
+                x=ohlc['timestamp'], open=ohlc['open'], high=ohlc['high'],
+                low=ohlc['low'], close=ohlc['close'],
+                increasing_line_color='#00ff7f', decreasing_line_color='#ff4b4b',
+                name="OHLC"
+            ))
+
+    # --- PRO TRADING INDICATORS ---
+    fig.add_hline(
+        y=current_val, 
+        line_dash="dash", line_color="#00ff7f", line_width=2,
+        annotation_text=f" <b>LIVE: ${current_val:,.2f}</b> ", 
+        annotation_position="right",
+        annotation_font_size=18,
+        annotation_font_color="#00ff7f",
+        annotation_bgcolor="#1e2130",
+        annotation_bordercolor="#00ff7f",
+        annotation_borderwidth=2
+    )
+
+    # --- PROFESSIONAL X-AXIS PADDING (25% Offset) ---
+    last_time = h_hist['timestamp'].max()
+    first_time = h_hist['timestamp'].min()
+    duration = last_time - first_time
+    x_max = last_time + (duration * 0.25)
+
+    fig.update_layout(
+        height=350, margin={"l": 0, "r": 120, "t": 10, "b": 0},
+        template="plotly_dark",
+        xaxis={
+            "visible": True,
+            "range": [first_time, x_max],
+            "showgrid": False,
+            "rangeslider": {"visible": False},
+            "tickfont": {"color": "#8b949e"}
+        },
+        yaxis={
+            "visible": True, "showgrid": True, "gridcolor": "#30363d",
+            "zeroline": False, "autorange": True, "side": "right",
+            "tickfont": {"color": "#8b949e"}, "tickformat": ",.0f", "fixedrange": False 
+        },
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        showlegend=False,
+        hovermode="x unified"
+    )
+    return fig
+
+def build_heatmap_figure(hm_data):
+    """One-row 24h % change heatmap for the top assets."""
+    import plotly.graph_objects as go
+    fig = go.Figure(data=go.Heatmap(
+        z=[hm_data['price_change_percentage_24h'].tolist()],
+        x=hm_data['name'].tolist(),
+        y=['24h Change'],
+        colorscale=[[0, '#ff4b4b'], [0.5, '#1e2130'], [1, '#00ff7f']],
+        zmin=-12, zmax=12,
+        showscale=True,
+        text=[[f"{v:.2f}%" for v in hm_data['price_change_percentage_24h']]],
+        texttemplate="%{text}",
+    ))
+    fig.update_layout(
+        height=200, margin=dict(l=0, r=0, t=10, b=30),
+        template="plotly_dark",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        xaxis=dict(side="bottom")
+    )
+    return fig
+
+def build_correlation_figure(symbols, corr):
+    """Square correlation heatmap (rows/columns already in clustered order)."""
+    import plotly.graph_objects as go
+    fig = go.Figure(data=go.Heatmap(
+        z=corr, x=symbols, y=symbols,
+        colorscale=[[0, '#ff4b4b'], [0.5, '#1e2130'], [1, '#00ff7f']],
+        zmin=-1, zmax=1,
+        showscale=True,
+    ))
+    fig.update_layout(
+        height=max(300, min(900, 30 * len(symbols))), margin=dict(l=0, r=0, t=10, b=30),
+        template="plotly_dark",
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        yaxis=dict(autorange="reversed")
+    )
+    return fig
+
+# --- LIVE TICK FEED (one SSE consumer per server process, shared by all sessions) ---
+@st.cache_resource
+def get_correlation_engine():
+    """Rolling return covariance for every collected coin, seeded from the tick store."""
+    import correlation
+    return correlation.load_engine(BOT_DB)
+
+@st.cache_resource
+def get_live_ticker():
+    # Each tick event also updates the correlation engine (rank-one, on the ticker thread)
+    return LiveTicker(on_ticks=get_correlation_engine().update).start()
+
+live_ticker = get_live_ticker()
+
+@st.cache_resource
+def get_swap_pipeline():
+    """Prefetched 1inch swap bundles, shared across sessions so a click is a cache read."""
+    from swap_pipeline import SwapPipeline
+    return SwapPipeline()
+
+
+# Fragments re-render every second; without the collector's stream they read its DB instead
+LIVE_REFRESH_SECONDS = 1
+
+def live_price(symbol):
+    """Streamed tick while the collector's stream is connected, else its newest DB tick (None if neither)."""
+    if live_ticker.connected:
+        price = live_ticker.price(symbol)
+        if price is not None:
+            return price
+    return fetch_latest_db_prices().get(symbol.upper())
+
+def live_price_lookup(coins):
+    """Lower-case name/symbol -> price: live tick or newest DB tick, else the CoinGecko snapshot (first listed coin wins)."""
+    lookup = {}
+    for c in coins:
+        price = live_price(c['symbol'])
+        price = price if price is not None else c['current_price']
+        lookup.setdefault(c['name'].lower(), price)
+        lookup.setdefault(c['symbol'].lower(), price)
+    return lookup
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_top_asset(highlight_coin, h_hist):
+    """Top asset metric and chart; the LIVE marker follows the tick stream."""
+    price = live_price(highlight_coin['symbol'])
+    current_val = price if price is not None else highlight_coin['current_price']
+    col_h1, col_h2 = st.columns([1, 2])
+    with col_h1:
+        st.metric(f"🔥 Top Asset: {highlight_coin['name']}", f"${current_val:,.2f}", f"{highlight_coin['price_change_percentage_24h']:.2f}%")
+        chart_type = st.radio("Chart View", ["Line", "Bar", "Candle"], horizontal=True, key="market_chart_type")
+
+    with col_h2:
+        if not h_hist.empty:
+            fig_p = build_price_figure(h_hist, chart_type, current_val)
+            st.plotly_chart(fig_p, use_container_width=True, config={'displayModeBar': True, 'scrollZoom': True})
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_open_positions(open_pos_df):
+    """Position cards + unrealized P&L, re-marked from the live tick feed without a full rerun."""
+    open_pos_df = compute_positions_pnl(open_pos_df, live_price_lookup(all_coins))
+    total_pnl = open_pos_df['pnl_abs'].sum()
+    total_entry_val = (open_pos_df['avg_price'] * open_pos_df['amount']).sum()
+    total_pnl_pct = (total_pnl / total_entry_val * 100) if total_entry_val > 0 else 0
+    st.metric("Unrealized P&L", f"${total_pnl:,.2f}", delta=f"{total_pnl_pct:+.2f}%")
+
+    pos_cols = st.columns(len(open_pos_df) if len(open_pos_df) < 4 else 3)
+
+    for idx, row in open_pos_df.iterrows():
+        cur_price = row['cur_price']
+        pnl_abs = row['pnl_abs']
+        # Use specific leverage from this trade's database row
+        lev = row.get('leverage', 1)
+        pnl_pct = row['pnl_pct']
+
+        with pos_cols[idx % (len(pos_cols))]:
+            pnl_class = "pnl-plus" if pnl_pct >= 0 else "pnl-minus"
+            st.markdown(f"""
+            <div class="binance-card">
+                <div style="display: flex; justify-content: space-between; align-items: start;">
+                    <div>
+                        <span class="gold-text">LONG</span> &nbsp; <span style="color:#848e9c;">|</span> &nbsp; <b>{lev}x</b> &nbsp; <span style="color:#848e9c;">|</span> &nbsp; <b>{row['coin'].upper()}USDT</b>
+                    </div>
+                </div>
+                <div style="margin: 15px 0;">
+                    <div class="{pnl_class}">{pnl_pct:+.2f}%</div>
+                    <div style="color:{'#02c076' if pnl_abs >= 0 else '#f84960'}; font-size: 0.9rem;">${pnl_abs:+.2f}</div>
+                </div>
+                <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 10px;">
+                    <div>
+                        <div class="binance-label">Entry Price</div>
+                        <div class="binance-value">{row['avg_price']:,.2f}</div>
+                    </div>
+                    <div>
+                        <div class="binance-label">Mark Price</div>
+                        <div class="binance-value">{cur_price:,.2f}</div>
+                    </div>
+                </div>
+            </div>
+            """, unsafe_allow_html=True)
+
+            if st.button(f"Close Position", key=f"close_{row['id']}", use_container_width=True):
+                close_position(row['id'], cur_price)
+                st.success(f"Position {row['coin']} Closed!")
+                st.rerun()
+
+# --- ALERT FEED (fired by alert_engine.py; one indexed read per poll) ---
+ALERT_POLL_SECONDS = 2
+
+@st.fragment(run_every=ALERT_POLL_SECONDS)
+def render_alert_feed(account_id):
+    """Toasts alerts fired since the last poll and lists the newest few, without a full rerun."""
+    seen_key = f"alerts_seen_{account_id}"
+    events = get_alert_events(account_id, limit=5)
+    latest = events[0]['id'] if events else 0
+    # Alerts fired before this session opened are listed, not toasted
+    seen = st.session_state.get(seen_key, latest)
+    for event in reversed(events):
+        if event['id'] > seen:
+            st.toast(f"🔔 {event['message']}")
+    st.session_state[seen_key] = latest
+    if events:
+        st.caption("🔔 Recent Alerts")
+        for event in events:
+            st.caption(f"{datetime.fromtimestamp(event['ts']):%H:%M:%S} · {event['message']}")
+
+with st.sidebar:
+    render_alert_feed(account_id)
+
 # --- REFRESH TOKEN ---
 st_autorefresh(interval=60000, key="datarefresh")
 
 # --- MAIN DASHBOARD ---
-tab1, tab2, tab3 = st.tabs(["⚡ Market Overview", "🤖 AI Trading Bot", "📊 Analytics"])
+tab1, tab2, tab3, tab4 = st.tabs(["⚡ Market Overview", "🤖 AI Trading Bot", "📊 Analytics", "🩺 System Health"])
 
 all_coins_raw = fetch_market_overview()
 
@@ -117,79 +405,7 @@ with tab1:
         h_hist = fetch_pulse_history(highlight_coin['id'], highlight_coin['symbol'])
         
         # --- TOP ASSET HIGHLIGHT ---
-        col_h1, col_h2 = st.columns([1, 2])
-        with col_h1:
-            st.metric(f"🔥 Top Asset: {highlight_coin['name']}", f"${highlight_coin['current_price']:,.2f}", f"{highlight_coin['price_change_percentage_24h']:.2f}%")
-            chart_type = st.radio("Chart View", ["Line", "Bar", "Candle"], horizontal=True, key="market_chart_type")
-
-        with col_h2:
-            if not h_hist.empty:
-                current_val = highlight_coin['current_price']
-                fig_p = go.Figure()
-                
-                if chart_type == "Line":
-                    fig_p.add_trace(go.Scatter(
-                        x=h_hist['timestamp'], y=h_hist['price'],
-                        mode='lines', line=dict(color='#00ff7f', width=2),
-                        name="Price"
-                    ))
-                else:
-                    ohlc = h_hist.set_index('timestamp')['price'].resample('5min').ohlc().dropna().reset_index()
-                    if chart_type == "Candle":
-                        fig_p.add_trace(go.Candlestick(
-                            x=ohlc['timestamp'], open=ohlc['open'], high=ohlc['high'],
-                            low=ohlc['low'], close=ohlc['close'],
-                            increasing_line_color='#00ff7f', decreasing_line_color='#ff4b4b',
-                            name="OHLC"
-                        ))
-                    else:
-                        fig_p.add_trace(go.Ohlc(
-                            x=ohlc['timestamp'], open=ohlc['open'], high=ohlc['high'],
-                            low=ohlc['low'], close=ohlc['close'],
-                            increasing_line_color='#00ff7f', decreasing_line_color='#ff4b4b',
-                            name="OHLC"
-                        ))
-
-                # --- PRO TRADING INDICATORS ---
-                fig_p.add_hline(
-                    y=current_val, 
-                    line_dash="dash", line_color="#00ff7f", line_width=2,
-                    annotation_text=f" <b>LIVE: ${current_val:,.2f}</b> ", 
-                    annotation_position="right",
-                    annotation_font_size=18,
-                    annotation_font_color="#00ff7f",
-                    annotation_bgcolor="#1e2130",
-                    annotation_bordercolor="#00ff7f",
-                    annotation_borderwidth=2
-                )
-
-                # --- PROFESSIONAL X-AXIS PADDING (25% Offset) ---
-                last_time = h_hist['timestamp'].max()
-                first_time = h_hist['timestamp'].min()
-                duration = last_time - first_time
-                x_max = last_time + (duration * 0.25)
-                
-                fig_p.update_layout(
-                    height=350, margin={"l": 0, "r": 120, "t": 10, "b": 0},
-                    template="plotly_dark",
-                    xaxis={
-                        "visible": True,
-                        "range": [first_time, x_max],
-                        "showgrid": False,
-                        "rangeslider": {"visible": False},
-                        "tickfont": {"color": "#8b949e"}
-                    },
-                    yaxis={
-                        "visible": True, "showgrid": True, "gridcolor": "#30363d",
-                        "zeroline": False, "autorange": True, "side": "right",
-                        "tickfont": {"color": "#8b949e"}, "tickformat": ",.0f", "fixedrange": False 
-                    },
-                    paper_bgcolor='rgba(0,0,0,0)',
-                    plot_bgcolor='rgba(0,0,0,0)',
-                    showlegend=False,
-                    hovermode="x unified"
-                )
-                st.plotly_chart(fig_p, use_container_width=True, config={'displayModeBar': True, 'scrollZoom': True})
+        render_top_asset(highlight_coin, h_hist)
 
         st.divider()
         # --- TERMINAL FEED ---
@@ -206,25 +422,21 @@ with tab1:
 
         st.subheader("📊 Market Sentiment Heatmap (24h %)")
         hm_data = display_df.head(15).copy()
-        fig_hm = go.Figure(data=go.Heatmap(
-            z=[hm_data['price_change_percentage_24h'].tolist()],
-            x=hm_data['name'].tolist(),
-            y=['24h Change'],
-            colorscale=[[0, '#ff4b4b'], [0.5, '#1e2130'], [1, '#00ff7f']],
-            zmin=-12, zmax=12,
-            showscale=True,
-            text=[[f"{v:.2f}%" for v in hm_data['price_change_percentage_24h']]],
-            texttemplate="%{text}",
-        ))
-        fig_hm.update_layout(
-            height=200, margin=dict(l=0, r=0, t=10, b=30),
-            template="plotly_dark",
-            paper_bgcolor='rgba(0,0,0,0)',
-            plot_bgcolor='rgba(0,0,0,0)',
-            xaxis=dict(side="bottom")
-        )
+        fig_hm = build_heatmap_figure(hm_data)
         st.plotly_chart(fig_hm, use_container_width=True, config={'displayModeBar': False})
 
+        st.subheader("🧮 Cross-Asset Correlation (rolling returns)")
+        corr_result = get_correlation_engine().correlation()
+        if corr_result is None:
+            st.caption("Warming up: the matrix appears once the collector has stored 30 tick batches.")
+        else:
+            import correlation
+            corr_symbols, corr, vol = corr_result
+            order = correlation.cluster_order(corr)
+            ordered = [corr_symbols[i] for i in order]
+            st.plotly_chart(build_correlation_figure(ordered, corr[order][:, order]), use_container_width=True, config={'displayModeBar': False})
+            st.caption(f"{len(corr_symbols)} coins, clustered order · hourly volatility: " + ", ".join(f"{corr_symbols[i]} {vol[i] * 60 ** 0.5 * 100:.2f}%" for i in order[:10]))
+
 # --- TAB 2: AI TRADING BOT ---
 with tab2:
     st.title("🤖 Gravity AI Strategic Terminal")
@@ -302,7 +514,7 @@ with tab2:
 
         # --- PERMANENT TRADING TERMINAL ---
         current_price = selected_coin['current_price']
-        wallet_bal = get_wallet_balance()
+        wallet_bal = get_wallet_balance(account_id)
         
         # Move Leverage Slider here for easier access during trade
         leverage = st.select_slider("Live Leverage Simulation", options=[1, 5, 10, 20, 50, 100, 125], value=st.session_state.get('leverage', 1))
@@ -336,20 +548,106 @@ with tab2:
                 if total_usd > wallet_bal:
                     st.error("Insufficient Funds!")
                 else:
-                    log_trade(target_coin_name, "BUY", current_price, trade_amt, "Manual Entry", "Paper", current_lev)
+                    log_trade(target_coin_name, "BUY", current_price, trade_amt, "Manual Entry", "Paper", current_lev, account_id)
                     st.success(f"Successfully BUYed {trade_amt:.4f} {selected_coin['symbol'].upper()} at {current_lev}x!")
                     st.balloons()
                     
             if col_btn_sell.button("Direct SELL", use_container_width=True):
-                log_trade(target_coin_name, "SELL", current_price, trade_amt, "Manual Exit", "Paper", current_lev)
+                log_trade(target_coin_name, "SELL", current_price, trade_amt, "Manual Exit", "Paper", current_lev, account_id)
                 st.success(f"Successfully SELLed {trade_amt:.4f} {selected_coin['symbol'].upper()}!")
                 st.rerun()
+
+            # --- RESTING ORDERS (matched by order_engine.py on the live tick stream) ---
+            with st.expander("🧾 Limit / Stop / OCO Orders"):
+                order_symbol = selected_coin['symbol'].upper()
+                o_type = st.radio("Order Type", ["Limit", "Stop", "OCO"], horizontal=True, key="order_type")
+                o_side = st.radio("Side", ["BUY", "SELL"], horizontal=True, key="order_side")
+                if o_type == "OCO":
+                    col_tp, col_sl = st.columns(2)
+                    tp_price = col_tp.number_input("Limit (take-profit)", value=float(current_price * (1.05 if o_side == "SELL" else 0.95)), format="%.4f")
+                    sl_price = col_sl.number_input("Stop (stop-loss)", value=float(current_price * (0.95 if o_side == "SELL" else 1.05)), format="%.4f")
+                else:
+                    trigger_price = st.number_input(f"{o_type} Price", value=float(current_price), format="%.4f")
+                if st.button("Place Order", use_container_width=True):
+                    if o_type == "OCO":
+                        place_oco(target_coin_name, order_symbol, o_side, trade_amt, tp_price, sl_price, current_lev, "Paper", "Manual OCO", account_id)
+                    else:
+                        place_order(target_coin_name, order_symbol, o_side, o_type.upper(), trigger_price, trade_amt, current_lev, "Paper", "Manual Order", account_id)
+                    st.success(f"{o_type} {o_side} order for {trade_amt:.4f} {order_symbol} is resting.")
+                st.caption("Orders fill when `order_engine.py` sees the live price cross them.")
+
+                open_orders = get_orders("OPEN", "Paper", account_id)
+                for _, o in open_orders[open_orders['symbol'] == order_symbol].iterrows():
+                    col_o1, col_o2 = st.columns([3, 1])
+                    oco_tag = f" · OCO #{int(o['oco_group'])}" if pd.notna(o['oco_group']) else ""
+                    col_o1.write(f"#{o['id']} {o['side']} {o['order_type']} {o['amount']:.4f} @ ${o['price']:,.2f}{oco_tag}")
+                    if col_o2.button("Cancel", key=f"cancel_order_{o['id']}"):
+                        cancel_order(o['id'])
+                        st.rerun()
         else:
             st.warning("⚡ Trust Wallet Integration (1inch)")
             coin_addr = selected_coin.get('platforms', {}).get('ethereum', "0x...")
             trust_link = generate_buy_link(coin_addr, total_usd)
             st.link_button("Open 1inch in Trust Wallet", trust_link, use_container_width=True)
 
+            # --- PRE-BUILT SWAP (quote, approval and calldata fetched while the user decides) ---
+            from swap_pipeline import NATIVE_TOKEN, USDT_ADDRESS, USDT_DECIMALS
+            swap_dst = NATIVE_TOKEN if selected_coin['id'] == "ethereum" else coin_addr
+            if user_wallet and swap_dst.startswith("0x") and len(swap_dst) == 42 and total_usd > 0:
+                swap_slippage = st.select_slider("Max Slippage %", options=[0.1, 0.5, 1, 2, 3], value=1)
+                swap_amount = int(total_usd * 10 ** USDT_DECIMALS)
+                swap_mark = live_price(selected_coin['symbol']) or current_price
+                pipeline = get_swap_pipeline()
+                pipeline.prefetch(USDT_ADDRESS, swap_dst, swap_amount, user_wallet, swap_slippage, swap_mark,
+                                  mark_source=lambda symbol=selected_coin['symbol']: live_ticker.price(symbol))
+                if st.button("⚡ Prepare Swap Transaction", use_container_width=True):
+                    swap = pipeline.get(USDT_ADDRESS, swap_dst, swap_amount, user_wallet, swap_slippage, swap_mark)
+                    if swap['errors']:
+                        st.error(f"1inch: {swap['errors']}")
+                    else:
+                        st.success(f"{len(swap['transactions'])} transaction(s) ready to sign in {swap['seconds'] * 1000:.0f} ms ({swap['cache']}, quoted {swap['age']:.0f}s ago)")
+                        st.json(swap['transactions'])
+            else:
+                st.caption("Enter a wallet address to pre-build the 1inch swap for this coin.")
+
+        # --- PRICE ALERTS (evaluated by alert_engine.py on the live tick stream) ---
+        with st.expander("🔔 Price Alerts"):
+            alert_symbol = selected_coin['symbol'].upper()
+            a_kind = st.radio("Alert When", ["Price ≥", "Price ≤", "Move %", "Position P&L %"], horizontal=True, key="alert_kind")
+            a_window = a_position = None
+            if a_kind == "Move %":
+                col_a1, col_a2 = st.columns(2)
+                a_threshold = col_a1.number_input("Move % (negative = drop)", value=-5.0, step=0.5, format="%.2f")
+                a_window = col_a2.selectbox("Within", [5, 15, 60, 240, 1440], index=2, format_func=lambda m: f"{m} min" if m < 60 else f"{m // 60} h")
+            elif a_kind == "Position P&L %":
+                coin_positions = get_open_positions("Paper", account_id)
+                coin_positions = coin_positions[coin_positions['coin'] == target_coin_name]
+                if coin_positions.empty:
+                    st.caption(f"No open Paper position in {target_coin_name}.")
+                else:
+                    position_labels = {int(p.id): f"#{p.id} · {p.leverage}x · {p.amount:.4f} @ ${p.avg_price:,.2f}" for p in coin_positions.itertuples()}
+                    a_position = st.selectbox("Position", list(position_labels), format_func=position_labels.get)
+                a_threshold = st.number_input("Leveraged P&L % (negative = loss)", value=50.0, step=5.0, format="%.1f")
+            else:
+                a_threshold = st.number_input("Price", value=float(current_price * (1.05 if a_kind == "Price ≥" else 0.95)), format="%.4f")
+            a_repeat = st.checkbox("Repeat (re-arms once the price moves back)", key="alert_repeat")
+            if st.button("Create Alert", use_container_width=True) and (a_kind != "Position P&L %" or a_position is not None):
+                a_type = {"Price ≥": "ABOVE", "Price ≤": "BELOW", "Move %": "MOVE", "Position P&L %": "PNL"}[a_kind]
+                add_alert(alert_symbol, a_type, a_threshold, a_window, a_position, a_repeat, account_id=account_id)
+                st.success(f"Alert set: {alert_symbol} {a_kind} {a_threshold:,.8g}")
+            st.caption("Alerts fire when `alert_engine.py` sees a tick reach them and pop up in the sidebar.")
+
+            active_alerts = get_alerts("ACTIVE", account_id)
+            for _, a in active_alerts[active_alerts['symbol'] == alert_symbol].iterrows():
+                col_al1, col_al2 = st.columns([3, 1])
+                window_tag = f" in {int(a['window_minutes'])}m" if pd.notna(a['window_minutes']) else ""
+                position_tag = f" · position #{int(a['position_id'])}" if pd.notna(a['position_id']) else ""
+                repeat_tag = " · repeating" if a['repeating'] else ""
+                col_al1.write(f"#{a['id']} {a['kind']} {a['threshold']:,.8g}{window_tag}{position_tag}{repeat_tag}")
+                if col_al2.button("Delete", key=f"delete_alert_{a['id']}"):
+                    delete_alert(a['id'])
+                    st.rerun()
+
 # --- TAB 3: ANALYTICS ---
 with tab3:
     st.title("📊 Portfolio & Audit Trail")
@@ -357,10 +655,10 @@ with tab3:
     col_w1, col_w2, col_w3 = st.columns(3)
     with col_w1:
         if mode_str == "Paper":
-            balance = get_wallet_balance()
+            balance = get_wallet_balance(account_id)
             st.metric("Virtual Balance", f"${balance:,.2f}")
-            if st.button("🔄 Reset to $1,000", help="Reset virtual funds to initial state"):
-                update_wallet_balance(1000.0)
+            if st.button(f"🔄 Reset to ${PAPER_STARTING_BALANCE:,.0f}", help="Reset this account's virtual funds to its initial state"):
+                reset_account(account_id)
                 st.rerun()
         else:
             st.metric("Live Wallet Balance", "$0.00", help="Wallet integration required for live balance")
@@ -369,72 +667,67 @@ with tab3:
     with col_w2:
         mode_filter = st.radio("History Mode", ["All", "Live", "Paper"], horizontal=True)
 
+    with col_w3:
+        if live_ticker.connected:
+            age = time.time() - live_ticker.last_event if live_ticker.last_event else None
+            st.metric("Live Tick Feed", "🟢 Streaming", help=f"Last tick {age:.0f}s ago" if age is not None else None)
+        else:
+            st.metric("Live Tick Feed", "⚪ Offline", help="Start data_collector.py to stream marks")
+
+    # --- LOT ACCOUNTING TOTALS (one summary-row read) ---
+    portfolio = get_portfolio_summary(mode_str, account_id)
+    col_s1, col_s2, col_s3 = st.columns(3)
+    col_s1.metric("Realized P&L", f"${portfolio['realized_pnl']:,.2f}", help=f"Lots closed {LOT_METHOD}")
+    col_s2.metric("Open Cost Basis", f"${portfolio['cost_basis']:,.2f}")
+    col_s3.metric("Trades Booked", f"{portfolio['trades']:,}")
+
     # --- OPEN POSITIONS TRACKER ---
     st.divider()
     st.subheader(f"📋 Active Open Positions ({mode_str})")
-    open_pos_df = get_open_positions(mode=mode_str)
+    open_pos_df = get_open_positions(mode=mode_str, account_id=account_id)
     
     if not open_pos_df.empty:
-        total_pnl = 0
-        total_entry_val = 0
-        pos_cols = st.columns(len(open_pos_df) if len(open_pos_df) < 4 else 3)
-        
-        for idx, row in open_pos_df.iterrows():
-            # Match current price from global market data (Try Name then Symbol fallback)
-            current_coin = next((c for c in all_coins if c['name'].lower() == row['coin'].lower() or c['symbol'].lower() == row['coin'].lower()), None)
-            cur_price = current_coin['current_price'] if current_coin else row['avg_price']
-            
-            pnl_abs = (cur_price - row['avg_price']) * row['amount']
-            # Use specific leverage from this trade's database row
-            lev = row.get('leverage', 1)
-            pnl_pct = (((cur_price - row['avg_price']) / row['avg_price']) * 100 * lev) if row['avg_price'] > 0 else 0
-            
-            # Track totals for global metric
-            total_pnl += pnl_abs
-            total_entry_val += (row['avg_price'] * row['amount'])
-            
-            with pos_cols[idx % (len(pos_cols))]:
-                pnl_class = "pnl-plus" if pnl_pct >= 0 else "pnl-minus"
-                st.markdown(f"""
-                <div class="binance-card">
-                    <div style="display: flex; justify-content: space-between; align-items: start;">
-                        <div>
-                            <span class="gold-text">LONG</span> &nbsp; <span style="color:#848e9c;">|</span> &nbsp; <b>{lev}x</b> &nbsp; <span style="color:#848e9c;">|</span> &nbsp; <b>{row['coin'].upper()}USDT</b>
-                        </div>
-                    </div>
-                    <div style="margin: 15px 0;">
-                        <div class="{pnl_class}">{pnl_pct:+.2f}%</div>
-                        <div style="color:{'#02c076' if pnl_abs >= 0 else '#f84960'}; font-size: 0.9rem;">${pnl_abs:+.2f}</div>
-                    </div>
-                    <div style="display: grid; grid-template-columns: 1fr 1fr; gap: 10px;">
-                        <div>
-                            <div class="binance-label">Entry Price</div>
-                            <div class="binance-value">{row['avg_price']:,.2f}</div>
-                        </div>
-                        <div>
-                            <div class="binance-label">Mark Price</div>
-                            <div class="binance-value">{cur_price:,.2f}</div>
-                        </div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
-                
-                if st.button(f"Close Position", key=f"close_{row['id']}", use_container_width=True):
-                    close_position(row['id'], cur_price)
-                    st.success(f"Position {row['coin']} Closed!")
-                    st.rerun()
-        
-        with col_w3:
-            total_pnl_pct = (total_pnl / total_entry_val * 100) if total_entry_val > 0 else 0
-            st.metric("Unrealized P&L", f"${total_pnl:,.2f}", delta=f"{total_pnl_pct:+.2f}%")
+        render_open_positions(open_pos_df)
     else:
         st.info("No active trades found. Tokens purchased in 'Paper' mode will appear here.")
-        with col_w3:
-            st.metric("Unrealized P&L", "$0.00")
+
+    # --- MONTE CARLO RISK (VaR / CVaR / liquidation) ---
+    if not open_pos_df.empty:
+        st.divider()
+        st.subheader("🎲 Risk: Monte Carlo VaR & Liquidation")
+        symbol_of = {}
+        for c in all_coins:
+            symbol_of.setdefault(c['name'].lower(), c['symbol'].upper())
+            symbol_of.setdefault(c['symbol'].lower(), c['symbol'].upper())
+        prices = live_price_lookup(all_coins)
+        risk_rows = open_pos_df.assign(symbol=open_pos_df['coin'].str.lower().map(symbol_of)).dropna(subset=['symbol'])
+        horizon = {"1h": 60, "4h": 240, "24h": 1440}[st.select_slider("Horizon", options=["1h", "4h", "24h"], value="1h", key="risk_horizon")]
+        if risk_rows.empty:
+            st.caption("No open position maps to a tracked coin.")
+        else:
+            # Hashable, order-stable cache key: (book, marks, horizon)
+            positions_key = tuple(tuple(sorted({"id": int(r.id), "symbol": r.symbol, "amount": float(r.amount), "avg_price": float(r.avg_price), "leverage": int(r.leverage or 1)}.items())) for r in risk_rows.itertuples())
+            marks_key = tuple(sorted((s, float(prices[s.lower()])) for s in set(risk_rows['symbol'])))
+            # Reuse the live rolling covariance when it covers the book, else risk.py estimates from ticks
+            live_cov = get_correlation_engine().covariance([s for s, _ in marks_key])
+            if live_cov is not None:
+                report = fetch_portfolio_risk(positions_key, marks_key, horizon, live_cov[1], live_cov[2])
+            else:
+                report = fetch_portfolio_risk(positions_key, marks_key, horizon)
+            r1, r2, r3, r4 = st.columns(4)
+            r1.metric("VaR 95%", f"${report['var_95']:,.2f}")
+            r2.metric("VaR 99%", f"${report['var_99']:,.2f}")
+            r3.metric("CVaR 99%", f"${report['cvar_99']:,.2f}", help="Average loss in the worst 1% of paths")
+            r4.metric("P(any liquidation)", f"{report['p_any_liquidation'] * 100:.1f}%")
+            st.dataframe(pd.DataFrame(report['positions']).rename(columns={'p_liquidation': 'P(liquidation)', 'var_99': 'VaR 99%', 'cvar_99': 'CVaR 99%'}), use_container_width=True, hide_index=True)
+            st.caption("Instant stress shocks (all coins at once)")
+            st.dataframe(pd.DataFrame(report['stress']), use_container_width=True, hide_index=True)
+            note = f" · no tick history for {', '.join(report['no_history'])}" if report['no_history'] else ""
+            st.caption(f"{report['paths']:,} paths over {horizon // 60}h from {report['return_samples']:,} one-minute returns, {report['seconds'] * 1000:,.0f} ms{note}")
 
     st.divider()
     st.subheader("📜 Complete Trade History")
-    trades_df = get_all_trades()
+    trades_df = get_all_trades(account_id)
     if not trades_df.empty:
         if mode_filter != "All":
             trades_df = trades_df[trades_df['mode'] == mode_filter]
@@ -446,3 +739,51 @@ with tab3:
     else:
         st.info("No trade history found. Start trading in Tab 2 to build your portfolio.")
 
+# --- TAB 4: SYSTEM HEALTH ---
+with tab4:
+    st.title("🩺 System Health")
+    st.caption(f"Dashboard metrics: http://127.0.0.1:{APP_METRICS_PORT}/metrics  |  Collector metrics: {COLLECTOR_METRICS_URL}")
+
+    # --- COLLECTOR (scraped from its /metrics endpoint) ---
+    st.subheader("📡 Data Collector")
+    collector_rows = fetch_collector_metrics()
+
+    if collector_rows:
+        def collector_total(name, label_filter=""):
+            return sum(r['value'] for r in collector_rows if r['metric'] == name and label_filter in r['labels'])
+
+        http_count = collector_total("http_request_duration_seconds_count")
+        http_avg_ms = collector_total("http_request_duration_seconds_sum") / http_count * 1000 if http_count else 0
+        db_count = collector_total("db_write_duration_seconds_count")
+        db_avg_ms = collector_total("db_write_duration_seconds_sum") / db_count * 1000 if db_count else 0
+        rate_limited = collector_total("http_responses_total", 'status="429"')
+
+        h1, h2, h3, h4 = st.columns(4)
+        h1.metric("Rows Ingested", f"{collector_total('collector_rows_ingested_total'):,.0f}")
+        h2.metric("Ingest Rate", f"{collector_total('collector_ingest_rows_per_second'):,.0f} rows/s")
+        h3.metric("Avg API Latency", f"{http_avg_ms:,.0f} ms", delta=f"{rate_limited:,.0f} x 429", delta_color="inverse")
+        h4.metric("Avg DB Write", f"{db_avg_ms:,.1f} ms" if db_count else "N/A",
+                  help="Collector's own commits. With DB_WRITER_ADDRESS the writer service records them on its /metrics (port 9110).")
+
+        staleness = pd.DataFrame([r for r in collector_rows if r['metric'] == "collector_tick_age_seconds"])
+        if not staleness.empty:
+            staleness['coin'] = staleness['labels'].str.extract(r'coin="([^"]+)"', expand=False)
+            st.caption("Tick staleness per coin (seconds since CoinGecko updated the stored quote)")
+            st.bar_chart(staleness.set_index('coin')['value'], height=200)
+    else:
+        st.warning("Collector metrics unavailable. Is `data_collector.py` running?")
+
+    # --- DASHBOARD PROCESS ---
+    st.subheader("🖥️ Dashboard Process")
+    hit_ratio = metrics.cache_hit_ratio("genai_client")
+    rerun_p95 = metrics.APP_RERUN.quantile(0.95)
+    llm_seconds = sum(v for name, _, v in metrics.LLM_LATENCY.samples() if name.endswith("_sum"))
+    a1, a2, a3, a4 = st.columns(4)
+    a1.metric("Current Run", f"{(time.perf_counter() - _run_started) * 1000:,.0f} ms")
+    a2.metric("Rerun p95", f"≤ {rerun_p95 * 1000:,.0f} ms" if rerun_p95 else "N/A")
+    a3.metric("Gemini Client Cache Hit", f"{hit_ratio * 100:.0f}%" if hit_ratio is not None else "N/A")
+    a4.metric("Ticks per LLM Second", f"{metrics.LLM_CONTEXT_TICKS.value() / llm_seconds:,.0f}" if llm_seconds else "N/A",
+              help="Price ticks summarized into Gemini prompts per second spent waiting on Gemini")
+    st.dataframe(pd.DataFrame(metrics.REGISTRY.snapshot()), use_container_width=True, hide_index=True)
+
+metrics.APP_RERUN.observe(time.perf_counter() - _run_started)
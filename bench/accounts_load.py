@@ -0,0 +1,128 @@
+"""
+Concurrent paper-account load test.
+
+Creates N strategy accounts in a temporary trades.db and spreads them over
+worker processes that place random BUY/SELL trades for a fixed duration,
+each through database_manager.log_trade with its own account_id. Reports
+committed trades/second, lock errors and per-trade latency, then checks
+that every account's summary rows still match its own ledger. `--direct`
+runs the same load with every worker writing to SQLite itself.
+
+Usage:
+    python -m bench.accounts_load --accounts 200 --workers 8 --seconds 10
+    python -m bench.accounts_load --direct
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import database_manager
+import db_writer
+from bench.synth import SYNTH_COINS
+
+
+def _worker(db_path, address, account_ids, seconds, seed, result_queue):
+    database_manager.DB_NAME = db_path
+    db_writer.WRITER_ADDRESS = address or ""
+    rng = random.Random(seed)
+    held = {a: {} for a in account_ids}
+    trades = errors = 0
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        account_id = rng.choice(account_ids)
+        coin = rng.choice(SYNTH_COINS[:5])
+        price = 100 * (1 + rng.uniform(-0.05, 0.05))
+        amount = held[account_id].get(coin, 0.0)
+        side = "SELL" if amount and rng.random() < 0.5 else "BUY"
+        size = amount if side == "SELL" else 0.1
+        t0 = time.perf_counter()
+        try:
+            database_manager.log_trade(coin, side, price, size, "bench", "Paper", 1, account_id)
+        except sqlite3.OperationalError:
+            errors += 1  # "database is locked"
+            continue
+        latencies.append(time.perf_counter() - t0)
+        held[account_id][coin] = amount + size if side == "BUY" else 0.0
+        trades += 1
+    result_queue.put((trades, errors, latencies))
+
+
+def _consistent(db_path):
+    """True when every account's portfolio_summary matches its position_summary rows."""
+    conn = sqlite3.connect(db_path)
+    mismatched = conn.execute('''
+        SELECT COUNT(*) FROM portfolio_summary p
+        JOIN (SELECT account_id, mode, SUM(cost_basis) AS cost, SUM(trades) AS trades
+              FROM position_summary GROUP BY account_id, mode) s USING (account_id, mode)
+        WHERE ABS(p.cost_basis - s.cost) > 1e-6 OR p.trades != s.trades
+    ''').fetchone()[0]
+    conn.close()
+    return mismatched == 0
+
+
+def run(accounts=200, workers=8, seconds=10.0, direct=False, port=6012):
+    workdir = tempfile.mkdtemp(prefix="gravity_accounts_")
+    db_path = os.path.join(workdir, "trades.db")
+    database_manager.DB_NAME = db_path
+    database_manager.init_db()
+    account_ids = [database_manager.create_account(f"bot-{i}", "strategy") for i in range(accounts)]
+
+    address = None
+    server = None
+    if not direct:
+        address = f"127.0.0.1:{port}"
+        env = dict(os.environ, DB_WRITER_ADDRESS=address)
+        server = subprocess.Popen([sys.executable, "db_writer.py"], env=env, stdout=subprocess.DEVNULL)
+        time.sleep(1.0)
+
+    results = mp.Queue()
+    started = time.perf_counter()
+    # Each worker owns a disjoint slice of accounts, like one bot process per strategy group
+    procs = [mp.Process(target=_worker, args=(db_path, address, account_ids[i::workers], seconds, i, results))
+             for i in range(workers)]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in range(workers)]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    if server:
+        server.terminate()
+
+    latencies = sorted(l for _, _, ls in stats for l in ls)
+    committed = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM trade_history").fetchone()[0]
+    return {
+        "mode": "direct" if direct else "single_writer",
+        "accounts": accounts,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "committed_trades": committed,
+        "trades_per_sec": committed / elapsed,
+        "lock_errors": sum(e for _, e, _ in stats),
+        "trade_p50_ms": latencies[len(latencies) // 2] * 1e3 if latencies else None,
+        "trade_p99_ms": latencies[int(len(latencies) * 0.99)] * 1e3 if latencies else None,
+        "summaries_consistent": _consistent(db_path),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test many paper accounts trading at once.")
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=6012)
+    parser.add_argument("--direct", action="store_true", help="Workers write to SQLite directly")
+    args = parser.parse_args()
+    print(json.dumps(run(args.accounts, args.workers, args.seconds, args.direct, args.port), indent=2))
+
+
+if __name__ == "__main__":
+    main()
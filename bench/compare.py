@@ -0,0 +1,44 @@
+"""
+Compares two run_bench JSON reports.
+
+Usage:
+    python -m bench.compare baseline.json candidate.json [--threshold 1.10]
+
+Exits non-zero when any benchmark's p50 regressed by more than `threshold`x.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline, candidate, threshold=1.10):
+    regressions = []
+    print(f"{'benchmark':<26}{'base p50':>12}{'new p50':>12}{'ratio':>9}")
+    for name, new in candidate["results"].items():
+        old = baseline["results"].get(name)
+        if not old:
+            print(f"{name:<26}{'-':>12}{new['p50_ms']:>10.2f}ms{'new':>9}")
+            continue
+        ratio = new["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("inf")
+        flag = "  <-- regression" if ratio > threshold else ""
+        print(f"{name:<26}{old['p50_ms']:>10.2f}ms{new['p50_ms']:>10.2f}ms{ratio:>8.2f}x{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff two benchmark reports.")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=1.10)
+    args = parser.parse_args()
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    sys.exit(1 if compare(baseline, candidate, args.threshold) else 0)
+
+
+if __name__ == "__main__":
+    main()
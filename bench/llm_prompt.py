@@ -0,0 +1,100 @@
+"""
+Prompt size for get_trading_signal: the former one-line-per-tick prompt
+(at its 12-tick cap and stretched to the full lookback) next to
+ai_brain.build_signal_prompt over SIGNAL_LOOKBACK ticks. Reports estimated
+tokens, ticks of context per token and build time on a synthetic random
+walk. With --gemini (needs GEMINI_API_KEY) each prompt is also sent and the
+latency, billed prompt tokens and ticks per LLM second are reported.
+
+Usage:
+    python -m bench.llm_prompt --ticks 240 --budget 600
+    python -m bench.llm_prompt --gemini --rounds 5
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import datetime
+
+import ai_brain
+
+
+def _history(ticks, seed=7):
+    rng = random.Random(seed)
+    price, start = 64_000.0, int(time.time()) - 60 * ticks
+    history = []
+    for i in range(ticks):
+        price *= 1 + rng.gauss(0, 0.001)
+        history.append({"price_usd": price, "timestamp": datetime.fromtimestamp(start + 60 * i).strftime("%Y-%m-%d %H:%M:%S")})
+    return history
+
+
+def _verbose_prompt(coin_symbol, history):
+    """get_trading_signal's prompt before build_signal_prompt."""
+    history_str = "\n".join([f"{item['timestamp']}: ${item['price_usd']:,.2f}" for item in history])
+    return f"""
+    Analyze the following 1-hour price trend for {coin_symbol}:
+    {history_str}
+
+    Is the price stabilizing, crashing, or pumping?
+    Return a trading decision.
+
+    Strictly return a JSON object with:
+    'action' (BUY/SELL/HOLD),
+    'confidence' (0-100),
+    'reasoning' (Brief explanation of the trend).
+    """
+
+
+def _send(client, prompt, rounds):
+    latencies, billed = [], []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        response = ai_brain._generate(client, prompt)
+        latencies.append(time.perf_counter() - started)
+        usage = getattr(response, "usage_metadata", None)
+        billed.append(usage.prompt_token_count if usage is not None else None)
+    latencies.sort()
+    return {"latency_p50_s": round(latencies[len(latencies) // 2], 3), "billed_prompt_tokens": billed[0]}
+
+
+def run(ticks=240, budget=None, gemini=False, rounds=5, repeat=200):
+    budget = budget or ai_brain.PROMPT_TOKEN_BUDGET
+    history = _history(ticks)
+    variants = {
+        "verbose_12": (lambda: _verbose_prompt("BTC", history[-12:]), 12),
+        f"verbose_{ticks}": (lambda: _verbose_prompt("BTC", history), ticks),
+        f"compact_{ticks}": (lambda: ai_brain.build_signal_prompt("BTC", history, budget)[0], ticks),
+    }
+    client = ai_brain._get_client(os.environ["GEMINI_API_KEY"]) if gemini else None
+    report = {"ticks": ticks, "budget": budget}
+    for name, (build, covered) in variants.items():
+        started = time.perf_counter()
+        for _ in range(repeat):
+            prompt = build()
+        tokens = ai_brain.estimate_tokens(prompt)
+        entry = {
+            "estimated_tokens": tokens,
+            "ticks_per_token": round(covered / tokens, 3),
+            "build_us": round((time.perf_counter() - started) / repeat * 1e6, 1),
+        }
+        if client is not None:
+            entry.update(_send(client, prompt, rounds))
+            entry["ticks_per_llm_second"] = round(covered / entry["latency_p50_s"], 1)
+        report[name] = entry
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare verbose and compact Gemini signal prompts.")
+    parser.add_argument("--ticks", type=int, default=ai_brain.SIGNAL_LOOKBACK)
+    parser.add_argument("--budget", type=int, default=None, help="Token budget (default PROMPT_TOKEN_BUDGET)")
+    parser.add_argument("--gemini", action="store_true", help="Also send each prompt to Gemini")
+    parser.add_argument("--rounds", type=int, default=5, help="Gemini calls per prompt with --gemini")
+    args = parser.parse_args()
+    print(json.dumps(run(args.ticks, args.budget, args.gemini, args.rounds), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Matching-engine load test: rests N synthetic limit/stop/OCO orders in a
+temporary trades.db, then replays a random-walk tick stream through
+order_engine.OrderEngine and reports per-tick matching latency plus the
+cost of booking fills in batches.
+
+Usage:
+    python -m bench.order_book --orders 100000 --ticks 20000
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import database_manager
+import order_engine
+from bench.synth import SYNTH_COINS
+
+SIDES_TYPES = [("BUY", "LIMIT"), ("SELL", "LIMIT"), ("BUY", "STOP"), ("SELL", "STOP")]
+
+
+def _rest_orders(cursor, orders, coins, spread, seed):
+    rng = random.Random(seed)
+    for i in range(orders):
+        symbol = coins[i % len(coins)]
+        if i % 10 == 0:
+            # Every tenth order is an OCO take-profit/stop-loss pair
+            database_manager.apply_place_oco(cursor, symbol, symbol, "SELL", 1.0,
+                                             100 * (1 + rng.uniform(0.001, spread)),
+                                             100 * (1 - rng.uniform(0.001, spread)))
+            continue
+        side, order_type = rng.choice(SIDES_TYPES)
+        # Resting orders sit on the side of the market where they wait to be crossed
+        above = (side, order_type) in (("SELL", "LIMIT"), ("BUY", "STOP"))
+        offset = rng.uniform(0.001, spread)
+        price = 100 * (1 + offset if above else 1 - offset)
+        database_manager.apply_place_order(cursor, symbol, symbol, side, order_type, price, 1.0)
+
+
+def run(orders=100_000, ticks=20_000, spread=0.2, volatility=0.002, seed=7):
+    workdir = tempfile.mkdtemp(prefix="gravity_orders_")
+    database_manager.DB_NAME = os.path.join(workdir, "trades.db")
+    database_manager.init_db()
+    coins = SYNTH_COINS[:5]
+
+    started = time.perf_counter()
+    conn = sqlite3.connect(database_manager.DB_NAME)
+    with conn:
+        _rest_orders(conn.cursor(), orders, coins, spread, seed)
+    conn.close()
+    insert_s = time.perf_counter() - started
+
+    engine = order_engine.OrderEngine()
+    started = time.perf_counter()
+    resting = engine.load()
+    load_s = time.perf_counter() - started
+
+    rng = random.Random(seed + 1)
+    prices = {c: 100.0 for c in coins}
+    samples = []
+    fills = 0
+    flush_s = 0.0
+    for i in range(ticks):
+        symbol = coins[i % len(coins)]
+        prices[symbol] *= 1 + rng.gauss(0, volatility)
+        t0 = time.perf_counter()
+        fills += len(engine.on_tick(symbol, prices[symbol]))
+        samples.append(time.perf_counter() - t0)
+        if i % len(coins) == len(coins) - 1:
+            # One booking transaction per tick event (all coins), as in process()
+            t0 = time.perf_counter()
+            engine.flush()
+            flush_s += time.perf_counter() - t0
+
+    samples.sort()
+    return {
+        "resting_orders": resting,
+        "ticks": ticks,
+        "fills": fills,
+        "insert_seconds": round(insert_s, 2),
+        "load_seconds": round(load_s, 3),
+        "match_p50_us": samples[len(samples) // 2] * 1e6,
+        "match_p99_us": samples[int(len(samples) * 0.99)] * 1e6,
+        "match_max_us": samples[-1] * 1e6,
+        "match_mean_us": statistics.fmean(samples) * 1e6,
+        "booking_seconds_total": round(flush_s, 3),
+        "left_resting": len(engine.orders),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the paper order engine.")
+    parser.add_argument("--orders", type=int, default=100_000)
+    parser.add_argument("--ticks", type=int, default=20_000)
+    parser.add_argument("--spread", type=float, default=0.2, help="Max distance of resting orders from 100")
+    parser.add_argument("--volatility", type=float, default=0.002, help="Per-tick random-walk sigma")
+    args = parser.parse_args()
+    print(json.dumps(run(args.orders, args.ticks, args.spread, args.volatility), indent=2))
+
+
+if __name__ == "__main__":
+    main()
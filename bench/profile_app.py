@@ -0,0 +1,59 @@
+"""
+Opt-in profiler around one full `app.py` script run (headless, via
+Streamlit's AppTest harness, so no browser or server is needed).
+
+Usage:
+    python -m bench.profile_app                       # cProfile, top 30 by cumulative time
+    python -m bench.profile_app --profiler pyinstrument --out profile.html
+    python -m bench.profile_app --out app.prof        # open with snakeviz / pstats
+"""
+import argparse
+import cProfile
+import io
+import pstats
+import time
+
+
+def _run_app(timeout):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file("app.py", default_timeout=timeout)
+    at.run()
+    return at
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Profile a full app.py script run.")
+    parser.add_argument("--profiler", choices=["cprofile", "pyinstrument"], default="cprofile")
+    parser.add_argument("--timeout", type=float, default=120)
+    parser.add_argument("--top", type=int, default=30)
+    parser.add_argument("--out", help="Save .prof (cProfile) or .html (pyinstrument)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.profiler == "pyinstrument":
+        from pyinstrument import Profiler  # optional: pip install pyinstrument
+        profiler = Profiler()
+        profiler.start()
+        at = _run_app(args.timeout)
+        profiler.stop()
+        if args.out:
+            with open(args.out, "w") as f:
+                f.write(profiler.output_html())
+        else:
+            print(profiler.output_text(unicode=True, color=False))
+    else:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        at = _run_app(args.timeout)
+        profiler.disable()
+        if args.out:
+            profiler.dump_stats(args.out)
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(args.top)
+        print(stream.getvalue())
+
+    print(f"Script run: {time.perf_counter() - started:.2f}s, exceptions: {len(at.exception)}")
+
+
+if __name__ == "__main__":
+    main()
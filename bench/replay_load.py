@@ -0,0 +1,172 @@
+"""
+Upstream load test against replay_server.py: starts the replay server in
+its own process, then drives simulated dashboard sessions (markets page,
+1-day chart, DEX quote per rerun, through the real crypto_data client) and
+collectors (/coins/markets for a watchlist, parsed with
+data_collector.tick_rows) from client processes for a fixed duration.
+Reports throughput, per-operation latency percentiles and the status
+codes seen (injected 429s included).
+
+Usage:
+    python -m bench.replay_load --sessions 50 --collectors 5 --seconds 20
+    python -m bench.replay_load --coins 1000 --latency-ms 80 --jitter-ms 40 --error-rate 0.05 --procs 4
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+import crypto_data
+import data_collector
+import metrics
+import one_inch_wrapper
+
+ETH = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
+
+
+def _session(coin_ids, think, deadline, samples):
+    """One dashboard session: what a rerun fetches upstream, every `think` seconds."""
+    i = 0
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        coins = crypto_data.get_coins_list(per_page=100)
+        samples.append(("markets_page", isinstance(coins, list) and bool(coins), time.perf_counter() - started))
+
+        t0 = time.perf_counter()
+        history = crypto_data.get_historical_data(coin_ids[i % len(coin_ids)], days=1)
+        samples.append(("market_chart", not history.empty, time.perf_counter() - t0))
+
+        t0 = time.perf_counter()
+        dex_price = crypto_data.get_dex_price(ETH)
+        samples.append(("quote", dex_price > 0, time.perf_counter() - t0))
+        i += 1
+        time.sleep(max(think - (time.perf_counter() - started), 0))
+
+
+def _collector(coin_ids, interval, deadline, samples):
+    """One collector: data_collector.fetch_and_store_data's request and parse, without the write."""
+    params = {"vs_currency": "usd", "ids": ",".join(coin_ids), "order": "market_cap_desc",
+              "sparkline": False, "price_change_percentage": "24h"}
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        response = requests.get(f"{data_collector.COINGECKO_BASE_URL}/coins/markets", params=params, timeout=10)
+        metrics.record_http("coingecko", "/coins/markets", response.status_code)
+        ok = response.status_code == 200
+        if ok:
+            ok = len(data_collector.tick_rows(response.json(), int(time.time()))) == len(coin_ids)
+        samples.append(("collector_markets", ok, time.perf_counter() - started))
+        time.sleep(max(interval - (time.perf_counter() - started), 0))
+
+
+def _client(base_url, coin_ids, sessions, collectors, think, interval, seconds, result_queue):
+    crypto_data.COINGECKO_BASE_URL = data_collector.COINGECKO_BASE_URL = f"{base_url}/api/v3"
+    one_inch_wrapper.ONE_INCH_BASE_URL = f"{base_url}/swap/v6.0"
+    os.environ.setdefault("ONE_INCH_API_KEY", "replay")
+    import pandas  # noqa: F401  (get_historical_data imports it lazily; keep that out of the first samples)
+    samples = []
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_session, args=(coin_ids, think, deadline, samples)) for _ in range(sessions)]
+    threads += [threading.Thread(target=_collector, args=(coin_ids, interval, deadline, samples)) for _ in range(collectors)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    statuses = {}
+    for _, key, value in metrics.HTTP_RESPONSES.samples():
+        status = dict(key)["status"]
+        statuses[status] = statuses.get(status, 0) + int(value)
+    result_queue.put((samples, statuses))
+
+
+def _percentile(sorted_values, q):
+    return sorted_values[min(int(len(sorted_values) * q), len(sorted_values) - 1)]
+
+
+def run(sessions=50, collectors=5, seconds=20.0, procs=2, coins=100, speed=60.0, latency_ms=0.0,
+        jitter_ms=0.0, error_rate=0.0, think=1.0, interval=1.0, watchlist=25, port=8790):
+    server = subprocess.Popen([sys.executable, "replay_server.py", "--port", str(port), "--coins", str(coins),
+                               "--speed", str(speed), "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms),
+                               "--error-rate", str(error_rate), "--start", "2024-01-01", "--metrics-port", "0"],
+                              stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/stats", timeout=1)
+            break
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    ids = [c["id"] for c in requests.get(f"{base_url}/api/v3/coins/markets", params={"per_page": watchlist}).json()]
+
+    results = mp.Queue()
+    started = time.perf_counter()
+    workers = [mp.Process(target=_client, args=(base_url, ids, sessions // procs + (i < sessions % procs),
+                                                collectors // procs + (i < collectors % procs),
+                                                think, interval, seconds, results)) for i in range(procs)]
+    for p in workers:
+        p.start()
+    outcomes = [results.get() for _ in workers]
+    for p in workers:
+        p.join()
+    elapsed = time.perf_counter() - started
+    server_stats = requests.get(f"{base_url}/stats").json()
+    server.terminate()
+
+    statuses = {}
+    by_op = {}
+    for samples, counts in outcomes:
+        for status, n in counts.items():
+            statuses[status] = statuses.get(status, 0) + n
+        for op, ok, duration in samples:
+            by_op.setdefault(op, []).append((duration, ok))
+    report = {
+        "sessions": sessions,
+        "collectors": collectors,
+        "client_procs": procs,
+        "coins": coins,
+        "seconds": round(elapsed, 2),
+        "requests": sum(statuses.values()),
+        "requests_per_sec": round(sum(statuses.values()) / elapsed, 1),
+        "status_codes": statuses,
+        "server": server_stats,
+    }
+    for op, values in sorted(by_op.items()):
+        durations = sorted(d for d, _ in values)
+        report[op] = {
+            "calls": len(values),
+            "failed": sum(1 for _, ok in values if not ok),
+            "p50_ms": round(_percentile(durations, 0.50) * 1e3, 1),
+            "p95_ms": round(_percentile(durations, 0.95) * 1e3, 1),
+            "p99_ms": round(_percentile(durations, 0.99) * 1e3, 1),
+        }
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the upstream clients against the replay server.")
+    parser.add_argument("--sessions", type=int, default=50, help="Simulated dashboard sessions")
+    parser.add_argument("--collectors", type=int, default=5)
+    parser.add_argument("--seconds", type=float, default=20.0)
+    parser.add_argument("--procs", type=int, default=2, help="Client processes the sessions/collectors are spread over")
+    parser.add_argument("--coins", type=int, default=100, help="Replayed universe size")
+    parser.add_argument("--watchlist", type=int, default=25, help="Coins each collector requests")
+    parser.add_argument("--speed", type=float, default=60.0)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--think", type=float, default=1.0, help="Seconds between a session's reruns")
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between a collector's fetches")
+    parser.add_argument("--port", type=int, default=8790)
+    args = parser.parse_args()
+    print(json.dumps(run(args.sessions, args.collectors, args.seconds, args.procs, args.coins, args.speed,
+                         args.latency_ms, args.jitter_ms, args.error_rate, args.think, args.interval,
+                         args.watchlist, args.port), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Monte Carlo VaR timing: builds a synthetic crypto_bot.db, opens a leveraged
+book across N coins and times risk.portfolio_risk() for several worker
+counts (1 = in-process, >1 = process pool).
+
+Usage:
+    python -m bench.risk_mc --coins 5 --positions 20 --paths 100000 --workers 1,4
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import risk
+from bench import synth
+
+LEVERAGES = [1, 5, 10, 20, 50, 100, 125]
+
+
+def run(coins=5, positions=20, paths=100_000, workers=(1, 4), repeat=3, seed=7):
+    workdir = tempfile.mkdtemp(prefix="gravity_risk_")
+    price_db = os.path.join(workdir, "crypto_bot.db")
+    synth.generate_price_db(price_db, coins * risk.RETURN_LOOKBACK, coins, seed)
+
+    conn = sqlite3.connect(price_db)
+    marks = {}
+    for (symbol,) in conn.execute("SELECT symbol FROM coins ORDER BY coin_id").fetchall():
+        marks[symbol] = conn.execute('''
+            SELECT t.price FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+            WHERE c.symbol = ? ORDER BY t.ts DESC LIMIT 1
+        ''', (symbol,)).fetchone()[0]
+    conn.close()
+
+    rng = random.Random(seed)
+    symbols = sorted(marks)
+    book = [{"id": i, "symbol": s, "amount": 1.0, "avg_price": marks[s] * rng.uniform(0.99, 1.01),
+             "leverage": rng.choice(LEVERAGES)} for i, s in enumerate(rng.choice(symbols) for _ in range(positions))]
+
+    results = {"coins": coins, "positions": positions, "paths": paths, "cpus": os.cpu_count()}
+    for w in workers:
+        risk.RISK_WORKERS = w
+        risk.portfolio_risk(book, marks, price_db, paths, seed=seed)  # Warm-up (starts the pool)
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            report = risk.portfolio_risk(book, marks, price_db, paths, seed=seed)
+            samples.append(time.perf_counter() - started)
+        results[f"workers_{w}_seconds"] = round(min(samples), 3)
+    results["var_99"] = report["var_99"]
+    results["p_any_liquidation"] = report["p_any_liquidation"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the Monte Carlo VaR engine.")
+    parser.add_argument("--coins", type=int, default=5)
+    parser.add_argument("--positions", type=int, default=20)
+    parser.add_argument("--paths", type=int, default=100_000)
+    parser.add_argument("--workers", default="1,4", help="Comma-separated worker counts to compare")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    workers = [int(w) for w in args.workers.split(",")]
+    print(json.dumps(run(args.coins, args.positions, args.paths, workers, args.repeat), indent=2))
+
+
+if __name__ == "__main__":
+    main()
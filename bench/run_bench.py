@@ -0,0 +1,152 @@
+"""
+Times the dashboard/collector hot paths against synthetic databases and
+emits JSON so runs can be diffed between commits (see bench/compare.py).
+
+Usage:
+    python -m bench.run_bench --price-rows 1000000 --trades 100000 --out results.json
+    python -m bench.run_bench --data bench_data   # reuse databases from bench.synth
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import data_collector
+import database_manager
+from bench import synth
+
+
+def _timeit(fn, repeat, ops=1):
+    """Runs `fn` `repeat` times; returns latency stats in ms and ops/second."""
+    fn()  # warm-up (page cache, imports)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    return {
+        "repeat": repeat,
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[min(int(len(samples) * 0.95), len(samples) - 1)] * 1000,
+        "min_ms": samples[0] * 1000,
+        "ops_per_sec": ops / statistics.fmean(samples) if samples else 0,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def run(price_db, trades_db, repeat=20, only=None):
+    """Runs every benchmark (or those named in `only`) and returns {name: stats}."""
+    import ai_brain
+    from crypto_data import resample_ohlc
+
+    ai_brain.BOT_DB = price_db
+    data_collector.DB_NAME = price_db
+    database_manager.DB_NAME = trades_db
+    symbol = sqlite3.connect(price_db).execute("SELECT symbol FROM coins LIMIT 1").fetchone()[0]
+    pulse = ai_brain.load_price_history(symbol, limit=100)
+    price_lookup = {s.lower(): 100.0 for s in synth.SYNTH_COINS}
+
+    def positions_with_pnl():
+        database_manager.compute_positions_pnl(database_manager.get_open_positions("Paper"), price_lookup)
+
+    def log_trades(n=200):
+        for _ in range(n):
+            database_manager.log_trade(symbol, "BUY", 100.0, 0.01, "Bench", "Paper", 10)
+
+    def round_trips(n=100):
+        # BUY then SELL: exercises FIFO lot consumption and the summary upserts
+        for _ in range(n):
+            database_manager.log_trade(symbol, "BUY", 100.0, 0.01, "Bench", "Paper", 10)
+            database_manager.log_trade(symbol, "SELL", 101.0, 0.01, "Bench", "Paper", 10)
+
+    markets = [{"symbol": s.lower(), "current_price": 100.0, "price_change_percentage_24h": 1.0,
+                "total_volume": 1e9, "last_updated": None} for s in synth.SYNTH_COINS]
+
+    next_ts = [int(time.time()) + 1]
+
+    def collector_insert(batches=50):
+        conn = sqlite3.connect(price_db)
+        for _ in range(batches):
+            data_collector.store_ticks(conn.cursor(), markets, next_ts[0])
+            next_ts[0] += 1
+            conn.commit()
+        conn.close()
+
+    cases = {
+        "fetch_recent_history": (lambda: ai_brain.fetch_recent_history(symbol), 1),
+        "fetch_pulse_history": (lambda: ai_brain.load_price_history(symbol, limit=100), 1),
+        "ohlc_resample": (lambda: resample_ohlc(pulse, "5min"), 1),
+        "get_all_trades": (database_manager.get_all_trades, 1),
+        "get_open_positions_pnl": (positions_with_pnl, 1),
+        "log_trade": (log_trades, 200),
+        "trade_round_trip": (round_trips, 200),
+        "portfolio_summary": (lambda: database_manager.get_portfolio_summary("Paper"), 1),
+        "collector_insert": (collector_insert, 50 * len(markets)),
+    }
+    results = {}
+    for name, (fn, ops) in cases.items():
+        if only and name not in only:
+            continue
+        # Write-heavy cases get fewer repeats so they don't grow the DB much
+        results[name] = _timeit(fn, max(repeat // 4, 2) if ops > 1 else repeat, ops)
+        print(f"{name:<26} p50 {results[name]['p50_ms']:>10.2f} ms   {results[name]['ops_per_sec']:>12,.0f} ops/s",
+              file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the dashboard hot paths.")
+    parser.add_argument("--data", help="Directory with crypto_bot.db/trades.db from bench.synth (skips generation)")
+    parser.add_argument("--price-rows", type=int, default=200_000)
+    parser.add_argument("--coins", type=int, default=10)
+    parser.add_argument("--trades", type=int, default=50_000)
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--only", nargs="*", help="Benchmark names to run")
+    parser.add_argument("--out", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    workdir = args.data or tempfile.mkdtemp(prefix="gravity_bench_")
+    price_db = os.path.join(workdir, "crypto_bot.db")
+    trades_db = os.path.join(workdir, "trades.db")
+    if not args.data:
+        synth.generate_price_db(price_db, args.price_rows, args.coins)
+        synth.generate_trades_db(trades_db, args.trades, args.positions, args.coins)
+
+    report = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "price_rows": sqlite3.connect(price_db).execute("SELECT COUNT(*) FROM ticks").fetchone()[0],
+            "trades": sqlite3.connect(trades_db).execute("SELECT COUNT(*) FROM trade_history").fetchone()[0],
+        },
+        "results": run(price_db, trades_db, args.repeat, args.only),
+    }
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Cold-start benchmark: times module imports and one headless `app.py`
+script run, each in a fresh interpreter so nothing is already cached in
+sys.modules. Emits the same JSON shape as run_bench, so two commits can be
+diffed with bench.compare.
+
+Usage:
+    python -m bench.startup --repeat 5 --out startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+
+from bench.run_bench import _git_commit
+
+IMPORT_TARGETS = ["ai_brain", "crypto_data", "database_manager", "data_collector"]
+
+# Runs app.py once under Streamlit's headless AppTest harness
+APP_RUN_SNIPPET = """
+import time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+print(time.perf_counter() - started)
+"""
+
+
+def _time_in_subprocess(code):
+    out = subprocess.check_output([sys.executable, "-c", code], text=True, stderr=subprocess.DEVNULL)
+    return float(out.strip().splitlines()[-1])
+
+
+def _stats(samples):
+    samples = sorted(samples)
+    return {
+        "repeat": len(samples),
+        "mean_ms": statistics.fmean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[-1] * 1000,
+        "min_ms": samples[0] * 1000,
+        "ops_per_sec": 1 / statistics.fmean(samples),
+    }
+
+
+def run(repeat=5, include_app=True):
+    results = {}
+    for module in IMPORT_TARGETS:
+        code = f"import time; s = time.perf_counter(); import {module}; print(time.perf_counter() - s)"
+        results[f"import_{module}"] = _stats([_time_in_subprocess(code) for _ in range(repeat)])
+        print(f"import {module:<22} p50 {results[f'import_{module}']['p50_ms']:>8.1f} ms", file=sys.stderr)
+    if include_app:
+        try:
+            results["app_cold_run"] = _stats([_time_in_subprocess(APP_RUN_SNIPPET) for _ in range(repeat)])
+            print(f"app.py cold run{'':<15} p50 {results['app_cold_run']['p50_ms']:>8.1f} ms", file=sys.stderr)
+        except subprocess.CalledProcessError:
+            print("Skipping app.py run (streamlit not importable)", file=sys.stderr)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import/startup time.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--no-app", action="store_true", help="Only time module imports")
+    parser.add_argument("--out", help="Write JSON here instead of stdout")
+    args = parser.parse_args()
+
+    report = {
+        "meta": {"commit": _git_commit(), "timestamp": datetime.now().isoformat(timespec="seconds"),
+                 "cwd": os.getcwd()},
+        "results": run(args.repeat, include_app=not args.no_app),
+    }
+    payload = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+
+
+if __name__ == "__main__":
+    main()
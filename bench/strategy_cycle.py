@@ -0,0 +1,83 @@
+"""
+Strategy-runner cadence test: builds a synthetic crypto_bot.db with N coins
+and a temporary trades.db, then times StrategyRunner.run_cycle() over the
+whole watchlist (evaluate on the worker pool, size, book one batch).
+
+By default the last hour of ticks is served from a private shared-memory
+tick ring, as when the collector is running; `--sqlite` reads every coin
+from the ticks table instead. `--volatility` controls how many coins move
+enough to trade.
+
+Usage:
+    python -m bench.strategy_cycle --coins 500 --cycles 20
+    python -m bench.strategy_cycle --coins 500 --sqlite
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+
+os.environ.setdefault("TICK_RING_NAME", f"gravity_bench_{os.getpid()}")
+
+import ai_brain
+import database_manager
+import strategy_runner
+import tick_ring
+from bench import synth
+
+
+def run(coins=500, cycles=20, workers=strategy_runner.RUNNER_WORKERS, use_ring=True, volatility=0.01, seed=7):
+    workdir = tempfile.mkdtemp(prefix="gravity_strategy_")
+    price_db = os.path.join(workdir, "crypto_bot.db")
+    database_manager.DB_NAME = os.path.join(workdir, "trades.db")
+    ai_brain.BOT_DB = price_db
+
+    # A per-minute sigma of 1% moves a share of coins past the 1.5% hourly signal threshold
+    synth.generate_price_db(price_db, coins * 60, coins, seed, volatility)
+
+    ring = None
+    if use_ring:
+        ring = tick_ring.TickRing.create(capacity=64, max_coins=max(coins, tick_ring.RING_MAX_COINS))
+        tick_ring.seed_from_db(ring, price_db, limit=60)
+        # Readers in this process use the bench's own segment directly (attaching
+        # to a segment this process created would confuse the resource tracker)
+        tick_ring._reader, tick_ring._reader_checked = ring, float("inf")
+    try:
+        runner = strategy_runner.StrategyRunner(workers=workers)
+        samples = [runner.run_cycle() for _ in range(cycles)]
+        runner.pool.shutdown()
+    finally:
+        if ring is not None:
+            tick_ring._reader = None
+            ring.close()
+
+    totals = sorted(s["total_ms"] for s in samples)
+    return {
+        "source": "ring" if use_ring else "sqlite",
+        "coins": coins,
+        "workers": workers,
+        "cycles": cycles,
+        "orders_first_cycle": samples[0]["orders"],
+        "orders_total": sum(s["orders"] for s in samples),
+        "cycle_p50_ms": totals[len(totals) // 2],
+        "cycle_max_ms": totals[-1],
+        "evaluate_mean_ms": statistics.fmean(s["evaluate_ms"] for s in samples),
+        "submit_mean_ms": statistics.fmean(s["submit_ms"] for s in samples),
+        "cadence_budget_ms": strategy_runner.CYCLE_SECONDS * 1e3,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time strategy-runner cycles over a large watchlist.")
+    parser.add_argument("--coins", type=int, default=500)
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=strategy_runner.RUNNER_WORKERS)
+    parser.add_argument("--volatility", type=float, default=0.01, help="Per-minute random-walk sigma")
+    parser.add_argument("--sqlite", action="store_true", help="Read history from SQLite instead of the tick ring")
+    args = parser.parse_args()
+    print(json.dumps(run(args.coins, args.cycles, args.workers, not args.sqlite, args.volatility), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Live-mode swap preparation latency against replay_server.py (with injected
+upstream latency): the four 1inch calls a USDT -> coin swap needs (quote,
+allowance, approval calldata, swap calldata) made one after another on a
+fresh client, the same four through swap_pipeline.SwapPipeline without a
+prefetch (parallel, keep-alive), and SwapPipeline.get after prefetch() had
+time to finish (the click after the user has looked at the form).
+
+Usage:
+    python -m bench.swap_pipeline --rounds 30 --latency-ms 120 --jitter-ms 30
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import requests
+
+import one_inch_wrapper
+import swap_pipeline
+
+WALLET = "0x00000000000000000000000000000000000a11ce"
+
+
+def _sequential(src, dst, amount, slippage):
+    """What a click would cost without the pipeline: a new client, then each call in turn."""
+    service = one_inch_wrapper.OneInchService()
+    service.get_quote(src, dst, amount)
+    allowance = service.get_allowance(src, WALLET)
+    service.get_approve_transaction(src, amount)
+    service.get_swap_transaction(src, dst, amount, WALLET, slippage, True)
+    return "error" not in allowance
+
+
+def _p50(values):
+    values = sorted(values)
+    return round(values[len(values) // 2] * 1e3, 1)
+
+
+def run(rounds=30, latency_ms=120.0, jitter_ms=30.0, port=8791):
+    server = subprocess.Popen([sys.executable, "replay_server.py", "--port", str(port), "--latency-ms", str(latency_ms),
+                               "--jitter-ms", str(jitter_ms), "--start", "2024-01-01", "--metrics-port", "0"],
+                              stdout=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/stats", timeout=1)
+            break
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    one_inch_wrapper.ONE_INCH_BASE_URL = f"{base_url}/swap/v6.0"
+    os.environ.setdefault("ONE_INCH_API_KEY", "replay")
+
+    src, dst, slippage = swap_pipeline.USDT_ADDRESS, swap_pipeline.NATIVE_TOKEN, 1
+    pipeline = swap_pipeline.SwapPipeline()
+    sequential, miss, hit = [], [], []
+    failures = 0
+    try:
+        for i in range(rounds):
+            # A different amount each round so nothing is cached between modes
+            amount = (1_000 + i) * 10 ** swap_pipeline.USDT_DECIMALS
+            t0 = time.perf_counter()
+            failures += not _sequential(src, dst, amount, slippage)
+            sequential.append(time.perf_counter() - t0)
+
+            result = pipeline.get(src, dst, amount + 1, WALLET, slippage)
+            failures += bool(result["errors"])
+            miss.append(result["seconds"])
+
+            pipeline.prefetch(src, dst, amount + 2, WALLET, slippage).result()
+            result = pipeline.get(src, dst, amount + 2, WALLET, slippage)
+            failures += bool(result["errors"]) or result["cache"] != "hit"
+            hit.append(result["seconds"])
+    finally:
+        server.terminate()
+
+    return {
+        "rounds": rounds,
+        "upstream_latency_ms": f"{latency_ms}±{jitter_ms}",
+        "failures": failures,
+        "sequential_cold_p50_ms": _p50(sequential),
+        "pipeline_miss_p50_ms": _p50(miss),
+        "pipeline_hit_p50_ms": _p50(hit),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Live swap preparation with and without the prefetch pipeline.")
+    parser.add_argument("--rounds", type=int, default=30)
+    parser.add_argument("--latency-ms", type=float, default=120.0)
+    parser.add_argument("--jitter-ms", type=float, default=30.0)
+    parser.add_argument("--port", type=int, default=8791)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rounds, args.latency_ms, args.jitter_ms, args.port), indent=2))
+
+
+if __name__ == "__main__":
+    main()
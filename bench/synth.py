@@ -0,0 +1,113 @@
+"""
+Synthetic database generator for the benchmark suite.
+
+Builds `ticks` (crypto_bot.db layout) and `trade_history` /
+`open_positions` / `accounts` (trades.db layout) using the real `init_db()`
+functions, so benchmarks always run against the production schema.
+
+Usage:
+    python -m bench.synth --price-rows 10000000 --trades 100000 --out bench_data
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import data_collector
+import database_manager
+
+SYNTH_COINS = ["BTC", "ETH", "BNB", "SOL", "ADA", "XRP", "DOGE", "DOT", "AVAX", "LINK",
+               "MATIC", "LTC", "TRX", "UNI", "ATOM", "XLM", "ETC", "FIL", "APT", "NEAR"]
+CHUNK_ROWS = 200_000
+
+
+def _fast_pragmas(conn):
+    # Bulk generation only: durability does not matter for throwaway data
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA journal_mode = MEMORY")
+
+
+def generate_price_db(path, rows, coins=10, seed=7, volatility=0.001):
+    """
+    Writes `rows` price ticks spread evenly over `coins` symbols at 1-minute
+    spacing, ending now. Prices follow a geometric random walk per coin
+    (`volatility` = per-minute sigma).
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    data_collector.DB_NAME = path
+    data_collector.init_db()
+
+    symbols = SYNTH_COINS[:coins] if coins <= len(SYNTH_COINS) else [f"C{i:04d}" for i in range(coins)]
+    per_coin = max(rows // len(symbols), 1)
+    rng = np.random.default_rng(seed)
+    start = int(time.time()) // 60 * 60 - per_coin * 60
+
+    conn = sqlite3.connect(path)
+    _fast_pragmas(conn)
+    for offset in range(0, per_coin, CHUNK_ROWS // len(symbols) or 1):
+        n = min(CHUNK_ROWS // len(symbols) or 1, per_coin - offset)
+        stamps = range(start + offset * 60, start + (offset + n) * 60, 60)
+        batch = []
+        for c, sym in enumerate(symbols):
+            prices = 100.0 * (c + 1) * np.exp(np.cumsum(rng.normal(0, volatility, n)))
+            volumes = rng.uniform(1e6, 1e9, n)
+            batch.extend(zip(stamps, [sym] * n, prices.tolist(), volumes.tolist(), [0.0] * n))
+        data_collector.apply_ticks(conn.cursor(), batch)
+        conn.commit()
+    conn.close()
+    return {"path": path, "rows": per_coin * len(symbols), "coins": len(symbols)}
+
+
+def generate_trades_db(path, trades, positions, coins=10, seed=7):
+    """Writes `trades` history rows and `positions` open positions (Paper mode)."""
+    if os.path.exists(path):
+        os.remove(path)
+    database_manager.DB_NAME = path
+    database_manager.init_db()
+
+    rnd = random.Random(seed)
+    symbols = SYNTH_COINS[:coins]
+    conn = sqlite3.connect(path)
+    _fast_pragmas(conn)
+    base = datetime.now() - timedelta(days=365)
+    for offset in range(0, trades, CHUNK_ROWS):
+        conn.executemany(
+            "INSERT INTO trade_history (timestamp, coin, action, price, amount, leverage, reasoning, mode) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [((base + timedelta(seconds=(offset + i) * 30)).strftime("%Y-%m-%d %H:%M:%S"),
+              rnd.choice(symbols), rnd.choice(("BUY", "SELL")), rnd.uniform(1, 60000), rnd.uniform(0.001, 10),
+              rnd.choice((1, 5, 10, 20, 50, 100, 125)), "Synthetic", rnd.choice(("Paper", "Live")))
+             for i in range(min(CHUNK_ROWS, trades - offset))])
+    conn.executemany(
+        "INSERT INTO open_positions (coin, avg_price, amount, leverage, mode) VALUES (?, ?, ?, ?, ?)",
+        [(rnd.choice(symbols), rnd.uniform(1, 60000), rnd.uniform(0.001, 10), rnd.choice((1, 10, 125)), "Paper")
+         for _ in range(positions)])
+    # Bulk rows bypass apply_trade, so derive the lot-accounting summaries once
+    database_manager.rebuild_summaries(conn.cursor())
+    conn.commit()
+    conn.close()
+    return {"path": path, "trades": trades, "positions": positions}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic benchmark databases.")
+    parser.add_argument("--price-rows", type=int, default=1_000_000)
+    parser.add_argument("--coins", type=int, default=10)
+    parser.add_argument("--trades", type=int, default=100_000)
+    parser.add_argument("--positions", type=int, default=50)
+    parser.add_argument("--out", default="bench_data")
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    started = time.perf_counter()
+    print(generate_price_db(os.path.join(args.out, "crypto_bot.db"), args.price_rows, args.coins))
+    print(generate_trades_db(os.path.join(args.out, "trades.db"), args.trades, args.positions, args.coins))
+    print(f"Generated in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Sustained-ingest load test for the single-writer service (db_writer.py).
+
+Spawns N producer processes that push synthetic tick batches for a fixed
+duration, plus reader processes polling the latest prices, and reports
+committed rows/second and lock errors. `--direct` runs the same load with
+every producer writing to SQLite itself, for comparison.
+
+Usage:
+    python -m bench.writer_load --producers 4 --batch 500 --seconds 10
+    python -m bench.writer_load --direct
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import data_collector
+from bench.synth import SYNTH_COINS
+
+
+def _rows(batch, producer, seq):
+    # Unique (coin, ts) per row so every tick is a real insert
+    base = (producer * 10**9 + seq * batch) // len(SYNTH_COINS)
+    return [(base + i // len(SYNTH_COINS), SYNTH_COINS[i % len(SYNTH_COINS)], 100.0 + producer, 1e6, 0.0)
+            for i in range(batch)]
+
+
+def _producer(db_path, address, batch, seconds, producer, result_queue):
+    errors = 0
+    sent = 0
+    deadline = time.perf_counter() + seconds
+    if address:
+        from db_writer import WriterClient
+        client = WriterClient(address)
+        seq = 0
+        while time.perf_counter() < deadline:
+            client.cast(db_path, "store_ticks", _rows(batch, producer, seq))
+            sent += batch
+            seq += 1
+        client.flush()
+    else:
+        conn = sqlite3.connect(db_path, timeout=0.1)
+        seq = 0
+        while time.perf_counter() < deadline:
+            try:
+                with conn:
+                    data_collector.apply_ticks(conn.cursor(), _rows(batch, producer, seq))
+                sent += batch
+            except sqlite3.OperationalError:
+                errors += 1  # "database is locked"
+            seq += 1
+        conn.close()
+    result_queue.put((sent, errors))
+
+
+def _reader(db_path, seconds, result_queue):
+    conn = sqlite3.connect(db_path, timeout=0.1)
+    reads = errors = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        try:
+            conn.execute("SELECT price FROM ticks WHERE coin_id = 1 ORDER BY ts DESC LIMIT 12").fetchall()
+            reads += 1
+        except sqlite3.OperationalError:
+            errors += 1
+    conn.close()
+    result_queue.put((reads, errors))
+
+
+def run(producers=4, readers=2, batch=500, seconds=10.0, direct=False, port=6011):
+    workdir = tempfile.mkdtemp(prefix="gravity_writer_")
+    db_path = os.path.join(workdir, "crypto_bot.db")
+    data_collector.DB_NAME = db_path
+    data_collector.init_db()
+    if direct:
+        # Baseline: the pre-writer default rollback journal
+        sqlite3.connect(db_path, isolation_level=None).execute("PRAGMA journal_mode = DELETE")
+
+    address = None
+    server = None
+    if not direct:
+        address = f"127.0.0.1:{port}"
+        env = dict(os.environ, DB_WRITER_ADDRESS=address)
+        server = subprocess.Popen([sys.executable, "db_writer.py"], env=env, stdout=subprocess.DEVNULL)
+        time.sleep(1.0)
+
+    results = mp.Queue()
+    reader_results = mp.Queue()
+    started = time.perf_counter()
+    procs = [mp.Process(target=_producer, args=(db_path, address, batch, seconds, i, results)) for i in range(producers)]
+    procs += [mp.Process(target=_reader, args=(db_path, seconds, reader_results)) for _ in range(readers)]
+    for p in procs:
+        p.start()
+    sent_errors = [results.get() for _ in range(producers)]
+    read_stats = [reader_results.get() for _ in range(readers)]
+    for p in procs:
+        p.join()
+    elapsed = time.perf_counter() - started
+    if server:
+        server.terminate()
+
+    committed = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM ticks").fetchone()[0]
+    return {
+        "mode": "direct" if direct else "single_writer",
+        "producers": producers,
+        "batch": batch,
+        "seconds": round(elapsed, 2),
+        "committed_rows": committed,
+        "rows_per_sec": committed / elapsed,
+        "write_lock_errors": sum(e for _, e in sent_errors),
+        "reads": sum(r for r, _ in read_stats),
+        "read_errors": sum(e for _, e in read_stats),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the single-writer ingest path.")
+    parser.add_argument("--producers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=2)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=6011)
+    parser.add_argument("--direct", action="store_true", help="Producers write to SQLite directly")
+    args = parser.parse_args()
+    print(json.dumps(run(args.producers, args.readers, args.batch, args.seconds, args.direct, args.port), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+import argparse
+import threading
+import time
+import metrics
+import data_collector
+from db_writer import execute_write
+
+# Retention policy (seconds; None = keep forever). Raw ticks roll up into
+# 1-minute bars, 1-minute bars roll up into hourly bars.
+RETENTION = {
+    "ticks": 7 * 86400,
+    "bars_1m": 90 * 86400,
+    "bars_1h": None,
+}
+ROLLUPS = [
+    # (job name, source table, target table, bucket width in seconds)
+    ("ticks_to_1m", "ticks", "bars_1m", 60),
+    ("1m_to_1h", "bars_1m", "bars_1h", 3600),
+]
+COMPACTION_INTERVAL = 600   # Seconds between background passes
+ROLLUP_SPAN = 6 * 3600      # Max seconds of source data rolled up per transaction
+PURGE_BATCH = 5000          # Max rows deleted per coin per transaction
+VACUUM_PAGES = 2000         # Free pages returned to the OS per incremental vacuum step
+
+COMPACTION_LATENCY = metrics.REGISTRY.histogram(
+    "compaction_duration_seconds", "Duration of one compaction pass.")
+COMPACTION_ROWS = metrics.REGISTRY.counter(
+    "compaction_rows_total", "Rows rolled up or purged per table and action.")
+
+# Rollup SQL per source kind: raw ticks carry one price, bars carry OHLC
+_ROLLUP_SQL = {
+    "ticks": """
+        INSERT OR REPLACE INTO {target} (coin_id, ts, open, high, low, close, volume)
+        SELECT g.coin_id, g.bucket,
+               (SELECT price FROM ticks f WHERE f.coin_id = g.coin_id AND f.ts >= g.bucket ORDER BY f.ts LIMIT 1),
+               g.high, g.low,
+               (SELECT price FROM ticks l WHERE l.coin_id = g.coin_id AND l.ts < g.bucket + {width} ORDER BY l.ts DESC LIMIT 1),
+               g.volume
+        FROM (SELECT coin_id, (ts / {width}) * {width} AS bucket, MAX(price) AS high, MIN(price) AS low, MAX(volume) AS volume
+              FROM ticks WHERE coin_id = ? AND ts >= ? AND ts < ? GROUP BY bucket) g
+    """,
+    "bars": """
+        INSERT OR REPLACE INTO {target} (coin_id, ts, open, high, low, close, volume)
+        SELECT g.coin_id, g.bucket,
+               (SELECT open FROM {source} f WHERE f.coin_id = g.coin_id AND f.ts >= g.bucket ORDER BY f.ts LIMIT 1),
+               g.high, g.low,
+               (SELECT close FROM {source} l WHERE l.coin_id = g.coin_id AND l.ts < g.bucket + {width} ORDER BY l.ts DESC LIMIT 1),
+               g.volume
+        FROM (SELECT coin_id, (ts / {width}) * {width} AS bucket, MAX(high) AS high, MIN(low) AS low, MAX(volume) AS volume
+              FROM {source} WHERE coin_id = ? AND ts >= ? AND ts < ? GROUP BY bucket) g
+    """,
+}
+
+
+def _watermark(cursor, job, source):
+    row = cursor.execute("SELECT watermark FROM compaction_state WHERE job = ?", (job,)).fetchone()
+    if row:
+        return row[0]
+    first = cursor.execute(f"SELECT MIN(ts) FROM {source}").fetchone()[0]
+    return first if first is not None else int(time.time())
+
+
+def _reroll_dirty(cursor, job, sql, width):
+    """Re-aggregates up to a ROLLUP_SPAN's worth of buckets that got rows below the watermark."""
+    dirty = cursor.execute("SELECT coin_id, bucket FROM compaction_dirty WHERE job = ? LIMIT ?",
+                           (job, max(ROLLUP_SPAN // width, 1))).fetchall()
+    written = 0
+    for coin_id, bucket in dirty:
+        cursor.execute(sql, (coin_id, bucket, bucket + width))
+        written += cursor.rowcount
+    cursor.executemany("DELETE FROM compaction_dirty WHERE job = ? AND coin_id = ? AND bucket = ?",
+                       [(job, coin_id, bucket) for coin_id, bucket in dirty])
+    return written
+
+
+def apply_rollup(cursor, job, source, target, width, until):
+    """
+    Re-rolls buckets that received late rows (compaction_dirty), then aggregates
+    completed `width`-second buckets of `source` before `until` into `target`,
+    at most ROLLUP_SPAN seconds past the job's watermark.
+    Returns (buckets written, new watermark).
+    """
+    sql = _ROLLUP_SQL["ticks" if source == "ticks" else "bars"].format(source=source, target=target, width=width)
+    written = _reroll_dirty(cursor, job, sql, width)
+    start = _watermark(cursor, job, source) // width * width
+    end = min(until // width * width, start + max(ROLLUP_SPAN // width, 1) * width)
+    if end <= start:
+        return written, start
+    for (coin_id,) in cursor.execute("SELECT coin_id FROM coins").fetchall():
+        cursor.execute(sql, (coin_id, start, end))
+        written += cursor.rowcount
+    cursor.execute("INSERT OR REPLACE INTO compaction_state (job, watermark) VALUES (?, ?)", (job, end))
+    return written, end
+
+
+def apply_purge(cursor, table, cutoff, batch=PURGE_BATCH, job=None):
+    """
+    Deletes up to `batch` rows older than `cutoff` per coin, stopping short of
+    any bucket `job` still has to re-roll. Returns rows deleted.
+    """
+    deleted = 0
+    for (coin_id,) in cursor.execute("SELECT coin_id FROM coins").fetchall():
+        cursor.execute(f"""
+            DELETE FROM {table} WHERE coin_id = ? AND ts IN (
+                SELECT ts FROM {table} WHERE coin_id = ? AND ts < ? AND ts < COALESCE(
+                    (SELECT MIN(bucket) FROM compaction_dirty WHERE job = ? AND coin_id = ?), ?)
+                ORDER BY ts LIMIT ?
+            )
+        """, (coin_id, coin_id, cutoff, job, coin_id, cutoff, batch))
+        deleted += cursor.rowcount
+    return deleted
+
+
+def apply_incremental_vacuum(cursor, pages=VACUUM_PAGES):
+    """Returns up to `pages` free pages to the filesystem. Returns free pages left."""
+    cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return cursor.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def compact_once(db_name=None, now=None):
+    """
+    One full pass: roll up every completed bucket, purge expired rows in
+    bounded batches (never past a rollup watermark), then reclaim free pages.
+    Each step is its own short transaction so ingest never waits long.
+    """
+    db_name = db_name or data_collector.DB_NAME
+    now = int(now if now is not None else time.time())
+    started = time.perf_counter()
+    summary = {}
+
+    # Each rollup only consumes what the previous one has finished (1h bars wait for complete 1m bars)
+    until = now
+    watermarks = {}
+    for job, source, target, width in ROLLUPS:
+        total = 0
+        while True:
+            written, watermark = execute_write(db_name, "compaction_rollup", apply_rollup, job, source, target, width, until)
+            total += written
+            # Caught up, and no late buckets were left to re-roll
+            if watermark >= until // width * width and written == 0:
+                break
+        watermarks[job] = until = watermark
+        summary[f"rollup_{target}"] = total
+        COMPACTION_ROWS.inc(total, table=target, action="rollup")
+
+    for job, source, target, width in ROLLUPS:
+        keep = RETENTION.get(source)
+        if keep is None:
+            continue
+        # Never drop source rows that have not been rolled up yet
+        cutoff = min(now - keep, watermarks.get(job, 0))
+        total = 0
+        while True:
+            deleted = execute_write(db_name, "compaction_purge", apply_purge, source, cutoff, PURGE_BATCH, job)
+            total += deleted
+            if deleted == 0:
+                break
+        summary[f"purged_{source}"] = total
+        COMPACTION_ROWS.inc(total, table=source, action="purge")
+
+    # Stop once a step frees nothing: without auto_vacuum=INCREMENTAL the freelist never shrinks
+    free = None
+    while True:
+        left = execute_write(db_name, "incremental_vacuum", apply_incremental_vacuum)
+        if left == 0 or (free is not None and left >= free):
+            break
+        free = left
+    COMPACTION_LATENCY.observe(time.perf_counter() - started)
+    return summary
+
+
+def run_forever(interval=COMPACTION_INTERVAL):
+    while True:
+        try:
+            summary = compact_once()
+            print(f"Compaction pass: {summary}")
+        except Exception as e:
+            print(f"Compaction error: {e}")
+        time.sleep(interval)
+
+
+def start_background(interval=COMPACTION_INTERVAL):
+    """Runs compaction passes from a daemon thread (used by data_collector)."""
+    thread = threading.Thread(target=run_forever, args=(interval,), name="compaction", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="price_history retention and compaction.")
+    parser.add_argument("--db", default=data_collector.DB_NAME)
+    parser.add_argument("--migrate", action="store_true", help="Only create/migrate the compact schema")
+    parser.add_argument("--once", action="store_true", help="Run a single pass and exit")
+    args = parser.parse_args()
+
+    data_collector.DB_NAME = args.db
+    data_collector.init_db()
+    if args.migrate:
+        return
+    if args.once:
+        print(compact_once(args.db))
+    else:
+        run_forever()
+
+
+if __name__ == "__main__":
+    main()
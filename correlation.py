@@ -0,0 +1,208 @@
+import sqlite3
+import threading
+import numpy as np
+
+# Configuration
+RETURN_WINDOW = 1440     # Tick-to-tick returns kept per coin (~1 day at the collector's 1-minute cadence)
+RESYNC_EVERY = 1440      # Updates between exact rebuilds of the running sums (drops float drift)
+MIN_SAMPLES = 30         # Fewer returns in the window -> covariance() returns None
+INITIAL_CAPACITY = 64    # Coin slots allocated up front (doubled as the universe grows)
+
+
+class RollingCovariance:
+    """
+    Sliding-window covariance of log returns across the whole coin universe.
+
+    Every tick batch contributes one return vector r (coins without a new
+    tick contribute 0, i.e. their last price is carried forward). The window
+    keeps running sums S = sum(r) and Q = sum(r r^T): a new batch is a
+    rank-one update and the batch leaving the window a rank-one downdate,
+    so each update costs O(N^2) however long the window is.
+
+    The live ticker thread writes and dashboard sessions read, so both go
+    through `lock`.
+    """
+
+    def __init__(self, window=RETURN_WINDOW, capacity=INITIAL_CAPACITY):
+        self.window = window
+        self.symbols = []
+        self.index = {}
+        self.capacity = 0
+        self.count = 0      # Returns currently in the window
+        self.pos = 0        # Buffer row the next return goes to
+        self.updates = 0
+        self.lock = threading.Lock()
+        self.last_price = np.zeros(0)
+        self.last_ts = np.zeros(0, dtype=np.int64)
+        self.buffer = np.zeros((window, 0))
+        self.sum = np.zeros(0)
+        self.sumsq = np.zeros((0, 0))
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        old = self.capacity
+        self.capacity = capacity
+        for name in ("last_price", "last_ts", "sum"):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:old] = array
+            setattr(self, name, grown)
+        buffer = np.zeros((self.window, capacity))
+        buffer[:, :old] = self.buffer
+        self.buffer = buffer
+        sumsq = np.zeros((capacity, capacity))
+        sumsq[:old, :old] = self.sumsq
+        self.sumsq = sumsq
+
+    def _slot(self, symbol):
+        i = self.index.get(symbol)
+        if i is None:
+            i = len(self.symbols)
+            if i == self.capacity:
+                self._grow(self.capacity * 2)
+            self.symbols.append(symbol)
+            self.index[symbol] = i
+        return i
+
+    def _returns(self, ticks):
+        """(symbol, ts, price) ticks -> return vector, or None when no coin moved forward in time."""
+        r = None
+        for symbol, ts, price in ticks:
+            if not price or price <= 0:
+                continue
+            i = self._slot(symbol)
+            if ts <= self.last_ts[i]:
+                continue  # Replayed snapshot (e.g. after a stream reconnect)
+            if self.last_price[i] > 0:
+                if r is None:
+                    r = np.zeros(self.capacity)
+                elif len(r) < self.capacity:
+                    r = np.pad(r, (0, self.capacity - len(r)))
+                r[i] = np.log(price / self.last_price[i])
+            self.last_price[i] = price
+            self.last_ts[i] = ts
+        if r is not None and len(r) < self.capacity:
+            r = np.pad(r, (0, self.capacity - len(r)))
+        return r
+
+    def _push(self, r, rank_one=True):
+        leaving = self.buffer[self.pos].copy() if self.count == self.window else None
+        self.buffer[self.pos] = r
+        self.pos = (self.pos + 1) % self.window
+        self.count = min(self.count + 1, self.window)
+        if not rank_one:
+            return
+        self.updates += 1
+        if self.updates % RESYNC_EVERY == 0:
+            self._resync()
+            return
+        n = len(self.symbols)
+        if leaving is None:
+            self.sum[:n] += r[:n]
+            self.sumsq[:n, :n] += np.outer(r[:n], r[:n])
+        else:
+            # Rank-one update for the new return and downdate for the one leaving, in one GEMM
+            self.sum[:n] += r[:n] - leaving[:n]
+            self.sumsq[:n, :n] += np.stack((r[:n], leaving[:n]), axis=1) @ np.stack((r[:n], -leaving[:n]))
+
+    def _resync(self):
+        """Recomputes the running sums exactly from the buffered returns."""
+        rows = self.buffer[:self.count] if self.count < self.window else self.buffer
+        self.sum = rows.sum(axis=0)
+        self.sumsq = rows.T @ rows
+
+    def update(self, ticks):
+        """
+        Adds one tick batch (tick_stream dicts with symbol/ts/price).
+        Returns True when it produced a return vector.
+        """
+        with self.lock:
+            r = self._returns((t["symbol"], t["ts"], t["price"]) for t in ticks)
+            if r is None:
+                return False
+            self._push(r)
+            return True
+
+    def seed(self, batches):
+        """Bulk-loads [(ts, [(symbol, price), ...]), ...] in time order, then rebuilds the sums once."""
+        with self.lock:
+            for ts, prices in batches:
+                r = self._returns((symbol, ts, price) for symbol, price in prices)
+                if r is not None:
+                    self._push(r, rank_one=False)
+            self._resync()
+
+    # --- READERS ---
+
+    def covariance(self, symbols=None):
+        """(symbols, covariance matrix of per-tick log returns, sample count), or None below MIN_SAMPLES."""
+        with self.lock:
+            if self.count < MIN_SAMPLES:
+                return None
+            if symbols is None:
+                symbols = list(self.symbols)
+            if any(s not in self.index for s in symbols):
+                return None
+            idx = np.array([self.index[s] for s in symbols], dtype=np.intp)
+            s = self.sum[idx]
+            q = self.sumsq[np.ix_(idx, idx)]
+            count = self.count
+        cov = (q - np.outer(s, s) / count) / (count - 1)
+        return symbols, cov, count
+
+    def correlation(self, symbols=None):
+        """(symbols, correlation matrix, per-tick volatility), or None below MIN_SAMPLES."""
+        result = self.covariance(symbols)
+        if result is None:
+            return None
+        symbols, cov, _ = result
+        vol = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            corr = cov / np.outer(vol, vol)
+        corr = np.nan_to_num(corr)
+        np.fill_diagonal(corr, 1.0)
+        return symbols, np.clip(corr, -1, 1), vol
+
+
+def cluster_order(corr):
+    """
+    Seriation for the heatmap: coins sorted by their angle in the plane of
+    the correlation matrix's two leading eigenvectors, so groups that move
+    together end up adjacent.
+    """
+    n = len(corr)
+    if n < 3:
+        return np.arange(n)
+    values, vectors = np.linalg.eigh(corr)
+    x = vectors[:, -1] * np.sqrt(max(values[-1], 0))
+    y = vectors[:, -2] * np.sqrt(max(values[-2], 0))
+    return np.argsort(np.arctan2(y, x))
+
+
+def load_engine(db_name, window=RETURN_WINDOW):
+    """A RollingCovariance seeded with the newest `window` + 1 ticks per coin from the tick store."""
+    engine = RollingCovariance(window)
+    conn = sqlite3.connect(db_name)
+    try:
+        rows = conn.execute('''
+            SELECT t.ts, c.symbol, t.price FROM coins c
+            JOIN ticks t ON t.coin_id = c.coin_id
+            AND t.ts >= COALESCE((SELECT ts FROM ticks x WHERE x.coin_id = c.coin_id
+                                  ORDER BY ts DESC LIMIT 1 OFFSET ?), 0)
+            ORDER BY t.ts
+        ''', (window,)).fetchall()
+    except sqlite3.OperationalError as e:
+        print(f"Correlation engine starts empty: {e}")
+        return engine
+    finally:
+        conn.close()
+    # Backfilled ticks (market_chart) carry per-coin timestamps, so batch by
+    # minute like risk.load_returns: each seeded return vector then holds every
+    # coin that moved in that minute (the rest carry their last price forward)
+    buckets = {}
+    for ts, symbol, price in rows:
+        bucket = buckets.setdefault(ts // 60, [ts, {}])
+        bucket[0] = ts              # Rows are in time order: the minute's newest tick
+        bucket[1][symbol] = price   # ...and each coin's newest price in it
+    engine.seed([(ts, list(prices.items())) for ts, prices in buckets.values()])
+    return engine
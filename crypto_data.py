@@ -1,9 +1,10 @@
+import os
 import requests
-import pandas as pd
 import time
-from one_inch_wrapper import OneInchService
+import metrics
 
-COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
+# Override to point at a mirror or at replay_server.py for load tests
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3")
 
 def get_coins_list(per_page=100):
     """Get list of coins with extended market data and rate limit handling."""
@@ -17,7 +18,9 @@ def get_coins_list(per_page=100):
         "price_change_percentage": "1h,24h,7d"
     }
     try:
-        response = requests.get(url, params=params, timeout=15)
+        with metrics.HTTP_LATENCY.time(service="coingecko", endpoint="/coins/markets"):
+            response = requests.get(url, params=params, timeout=15)
+        metrics.record_http("coingecko", "/coins/markets", response.status_code)
         if response.status_code == 200:
             return response.json()
         elif response.status_code == 429:
@@ -38,6 +41,7 @@ def get_coin_price(coin_id):
 def get_dex_price(token_address, chain_id=1):
     """Fetches real-time execution price from 1inch DEX."""
     try:
+        from one_inch_wrapper import OneInchService
         service = OneInchService(chain_id=chain_id)
         usdc_address = "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48"
         amount_to_quote = 10**18 
@@ -48,8 +52,13 @@ def get_dex_price(token_address, chain_id=1):
         pass
     return 0
 
+def resample_ohlc(history_df, rule="5min"):
+    """Buckets a `timestamp`/`price` frame into OHLC candles for the Bar/Candle charts."""
+    return history_df.set_index('timestamp')['price'].resample(rule).ohlc().dropna().reset_index()
+
 def get_historical_data(coin_id, days=30):
     """Get historical market data with flexible range (1, 7, 30, 90, 365, max)."""
+    import pandas as pd
     url = f"{COINGECKO_BASE_URL}/coins/{coin_id}/market_chart"
     params = {
         "vs_currency": "usd",
@@ -57,7 +66,9 @@ def get_historical_data(coin_id, days=30):
         "interval": "daily" if days > 1 else "hourly"
     }
     try:
-        response = requests.get(url, params=params, timeout=15)
+        with metrics.HTTP_LATENCY.time(service="coingecko", endpoint="/coins/{id}/market_chart"):
+            response = requests.get(url, params=params, timeout=15)
+        metrics.record_http("coingecko", "/coins/{id}/market_chart", response.status_code)
         if response.status_code == 200:
             data = response.json()
             prices = data.get("prices", [])
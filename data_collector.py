@@ -1,35 +1,208 @@
+import atexit
+import os
 import sqlite3
 import time
 import requests
 from datetime import datetime
+import metrics
+import tick_stream
+from database_manager import add_column_if_missing
+from db_writer import execute_write, get_writer
 
 # Configuration
 DB_NAME = "crypto_bot.db"
-COINGECKO_BASE_URL = "https://api.coingecko.com/api/v3"
+COINGECKO_BASE_URL = os.getenv("COINGECKO_BASE_URL", "https://api.coingecko.com/api/v3")
 TRACKED_COINS = ["bitcoin", "ethereum", "binancecoin", "solana", "cardano"]
+COLLECTOR_METRICS_PORT = 9108
+SCHEMA_VERSION = 4
+
+# Shared-memory ring of recent ticks (tick_ring.py), owned by the running collector
+_ring = None
+
+# Compact time-series layout: integer coin ids and epoch seconds, clustered
+# on (coin_id, ts) so "last N prices for a coin" is one contiguous PK range.
+COMPACT_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS coins (
+        coin_id INTEGER PRIMARY KEY,
+        symbol TEXT NOT NULL UNIQUE
+    );
+    CREATE TABLE IF NOT EXISTS ticks (
+        coin_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        price REAL NOT NULL,
+        volume REAL DEFAULT 0,
+        change_24h REAL,
+        PRIMARY KEY (coin_id, ts)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS bars_1m (
+        coin_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        open REAL, high REAL, low REAL, close REAL,
+        volume REAL,
+        PRIMARY KEY (coin_id, ts)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS bars_1h (
+        coin_id INTEGER NOT NULL,
+        ts INTEGER NOT NULL,
+        open REAL, high REAL, low REAL, close REAL,
+        volume REAL,
+        PRIMARY KEY (coin_id, ts)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS compaction_state (
+        job TEXT PRIMARY KEY,
+        watermark INTEGER NOT NULL
+    );
+    -- Buckets that received rows below their rollup job's watermark (backfills,
+    -- late ticks); compaction.apply_rollup re-rolls them. Jobs as in compaction.ROLLUPS.
+    CREATE TABLE IF NOT EXISTS compaction_dirty (
+        job TEXT NOT NULL,
+        coin_id INTEGER NOT NULL,
+        bucket INTEGER NOT NULL,
+        PRIMARY KEY (job, coin_id, bucket)
+    ) WITHOUT ROWID;
+    CREATE TRIGGER IF NOT EXISTS ticks_late_1m AFTER INSERT ON ticks
+    WHEN NEW.ts < (SELECT watermark FROM compaction_state WHERE job = 'ticks_to_1m')
+    BEGIN
+        INSERT OR IGNORE INTO compaction_dirty (job, coin_id, bucket) VALUES ('ticks_to_1m', NEW.coin_id, NEW.ts / 60 * 60);
+    END;
+    CREATE TRIGGER IF NOT EXISTS bars_1m_late_1h AFTER INSERT ON bars_1m
+    WHEN NEW.ts < (SELECT watermark FROM compaction_state WHERE job = '1m_to_1h')
+    BEGIN
+        INSERT OR IGNORE INTO compaction_dirty (job, coin_id, bucket) VALUES ('1m_to_1h', NEW.coin_id, NEW.ts / 3600 * 3600);
+    END;
+'''
+
+# Read-only view with the legacy price_history columns for ad-hoc queries and old scripts
+PRICE_HISTORY_VIEW = '''
+    CREATE VIEW IF NOT EXISTS price_history AS
+    SELECT datetime(t.ts, 'unixepoch', 'localtime') AS timestamp,
+           c.symbol AS coin_symbol,
+           t.price AS price_usd,
+           t.volume AS volume,
+           t.change_24h AS change_24h
+    FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+'''
+
+UPSERT_TICK_SQL = "INSERT OR REPLACE INTO ticks (coin_id, ts, price, volume, change_24h) VALUES (?, ?, ?, ?, ?)"
+
+def _is_table(cursor, name):
+    row = cursor.execute("SELECT type FROM sqlite_master WHERE name = ?", (name,)).fetchone()
+    return row is not None and row[0] == "table"
+
+def migrate_legacy_history(cursor):
+    """
+    Copies the row-per-tick `price_history` table (text timestamps, AUTOINCREMENT id)
+    into coins/ticks, then drops it. Duplicate (coin, second) rows keep the latest id.
+    """
+    add_column_if_missing(cursor, "price_history", "volume", "REAL DEFAULT 0")
+    rows = cursor.execute("SELECT COUNT(*) FROM price_history").fetchone()[0]
+    print(f"Migrating {rows:,} price_history rows to the compact ticks layout...")
+    cursor.execute('''
+        INSERT OR IGNORE INTO coins (symbol)
+        SELECT DISTINCT UPPER(coin_symbol) FROM price_history WHERE coin_symbol IS NOT NULL
+    ''')
+    cursor.execute('''
+        INSERT OR REPLACE INTO ticks (coin_id, ts, price, volume, change_24h)
+        SELECT c.coin_id, CAST(strftime('%s', p.timestamp, 'utc') AS INTEGER),
+               p.price_usd, COALESCE(p.volume, 0), p.change_24h
+        FROM price_history p JOIN coins c ON c.symbol = UPPER(p.coin_symbol)
+        WHERE p.price_usd IS NOT NULL AND p.timestamp IS NOT NULL
+        ORDER BY p.id
+    ''')
+    cursor.execute("DROP TABLE price_history")
 
 def init_db():
-    """Initializes the SQLite database and creates the price_history table."""
+    """
+    Creates the compact price schema (migrating a legacy price_history table
+    if present). Skips the DDL when PRAGMA user_version is already at SCHEMA_VERSION.
+    """
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            coin_symbol TEXT,
-            price_usd REAL,
-            volume REAL DEFAULT 0,
-            change_24h REAL
-        )
-    ''')
-    # Schema Migration: Add volume if it hasn't been added yet
+    if cursor.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        fresh = cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+        if fresh:
+            # Must be set before the first table exists; older files get it via VACUUM below
+            cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL: dashboards read snapshots while the collector/writer commits
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.executescript(COMPACT_SCHEMA)
+        if _is_table(cursor, "price_history"):
+            migrate_legacy_history(cursor)
+        cursor.execute(PRICE_HISTORY_VIEW)
+        conn.commit()
+        if cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            print("Rebuilding database file for incremental vacuum...")
+            try:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+            except sqlite3.OperationalError as e:
+                # user_version stays behind, so the next start retries the conversion
+                print(f"Incremental vacuum conversion failed, will retry: {e}")
+                conn.close()
+                return
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    conn.close()
+
+def coin_ids(cursor, symbols):
+    """Maps symbols to integer coin ids, registering unseen symbols."""
+    symbols = sorted(set(symbols))
+    cursor.executemany("INSERT OR IGNORE INTO coins (symbol) VALUES (?)", [(s,) for s in symbols])
+    placeholders = ",".join("?" * len(symbols))
+    return dict(cursor.execute(f"SELECT symbol, coin_id FROM coins WHERE symbol IN ({placeholders})", symbols).fetchall())
+
+def apply_ticks(cursor, rows):
+    """
+    Upserts (ts, symbol, price, volume, change_24h) rows into ticks on an open
+    cursor (the caller owns the transaction). Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+    ids = coin_ids(cursor, [r[1] for r in rows])
+    cursor.executemany(UPSERT_TICK_SQL, [(ids[sym], ts, price, volume or 0, change) for ts, sym, price, volume, change in rows])
+    return len(rows)
+
+def record_ingest(rows, elapsed):
+    """
+    Publishes ingest throughput for one batch. DB write latency is recorded at
+    COMMIT instead (by execute_write, or by the writer service when ticks are queued).
+    """
+    metrics.ROWS_INGESTED.inc(rows)
+    if elapsed > 0:
+        metrics.INGEST_RATE.set(rows / elapsed)
+
+def record_tick_age(symbol, last_updated):
+    """Staleness of CoinGecko's quote (ISO `last_updated`) at the moment we store it."""
+    if not last_updated:
+        return
     try:
-        cursor.execute("ALTER TABLE price_history ADD COLUMN volume REAL DEFAULT 0")
-    except:
+        updated = datetime.fromisoformat(last_updated.replace("Z", "+00:00"))
+        metrics.TICK_AGE.set(max(time.time() - updated.timestamp(), 0.0), coin=symbol)
+    except ValueError:
         pass
-        
-    conn.commit()
-    conn.close()
+
+def tick_rows(data, timestamp):
+    """Converts one /coins/markets payload into (ts, symbol, price, volume, change) rows."""
+    rows = []
+    for coin in data:
+        symbol = coin['symbol'].upper()
+        price = coin['current_price']
+        change = coin['price_change_percentage_24h']
+        volume = coin.get('total_volume', 0)
+        rows.append((timestamp, symbol, price, volume, change))
+        record_tick_age(symbol, coin.get('last_updated'))
+    return rows
+
+def store_ticks(cursor, data, timestamp):
+    """Inserts one /coins/markets payload (epoch `timestamp`) into ticks (caller commits)."""
+    return apply_ticks(cursor, tick_rows(data, timestamp))
+
+def write_ticks(rows):
+    """
+    Persists tick rows: queued to the single-writer service when
+    DB_WRITER_ADDRESS is set, otherwise committed directly.
+    """
+    execute_write(DB_NAME, "store_ticks", apply_ticks, rows, wait=False)
 
 def fetch_and_store_data():
     """Fetches market data from CoinGecko and stores it in the database."""
@@ -43,29 +216,21 @@ def fetch_and_store_data():
     }
 
     try:
-        response = requests.get(url, params=params, timeout=10)
+        with metrics.HTTP_LATENCY.time(service="coingecko", endpoint="/coins/markets"):
+            response = requests.get(url, params=params, timeout=10)
+        metrics.record_http("coingecko", "/coins/markets", response.status_code)
         if response.status_code == 200:
             data = response.json()
             
-            conn = sqlite3.connect(DB_NAME)
-            cursor = conn.cursor()
-            
-            timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            for coin in data:
-                symbol = coin['symbol'].upper()
-                price = coin['current_price']
-                change = coin['price_change_percentage_24h']
-                volume = coin.get('total_volume', 0)
-                
-                cursor.execute('''
-                    INSERT INTO price_history (timestamp, coin_symbol, price_usd, volume, change_24h)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (timestamp, symbol, price, volume, change))
-            
-            conn.commit()
-            conn.close()
-            print(f"Data saved for {timestamp}")
+            started = time.perf_counter()
+            timestamp = int(time.time())
+            rows = tick_rows(data, timestamp)
+            write_ticks(rows)
+            if _ring is not None:
+                _ring.append_rows(rows)
+            tick_stream.HUB.publish_rows(rows)
+            record_ingest(len(data), time.perf_counter() - started)
+            print(f"Data saved for {datetime.fromtimestamp(timestamp):%Y-%m-%d %H:%M:%S}")
             return True
         elif response.status_code == 429:
             print("Rate limit hit. Waiting for retry...")
@@ -86,8 +251,8 @@ def backfill_data():
     
     print("Checking for existing data...")
     for coin_id in TRACKED_COINS:
-        cursor.execute("SELECT COUNT(*) FROM price_history WHERE coin_symbol = ?", (coin_id.upper()[:3],))
-        if cursor.fetchone()[0] > 0:
+        cursor.execute("SELECT 1 FROM ticks t JOIN coins c ON c.coin_id = t.coin_id WHERE c.symbol = ? LIMIT 1", (coin_id.upper()[:3],))
+        if cursor.fetchone() is not None:
             print(f"Skipping backfill for {coin_id} (data exists)")
             continue
             
@@ -96,27 +261,52 @@ def backfill_data():
         params = {"vs_currency": "usd", "days": "1"}
         
         try:
-            resp = requests.get(url, params=params, timeout=10)
+            with metrics.HTTP_LATENCY.time(service="coingecko", endpoint="/coins/{id}/market_chart"):
+                resp = requests.get(url, params=params, timeout=10)
+            metrics.record_http("coingecko", "/coins/{id}/market_chart", resp.status_code)
             if resp.status_code == 200:
                 hist_data = resp.json().get("prices", [])
                 symbol = coin_id.upper()[:3]
-                for timestamp, price in hist_data:
-                    dt = datetime.fromtimestamp(timestamp/1000.0).strftime("%Y-%m-%d %H:%M:%S")
-                    cursor.execute('''
-                        INSERT INTO price_history (timestamp, coin_symbol, price_usd, change_24h)
-                        VALUES (?, ?, ?, ?)
-                    ''', (dt, symbol, price, 0.0))
+                # One short write per coin instead of holding the write lock across the sleeps below
+                write_ticks([(int(timestamp / 1000), symbol, price, 0, 0.0) for timestamp, price in hist_data])
                 print(f"Inserted {len(hist_data)} points for {coin_id}")
             time.sleep(2) # Avoid immediate rate limit
         except Exception as e:
             print(f"Backfill error for {coin_id}: {e}")
             
-    conn.commit()
     conn.close()
 
+def start_tick_ring():
+    """Creates the shared-memory ring of recent ticks and fills it from SQLite."""
+    global _ring
+    import tick_ring
+    writer = get_writer()
+    if writer is not None:
+        writer.flush()  # Backfill writes are queued; seed from committed rows
+    try:
+        _ring = tick_ring.TickRing.create()
+    except OSError as e:
+        print(f"Tick ring disabled: {e}")
+        return None
+    atexit.register(_ring.close)
+    tick_ring.seed_from_db(_ring, DB_NAME)
+    return _ring
+
 def main():
     print("Initializing background data collector...")
+    port = metrics.start_metrics_server(COLLECTOR_METRICS_PORT)
+    if port:
+        print(f"Metrics available at http://127.0.0.1:{port}/metrics")
+    stream_port = tick_stream.start_server()
+    if stream_port:
+        print(f"Live ticks at http://127.0.0.1:{stream_port}/stream?coins=BTC,ETH")
     backfill_data()
+    if start_tick_ring():
+        print(f"Tick ring '{_ring.shm.name}' ready ({_ring.capacity} ticks per coin)")
+    
+    # Retention/downsampling runs beside the ingest loop (see compaction.py)
+    import compaction
+    compaction.start_background()
     
     print("Starting 1-minute live tracking loop...")
     while True:
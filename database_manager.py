@@ -1,130 +1,728 @@
+import os
 import sqlite3
-import pandas as pd
 from datetime import datetime
+from db_writer import execute_write
 
 DB_NAME = "trades.db"
+SCHEMA_VERSION = 6
+
+# Paper accounts: every wallet, position, order and summary row is keyed by
+# account_id. Account 1 is the dashboard's default (the former single wallet).
+DEFAULT_ACCOUNT_ID = 1
+PAPER_STARTING_BALANCE = 1000.0  # Seed and "Reset" amount for new paper accounts
+ACCOUNT_KINDS = ("user", "strategy", "backtest")
+
+# Lot accounting for SELLs: "FIFO" consumes the oldest open lots first,
+# "AVERAGE" keeps one averaged lot per coin/mode (at the leverage it was opened with).
+LOT_METHOD = os.getenv("LOT_METHOD", "FIFO").upper()
+LOT_EPSILON = 1e-12  # Remaining amounts below this close the lot
+
+# DB files whose schema this process has already verified
+_initialized = set()
+
+def add_column_if_missing(cursor, table, column, decl):
+    """Idempotent ALTER TABLE ADD COLUMN (SQLite has no IF NOT EXISTS for columns)."""
+    columns = {row[1] for row in cursor.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
 
 def init_db():
+    """
+    Creates and migrates the schema. Runs the DDL only when the file's
+    PRAGMA user_version is behind SCHEMA_VERSION, and at most once per process.
+    """
+    if DB_NAME in _initialized:
+        return
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
-    
-    # Create trade_history table with leverage
+    if cursor.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+        # WAL lets readers keep a snapshot while a single writer commits
+        cursor.execute("PRAGMA journal_mode = WAL")
+        
+        # v4 summaries were keyed without an account; set them aside for the copy below
+        migrate_summaries = _set_aside_v4_summaries(cursor)
+        
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS accounts (
+                account_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE,
+                kind TEXT DEFAULT 'user',
+                balance REAL NOT NULL,
+                initial_balance REAL NOT NULL,
+                created DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        # Create trade_history table with leverage
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS trade_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id INTEGER NOT NULL DEFAULT 1,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                coin TEXT NOT NULL,
+                action TEXT NOT NULL,
+                price REAL NOT NULL,
+                amount REAL NOT NULL,
+                leverage INTEGER DEFAULT 1,
+                reasoning TEXT,
+                mode TEXT DEFAULT 'Paper'
+            )
+        ''')
+        
+        # Create open_positions table with leverage
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS open_positions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id INTEGER NOT NULL DEFAULT 1,
+                coin TEXT NOT NULL,
+                avg_price REAL NOT NULL,
+                amount REAL NOT NULL,
+                leverage INTEGER DEFAULT 1,
+                timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+                mode TEXT DEFAULT 'Paper'
+            )
+        ''')
+        
+        # Resting paper orders (limit/stop/OCO legs) matched by order_engine.py.
+        # `rev` increases with every change so the engine can sync incrementally.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS orders (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id INTEGER NOT NULL DEFAULT 1,
+                created DATETIME DEFAULT CURRENT_TIMESTAMP,
+                coin TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                side TEXT NOT NULL,
+                order_type TEXT NOT NULL,
+                price REAL NOT NULL,
+                amount REAL NOT NULL,
+                leverage INTEGER DEFAULT 1,
+                mode TEXT DEFAULT 'Paper',
+                oco_group INTEGER,
+                status TEXT DEFAULT 'OPEN',
+                fill_price REAL,
+                trade_id INTEGER,
+                reasoning TEXT,
+                rev INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_rev ON orders (rev)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_status ON orders (status, symbol)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_oco ON orders (oco_group)")
+        
+        # Alert rules evaluated by alert_engine.py on every tick; `rev` works as for orders.
+        # Fired alerts land in alert_events, which the dashboard polls by id.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alerts (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                account_id INTEGER NOT NULL DEFAULT 1,
+                created DATETIME DEFAULT CURRENT_TIMESTAMP,
+                symbol TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                threshold REAL NOT NULL,
+                window_minutes INTEGER,
+                position_id INTEGER,
+                repeating INTEGER DEFAULT 0,
+                note TEXT,
+                status TEXT DEFAULT 'ACTIVE',
+                last_triggered INTEGER,
+                rev INTEGER NOT NULL
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                alert_id INTEGER NOT NULL,
+                account_id INTEGER NOT NULL,
+                ts INTEGER NOT NULL,
+                symbol TEXT NOT NULL,
+                price REAL NOT NULL,
+                message TEXT NOT NULL
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_rev ON alerts (rev)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alerts_account ON alerts (account_id, status)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_alert_events_account ON alert_events (account_id, id)")
+        
+        # Per-account, per-coin and per-mode aggregates, maintained inside every trade's transaction
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS position_summary (
+                account_id INTEGER NOT NULL,
+                coin TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                open_amount REAL DEFAULT 0,
+                cost_basis REAL DEFAULT 0,
+                realized_pnl REAL DEFAULT 0,
+                bought REAL DEFAULT 0,
+                sold REAL DEFAULT 0,
+                trades INTEGER DEFAULT 0,
+                PRIMARY KEY (account_id, coin, mode)
+            ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS portfolio_summary (
+                account_id INTEGER NOT NULL,
+                mode TEXT NOT NULL,
+                cost_basis REAL DEFAULT 0,
+                realized_pnl REAL DEFAULT 0,
+                trades INTEGER DEFAULT 0,
+                PRIMARY KEY (account_id, mode)
+            ) WITHOUT ROWID
+        ''')
+        
+        # Migration: add leverage/account columns to tables created before they existed
+        add_column_if_missing(cursor, "trade_history", "leverage", "INTEGER DEFAULT 1")
+        add_column_if_missing(cursor, "open_positions", "leverage", "INTEGER DEFAULT 1")
+        for table in ("trade_history", "open_positions", "orders"):
+            add_column_if_missing(cursor, table, "account_id", "INTEGER NOT NULL DEFAULT 1")
+        
+        # Every per-account read and lot scan is an index range on account_id first
+        cursor.execute("DROP INDEX IF EXISTS idx_positions_lots")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_positions_account ON open_positions (account_id, coin, mode, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_trades_account ON trade_history (account_id, id)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_orders_account ON orders (account_id, status)")
+        
+        # The default account takes over the old single-row wallet's balance
+        if cursor.execute("SELECT COUNT(*) FROM accounts").fetchone()[0] == 0:
+            balance = PAPER_STARTING_BALANCE
+            if _table_exists(cursor, "wallet"):
+                row = cursor.execute("SELECT balance FROM wallet WHERE id = 1").fetchone()
+                balance = row[0] if row else balance
+            cursor.execute('''
+                INSERT INTO accounts (account_id, name, kind, balance, initial_balance)
+                VALUES (?, 'Default', 'user', ?, ?)
+            ''', (DEFAULT_ACCOUNT_ID, balance, PAPER_STARTING_BALANCE))
+        cursor.execute("DROP TABLE IF EXISTS wallet")
+        
+        if migrate_summaries:
+            # Keep v4's realized P&L, attributed to the default account
+            cursor.execute('''
+                INSERT INTO position_summary (account_id, coin, mode, open_amount, cost_basis, realized_pnl, bought, sold, trades)
+                SELECT ?, coin, mode, open_amount, cost_basis, realized_pnl, bought, sold, trades FROM position_summary_v4
+            ''', (DEFAULT_ACCOUNT_ID,))
+            cursor.execute("DROP TABLE position_summary_v4")
+            rebuild_summaries(cursor)
+        elif cursor.execute("SELECT COUNT(*) FROM portfolio_summary").fetchone()[0] == 0:
+            # Summaries start from the existing ledger (realized P&L was never recorded before v4)
+            rebuild_summaries(cursor)
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.commit()
+    conn.close()
+    _initialized.add(DB_NAME)
+
+def _table_exists(cursor, name):
+    return cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+def _set_aside_v4_summaries(cursor):
+    """Renames v4 summary tables (no account_id) out of the way. Returns True if it did."""
+    columns = {row[1] for row in cursor.execute("PRAGMA table_info(position_summary)")}
+    if not columns or "account_id" in columns:
+        return False
+    cursor.execute("ALTER TABLE position_summary RENAME TO position_summary_v4")
+    cursor.execute("DROP TABLE IF EXISTS portfolio_summary")
+    return True
+
+def _write(procedure, fn, *args):
+    """Runs a write procedure on trades.db (via the single writer when configured)."""
+    return execute_write(DB_NAME, procedure, fn, *args)
+
+def _open_lot(cursor, account_id, coin, price, amount, leverage, mode):
+    if LOT_METHOD == "AVERAGE":
+        row = cursor.execute('''
+            SELECT id FROM open_positions
+            WHERE account_id = ? AND coin = ? AND mode = ? ORDER BY id LIMIT 1
+        ''', (account_id, coin, mode)).fetchone()
+        if row:
+            cursor.execute('''
+                UPDATE open_positions
+                SET avg_price = (avg_price * amount + ? * ?) / (amount + ?), amount = amount + ?
+                WHERE id = ?
+            ''', (price, amount, amount, amount, row[0]))
+            return
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS trade_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            coin TEXT NOT NULL,
-            action TEXT NOT NULL,
-            price REAL NOT NULL,
-            amount REAL NOT NULL,
-            leverage INTEGER DEFAULT 1,
-            reasoning TEXT,
-            mode TEXT DEFAULT 'Paper'
-        )
-    ''')
-    
-    # Create open_positions table with leverage
+        INSERT INTO open_positions (account_id, coin, avg_price, amount, leverage, mode)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (account_id, coin, price, amount, leverage, mode))
+
+def _close_lots(cursor, account_id, coin, price, amount, mode, lot_id=None):
+    """
+    Consumes `amount` from the account's open lots (just `lot_id` if given,
+    else oldest first). Returns (realized P&L, cost basis released, amount matched).
+    """
+    def lots():
+        if lot_id is not None:
+            yield from cursor.execute("SELECT id, avg_price, amount FROM open_positions WHERE id = ?",
+                                      (lot_id,)).fetchall()
+            return
+        last_id = 0
+        while True:
+            # Small pages, oldest first: a SELL usually closes only the first lot or two
+            page = cursor.execute('''
+                SELECT id, avg_price, amount FROM open_positions
+                WHERE account_id = ? AND coin = ? AND mode = ? AND id > ? ORDER BY id LIMIT 16
+            ''', (account_id, coin, mode, last_id)).fetchall()
+            if not page:
+                return
+            yield from page
+            last_id = page[-1][0]
+
+    remaining = amount
+    realized = released = 0.0
+    for pos_id, lot_price, lot_amount in lots():
+        if remaining <= LOT_EPSILON:
+            break
+        take = min(lot_amount, remaining)
+        realized += (price - lot_price) * take
+        released += lot_price * take
+        remaining -= take
+        if lot_amount - take <= LOT_EPSILON:
+            cursor.execute("DELETE FROM open_positions WHERE id = ?", (pos_id,))
+        else:
+            cursor.execute("UPDATE open_positions SET amount = amount - ? WHERE id = ?", (take, pos_id))
+    return realized, released, amount - max(remaining, 0.0)
+
+def _update_summaries(cursor, account_id, coin, mode, d_amount, d_cost, realized, bought, sold):
+    key = (account_id, coin, mode)
     cursor.execute('''
-        CREATE TABLE IF NOT EXISTS open_positions (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            coin TEXT NOT NULL,
-            avg_price REAL NOT NULL,
-            amount REAL NOT NULL,
-            leverage INTEGER DEFAULT 1,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-            mode TEXT DEFAULT 'Paper'
-        )
-    ''')
-    
-    # Simple Migration: Add leverage column if table exists without it
-    try:
-        cursor.execute("ALTER TABLE trade_history ADD COLUMN leverage INTEGER DEFAULT 1")
-        cursor.execute("ALTER TABLE open_positions ADD COLUMN leverage INTEGER DEFAULT 1")
-    except:
-        pass # Columns already exist
-    
-    # Initialize wallet with $10,000 if it's empty
-    cursor.execute("SELECT COUNT(*) FROM wallet")
-    if cursor.fetchone()[0] == 0:
-        cursor.execute("INSERT INTO wallet (id, balance) VALUES (1, 10000.0)")
-    
-    conn.commit()
-    conn.close()
+        INSERT INTO position_summary (account_id, coin, mode, open_amount, cost_basis, realized_pnl, bought, sold, trades)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, 1)
+        ON CONFLICT (account_id, coin, mode) DO UPDATE SET
+            open_amount = open_amount + excluded.open_amount,
+            cost_basis = cost_basis + excluded.cost_basis,
+            realized_pnl = realized_pnl + excluded.realized_pnl,
+            bought = bought + excluded.bought,
+            sold = sold + excluded.sold,
+            trades = trades + 1
+    ''', key + (d_amount, d_cost, realized, bought, sold))
+    if d_amount < 0 and cursor.execute(
+            "SELECT 1 FROM open_positions WHERE account_id = ? AND coin = ? AND mode = ? LIMIT 1", key).fetchone() is None:
+        # Flat again: drop float residue so the aggregates read exactly zero
+        residue = cursor.execute(
+            "SELECT cost_basis FROM position_summary WHERE account_id = ? AND coin = ? AND mode = ?", key).fetchone()[0]
+        cursor.execute(
+            "UPDATE position_summary SET open_amount = 0, cost_basis = 0 WHERE account_id = ? AND coin = ? AND mode = ?", key)
+        d_cost -= residue
+    cursor.execute('''
+        INSERT INTO portfolio_summary (account_id, mode, cost_basis, realized_pnl, trades) VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (account_id, mode) DO UPDATE SET
+            cost_basis = cost_basis + excluded.cost_basis,
+            realized_pnl = realized_pnl + excluded.realized_pnl,
+            trades = trades + 1
+    ''', (account_id, mode, d_cost, realized))
 
-def log_trade(coin, action, price, amount, reasoning="", mode="Paper", leverage=1):
-    """Saves a new trade to the trade_history table."""
-    conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
+def apply_trade(cursor, coin, action, price, amount, reasoning="", mode="Paper", leverage=1, lot_id=None,
+                account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Trade bookkeeping on an open cursor (the caller owns the transaction):
+    ledger row, the account's paper wallet, lots (BUY opens, SELL consumes
+    per LOT_METHOD, or only `lot_id`) and the summary tables.
+    """
     cursor.execute('''
-        INSERT INTO trade_history (coin, action, price, amount, leverage, reasoning, mode)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', (coin, action, price, amount, leverage, reasoning, mode))
+        INSERT INTO trade_history (account_id, coin, action, price, amount, leverage, reasoning, mode)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (account_id, coin, action, price, amount, leverage, reasoning, mode))
+    trade_id = cursor.lastrowid
     
-    # If it's a paper trade, update the virtual wallet and positions
-    if mode == "Paper":
-        total_cost = price * amount
-        if action.upper() == "BUY":
-            cursor.execute("UPDATE wallet SET balance = balance - ? WHERE id = 1", (total_cost,))
-            # Update open positions with specific leverage
-            cursor.execute('''
-                INSERT INTO open_positions (coin, avg_price, amount, leverage, mode)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (coin, price, amount, leverage, mode))
-        elif action.upper() == "SELL":
-            cursor.execute("UPDATE wallet SET balance = balance + ? WHERE id = 1", (total_cost,))
-            
-    conn.commit()
-    conn.close()
+    total_cost = price * amount
+    if action.upper() == "BUY":
+        # If it's a paper trade, update the account's virtual wallet
+        if mode == "Paper":
+            cursor.execute("UPDATE accounts SET balance = balance - ? WHERE account_id = ?", (total_cost, account_id))
+        _open_lot(cursor, account_id, coin, price, amount, leverage, mode)
+        _update_summaries(cursor, account_id, coin, mode, amount, total_cost, 0.0, amount, 0.0)
+    elif action.upper() == "SELL":
+        realized, released, matched = _close_lots(cursor, account_id, coin, price, amount, mode, lot_id)
+        # Only what was actually held is sold: no proceeds for the part of an oversized SELL
+        if mode == "Paper":
+            cursor.execute("UPDATE accounts SET balance = balance + ? WHERE account_id = ?", (price * matched, account_id))
+        _update_summaries(cursor, account_id, coin, mode, -matched, -released, realized, 0.0, matched)
+    return trade_id
+
+def log_trade(coin, action, price, amount, reasoning="", mode="Paper", leverage=1, account_id=DEFAULT_ACCOUNT_ID):
+    """Saves a new trade to the trade_history table."""
+    return _write("log_trade", apply_trade, coin, action, price, amount, reasoning, mode, leverage, None, account_id)
+
+def apply_trades(cursor, trades, mode="Paper", account_id=DEFAULT_ACCOUNT_ID):
+    """Books [(coin, action, price, amount, reasoning), ...] in order on one transaction. Returns trade ids."""
+    return [apply_trade(cursor, coin, action, price, amount, reasoning, mode, 1, None, account_id)
+            for coin, action, price, amount, reasoning in trades]
+
+def log_trades(trades, mode="Paper", account_id=DEFAULT_ACCOUNT_ID):
+    """Saves a batch of trades in one commit (used by strategy_runner.py)."""
+    return _write("log_trades", apply_trades, list(trades), mode, account_id)
 
-def get_all_trades():
-    """Returns all trade history as a Pandas DataFrame."""
+def get_all_trades(account_id=DEFAULT_ACCOUNT_ID):
+    """Returns the account's trade history as a Pandas DataFrame (None = every account)."""
+    import pandas as pd
     conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM trade_history ORDER BY timestamp DESC", conn)
+    if account_id is None:
+        df = pd.read_sql_query("SELECT * FROM trade_history ORDER BY timestamp DESC", conn)
+    else:
+        df = pd.read_sql_query("SELECT * FROM trade_history WHERE account_id = ? ORDER BY id DESC", conn,
+                               params=(account_id,))
     conn.close()
     return df
 
-def get_wallet_balance():
-    """Gets the current virtual wallet balance."""
+def get_wallet_balance(account_id=DEFAULT_ACCOUNT_ID):
+    """Gets the account's current virtual wallet balance."""
     conn = sqlite3.connect(DB_NAME)
     cursor = conn.cursor()
-    cursor.execute("SELECT balance FROM wallet WHERE id = 1")
-    balance = cursor.fetchone()[0]
+    cursor.execute("SELECT balance FROM accounts WHERE account_id = ?", (account_id,))
+    row = cursor.fetchone()
     conn.close()
-    return balance
+    return row[0] if row else 0.0
+
+def apply_wallet_balance(cursor, new_balance, account_id=DEFAULT_ACCOUNT_ID):
+    cursor.execute("UPDATE accounts SET balance = ? WHERE account_id = ?", (new_balance, account_id))
+
+def update_wallet_balance(new_balance, account_id=DEFAULT_ACCOUNT_ID):
+    """Manually update the account's virtual wallet balance."""
+    _write("update_wallet_balance", apply_wallet_balance, new_balance, account_id)
+
+# --- ACCOUNTS ---
+
+def apply_create_account(cursor, name, kind="user", balance=PAPER_STARTING_BALANCE):
+    if kind not in ACCOUNT_KINDS:
+        raise ValueError(f"Unknown account kind: {kind}")
+    row = cursor.execute("SELECT account_id FROM accounts WHERE name = ?", (name,)).fetchone()
+    if row:
+        return row[0]
+    cursor.execute("INSERT INTO accounts (name, kind, balance, initial_balance) VALUES (?, ?, ?, ?)",
+                   (name, kind, balance, balance))
+    return cursor.lastrowid
+
+def create_account(name, kind="user", balance=PAPER_STARTING_BALANCE):
+    """Creates a paper account (or returns the existing one with that name). Returns its account_id."""
+    return _write("create_account", apply_create_account, name, kind, balance)
+
+def apply_reset_account(cursor, account_id):
+    cursor.execute("UPDATE accounts SET balance = initial_balance WHERE account_id = ?", (account_id,))
 
-def update_wallet_balance(new_balance):
-    """Manually update the virtual wallet balance."""
+def reset_account(account_id=DEFAULT_ACCOUNT_ID):
+    """Restores one account's wallet to its starting balance; other accounts are untouched."""
+    _write("reset_account", apply_reset_account, account_id)
+
+def get_account(account_id=DEFAULT_ACCOUNT_ID):
+    """One account as a dict (balance, initial_balance, ...), or None."""
     conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    cursor.execute("UPDATE wallet SET balance = ? WHERE id = 1", (new_balance,))
-    conn.commit()
+    conn.row_factory = sqlite3.Row
+    row = conn.execute("SELECT * FROM accounts WHERE account_id = ?", (account_id,)).fetchone()
     conn.close()
+    return dict(row) if row else None
 
-def get_open_positions(mode="Paper"):
-    """Returns all currently open positions."""
+def get_accounts(kind=None):
+    """Accounts as a DataFrame (optionally one kind), oldest first."""
+    import pandas as pd
     conn = sqlite3.connect(DB_NAME)
-    df = pd.read_sql_query("SELECT * FROM open_positions WHERE mode = ?", conn, params=(mode,))
+    query = "SELECT account_id, name, kind, balance, initial_balance, created FROM accounts"
+    if kind:
+        df = pd.read_sql_query(query + " WHERE kind = ? ORDER BY account_id", conn, params=(kind,))
+    else:
+        df = pd.read_sql_query(query + " ORDER BY account_id", conn)
     conn.close()
     return df
 
-def close_position(pos_id, current_price):
-    """Closes an open position and logs the profit."""
+def get_open_positions(mode="Paper", account_id=DEFAULT_ACCOUNT_ID):
+    """Returns the account's currently open positions."""
+    import pandas as pd
     conn = sqlite3.connect(DB_NAME)
-    cursor = conn.cursor()
-    
+    df = pd.read_sql_query("SELECT * FROM open_positions WHERE account_id = ? AND mode = ?", conn,
+                           params=(account_id, mode))
+    conn.close()
+    return df
+
+def compute_positions_pnl(positions_df, price_lookup):
+    """
+    Adds mark price and P&L columns to an open_positions frame.
+    :param price_lookup: dict of lower-case coin name/symbol -> current price.
+    Positions with no known price are marked at their entry price.
+    """
+    df = positions_df.copy()
+    if df.empty:
+        return df.assign(cur_price=[], pnl_abs=[], pnl_pct=[])
+    df['cur_price'] = df['coin'].str.lower().map(price_lookup).fillna(df['avg_price'])
+    df['pnl_abs'] = (df['cur_price'] - df['avg_price']) * df['amount']
+    lev = df['leverage'].fillna(1) if 'leverage' in df else 1
+    df['pnl_pct'] = ((df['cur_price'] - df['avg_price']) / df['avg_price'] * 100 * lev).where(df['avg_price'] > 0, 0)
+    return df
+
+def apply_close_position(cursor, pos_id, current_price):
+    """Logs the closing SELL and removes the position, on the caller's transaction."""
     # Get position details
-    cursor.execute("SELECT coin, amount, avg_price, mode, leverage FROM open_positions WHERE id = ?", (pos_id,))
+    cursor.execute("SELECT coin, amount, avg_price, mode, leverage, account_id FROM open_positions WHERE id = ?",
+                   (pos_id,))
     pos = cursor.fetchone()
     if pos:
-        coin, amount, buy_price, mode, leverage = pos
-        # Log the SELL trade with the original leverage
-        log_trade(coin, "SELL", current_price, amount, f"Closed Position ID: {pos_id}", mode, leverage)
-        # Remove from open positions
-        cursor.execute("DELETE FROM open_positions WHERE id = ?", (pos_id,))
-    
-    conn.commit()
+        coin, amount, buy_price, mode, leverage, account_id = pos
+        # Log the SELL trade with the original leverage; it consumes exactly this lot
+        apply_trade(cursor, coin, "SELL", current_price, amount, f"Closed Position ID: {pos_id}", mode, leverage,
+                    lot_id=pos_id, account_id=account_id)
+
+def close_position(pos_id, current_price):
+    """Closes an open position and logs the profit."""
+    _write("close_position", apply_close_position, int(pos_id), current_price)
+
+# --- LOT ACCOUNTING SUMMARIES ---
+
+def rebuild_summaries(cursor):
+    """
+    Recomputes position_summary/portfolio_summary from trade_history and
+    open_positions, keeping the realized P&L already booked. Used by the v4
+    migration and for data loaded outside apply_trade.
+    """
+    cursor.execute("UPDATE position_summary SET open_amount = 0, cost_basis = 0, bought = 0, sold = 0, trades = 0")
+    cursor.execute('''
+        INSERT INTO position_summary (account_id, coin, mode, bought, sold, trades)
+        SELECT account_id, coin, mode,
+               SUM(CASE WHEN UPPER(action) = 'BUY' THEN amount ELSE 0 END),
+               SUM(CASE WHEN UPPER(action) = 'SELL' THEN amount ELSE 0 END),
+               COUNT(*)
+        FROM trade_history GROUP BY account_id, coin, mode
+        ON CONFLICT (account_id, coin, mode) DO UPDATE SET
+            bought = excluded.bought, sold = excluded.sold, trades = excluded.trades
+    ''')
+    cursor.execute('''
+        INSERT INTO position_summary (account_id, coin, mode, open_amount, cost_basis)
+        SELECT account_id, coin, mode, SUM(amount), SUM(avg_price * amount)
+        FROM open_positions GROUP BY account_id, coin, mode
+        ON CONFLICT (account_id, coin, mode) DO UPDATE SET
+            open_amount = excluded.open_amount, cost_basis = excluded.cost_basis
+    ''')
+    cursor.execute("DELETE FROM portfolio_summary")
+    cursor.execute('''
+        INSERT INTO portfolio_summary (account_id, mode, cost_basis, realized_pnl, trades)
+        SELECT account_id, mode, SUM(cost_basis), SUM(realized_pnl), SUM(trades)
+        FROM position_summary GROUP BY account_id, mode
+    ''')
+
+def get_portfolio_summary(mode="Paper", account_id=DEFAULT_ACCOUNT_ID):
+    """Open cost basis, realized P&L and trade count for an account and mode: one primary-key read."""
+    conn = sqlite3.connect(DB_NAME)
+    row = conn.execute(
+        "SELECT cost_basis, realized_pnl, trades FROM portfolio_summary WHERE account_id = ? AND mode = ?",
+        (account_id, mode)).fetchone()
+    conn.close()
+    cost_basis, realized_pnl, trades = row or (0.0, 0.0, 0)
+    return {"cost_basis": cost_basis, "realized_pnl": realized_pnl, "trades": trades}
+
+def get_position_summary(mode="Paper", account_id=DEFAULT_ACCOUNT_ID):
+    """Per-coin aggregates (open amount, cost basis, average cost, realized P&L) as a DataFrame."""
+    import pandas as pd
+    conn = sqlite3.connect(DB_NAME)
+    df = pd.read_sql_query('''
+        SELECT coin, open_amount, cost_basis,
+               CASE WHEN open_amount > 0 THEN cost_basis / open_amount END AS avg_cost,
+               realized_pnl, bought, sold, trades
+        FROM position_summary WHERE account_id = ? AND mode = ? ORDER BY coin
+    ''', conn, params=(account_id, mode))
+    conn.close()
+    return df
+
+# --- RESTING ORDERS (matched by order_engine.py) ---
+
+ORDER_TYPES = ("LIMIT", "STOP")
+
+def _next_order_rev(cursor):
+    # execute_write holds the write lock (BEGIN IMMEDIATE) from before this read to
+    # COMMIT, in the writer service and in direct mode alike, so revs follow commit order
+    return cursor.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM orders").fetchone()[0]
+
+def apply_place_order(cursor, coin, symbol, side, order_type, price, amount, leverage=1, mode="Paper",
+                      oco_group=None, reasoning="", account_id=DEFAULT_ACCOUNT_ID):
+    side, order_type = side.upper(), order_type.upper()
+    if side not in ("BUY", "SELL") or order_type not in ORDER_TYPES:
+        raise ValueError(f"Unsupported order: {side} {order_type}")
+    cursor.execute('''
+        INSERT INTO orders (account_id, coin, symbol, side, order_type, price, amount, leverage, mode, oco_group,
+                            reasoning, rev)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (account_id, coin, symbol.upper(), side, order_type, price, amount, leverage, mode, oco_group, reasoning,
+          _next_order_rev(cursor)))
+    return cursor.lastrowid
+
+def place_order(coin, symbol, side, order_type, price, amount, leverage=1, mode="Paper", reasoning="",
+                account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Rests a LIMIT or STOP order. A BUY LIMIT fills once the price drops to
+    `price`, a SELL LIMIT once it rises to it; stops trigger the other way
+    and fill at the tick price. Returns the order id.
+    """
+    return _write("place_order", apply_place_order, coin, symbol, side, order_type, price, amount,
+                  leverage, mode, None, reasoning, account_id)
+
+def apply_place_oco(cursor, coin, symbol, side, amount, limit_price, stop_price, leverage=1, mode="Paper",
+                    reasoning="", account_id=DEFAULT_ACCOUNT_ID):
+    limit_id = apply_place_order(cursor, coin, symbol, side, "LIMIT", limit_price, amount, leverage, mode,
+                                 None, reasoning, account_id)
+    stop_id = apply_place_order(cursor, coin, symbol, side, "STOP", stop_price, amount, leverage, mode,
+                                limit_id, reasoning, account_id)
+    cursor.execute("UPDATE orders SET oco_group = ? WHERE id = ?", (limit_id, limit_id))
+    return limit_id, stop_id
+
+def place_oco(coin, symbol, side, amount, limit_price, stop_price, leverage=1, mode="Paper", reasoning="",
+              account_id=DEFAULT_ACCOUNT_ID):
+    """One-cancels-other pair (e.g. take-profit LIMIT + stop-loss STOP). Returns (limit_id, stop_id)."""
+    return _write("place_oco", apply_place_oco, coin, symbol, side, amount, limit_price, stop_price,
+                  leverage, mode, reasoning, account_id)
+
+def apply_cancel_order(cursor, order_id):
+    """Cancels an open order and, for OCO legs, its sibling. Returns orders cancelled."""
+    row = cursor.execute("SELECT oco_group FROM orders WHERE id = ?", (order_id,)).fetchone()
+    if row is None:
+        return 0
+    rev = _next_order_rev(cursor)
+    if row[0] is not None:
+        cursor.execute("UPDATE orders SET status = 'CANCELLED', rev = ? WHERE oco_group = ? AND status = 'OPEN'",
+                       (rev, row[0]))
+    else:
+        cursor.execute("UPDATE orders SET status = 'CANCELLED', rev = ? WHERE id = ? AND status = 'OPEN'",
+                       (rev, order_id))
+    return cursor.rowcount
+
+def cancel_order(order_id):
+    return _write("cancel_order", apply_cancel_order, int(order_id))
+
+def apply_fills(cursor, fills):
+    """
+    Books a batch of engine fills [(order_id, fill_price), ...] through the
+    trade ledger in one transaction. Orders cancelled in the meantime are
+    skipped, and paper BUYs the account can no longer pay for are cancelled
+    (the manual BUY rejects the same case). Returns the ids that were actually filled.
+    """
+    filled = []
+    rev = _next_order_rev(cursor)
+    for order_id, fill_price in fills:
+        row = cursor.execute('''
+            SELECT coin, side, order_type, price, amount, leverage, mode, oco_group, account_id
+            FROM orders WHERE id = ? AND status = 'OPEN'
+        ''', (order_id,)).fetchone()
+        if row is None:
+            continue
+        coin, side, order_type, price, amount, leverage, mode, oco_group, account_id = row
+        if side == "BUY" and mode == "Paper":
+            balance = cursor.execute("SELECT balance FROM accounts WHERE account_id = ?", (account_id,)).fetchone()
+            if balance is None or fill_price * amount > balance[0]:
+                print(f"Order #{order_id}: insufficient funds for {amount} {coin} @ {fill_price:,.2f}, cancelled")
+                cursor.execute("UPDATE orders SET status = 'CANCELLED', rev = ? WHERE id = ?", (rev, order_id))
+                continue
+        trade_id = apply_trade(cursor, coin, side, fill_price, amount,
+                               f"{order_type} order #{order_id} @ {price:,.2f}", mode, leverage,
+                               account_id=account_id)
+        cursor.execute("UPDATE orders SET status = 'FILLED', fill_price = ?, trade_id = ?, rev = ? WHERE id = ?",
+                       (fill_price, trade_id, rev, order_id))
+        if oco_group is not None:
+            cursor.execute('''
+                UPDATE orders SET status = 'CANCELLED', rev = ?
+                WHERE oco_group = ? AND id != ? AND status = 'OPEN'
+            ''', (rev, oco_group, order_id))
+        filled.append(order_id)
+    return filled
+
+def get_orders(status="OPEN", mode="Paper", account_id=DEFAULT_ACCOUNT_ID):
+    """The account's orders in a given status as a DataFrame (newest first)."""
+    import pandas as pd
+    conn = sqlite3.connect(DB_NAME)
+    df = pd.read_sql_query("SELECT * FROM orders WHERE account_id = ? AND status = ? AND mode = ? ORDER BY id DESC",
+                           conn, params=(account_id, status, mode))
+    conn.close()
+    return df
+
+# --- PRICE ALERTS (evaluated by alert_engine.py) ---
+
+# ABOVE/BELOW: price level. MOVE: % change over window_minutes (negative = drop).
+# PNL: leveraged P&L % of one open position (position_id).
+ALERT_KINDS = ("ABOVE", "BELOW", "MOVE", "PNL")
+
+def _next_alert_rev(cursor):
+    # Read under execute_write's write lock, like _next_order_rev
+    return cursor.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM alerts").fetchone()[0]
+
+def apply_add_alert(cursor, symbol, kind, threshold, window_minutes=None, position_id=None, repeating=False,
+                    note="", account_id=DEFAULT_ACCOUNT_ID):
+    kind = kind.upper()
+    if kind not in ALERT_KINDS:
+        raise ValueError(f"Unsupported alert: {kind}")
+    if kind == "MOVE" and not window_minutes:
+        raise ValueError("MOVE alerts need window_minutes")
+    if kind == "PNL" and position_id is None:
+        raise ValueError("PNL alerts need position_id")
+    cursor.execute('''
+        INSERT INTO alerts (account_id, symbol, kind, threshold, window_minutes, position_id, repeating, note, rev)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', (account_id, symbol.upper(), kind, threshold, window_minutes, position_id, int(bool(repeating)), note,
+          _next_alert_rev(cursor)))
+    return cursor.lastrowid
+
+def add_alert(symbol, kind, threshold, window_minutes=None, position_id=None, repeating=False, note="",
+              account_id=DEFAULT_ACCOUNT_ID):
+    """
+    Stores an alert rule. One-shot rules retire after firing; repeating rules
+    re-arm once the signal falls back through the threshold. Returns the id.
+    """
+    return _write("add_alert", apply_add_alert, symbol, kind, threshold, window_minutes, position_id, repeating,
+                  note, account_id)
+
+def apply_delete_alert(cursor, alert_id):
+    cursor.execute("UPDATE alerts SET status = 'DELETED', rev = ? WHERE id = ? AND status = 'ACTIVE'",
+                   (_next_alert_rev(cursor), alert_id))
+    return cursor.rowcount
+
+def delete_alert(alert_id):
+    return _write("delete_alert", apply_delete_alert, int(alert_id))
+
+def apply_alert_events(cursor, events, expired=()):
+    """
+    Records a batch of engine firings [(alert_ids, ts, price, message), ...]
+    (one event per group of duplicate rules) and retires one-shot rules, in
+    one transaction. Rules deleted in the meantime are skipped; `expired`
+    rules (their position closed) are retired without an event.
+    Returns the number of events recorded.
+    """
+    rev = _next_alert_rev(cursor)
+    recorded = 0
+    for alert_ids, ts, price, message in events:
+        live = []
+        for alert_id in alert_ids:
+            cursor.execute('''
+                UPDATE alerts SET last_triggered = ?, rev = ?,
+                       status = CASE WHEN repeating THEN status ELSE 'TRIGGERED' END
+                WHERE id = ? AND status = 'ACTIVE'
+            ''', (ts, rev, alert_id))
+            if cursor.rowcount:
+                live.append(alert_id)
+        if not live:
+            continue
+        cursor.execute('''
+            INSERT INTO alert_events (alert_id, account_id, ts, symbol, price, message)
+            SELECT id, account_id, ?, symbol, ?, ? FROM alerts WHERE id = ?
+        ''', (ts, price, message, live[0]))
+        recorded += 1
+    for alert_id in expired:
+        cursor.execute("UPDATE alerts SET status = 'EXPIRED', rev = ? WHERE id = ? AND status = 'ACTIVE'",
+                       (rev, alert_id))
+    return recorded
+
+def get_alerts(status="ACTIVE", account_id=DEFAULT_ACCOUNT_ID):
+    """The account's alert rules in a given status as a DataFrame (newest first)."""
+    import pandas as pd
+    conn = sqlite3.connect(DB_NAME)
+    df = pd.read_sql_query("SELECT * FROM alerts WHERE account_id = ? AND status = ? ORDER BY id DESC",
+                           conn, params=(account_id, status))
+    conn.close()
+    return df
+
+def get_alert_events(account_id=DEFAULT_ACCOUNT_ID, after_id=0, limit=50):
+    """Fired alerts newer than `after_id`, newest first, as dicts (cheap enough to poll every second)."""
+    conn = sqlite3.connect(DB_NAME)
+    rows = conn.execute('''
+        SELECT id, alert_id, ts, symbol, price, message FROM alert_events
+        WHERE account_id = ? AND id > ? ORDER BY id DESC LIMIT ?
+    ''', (account_id, after_id, limit)).fetchall()
     conn.close()
+    return [dict(zip(("id", "alert_id", "ts", "symbol", "price", "message"), row)) for row in rows]
 
 if __name__ == "__main__":
     init_db()
-    print(f"Database initialized. Current Balance: ${get_wallet_balance():,.2f}")
+    for account in get_accounts().itertuples():
+        print(f"Account {account.account_id} ({account.name}): ${account.balance:,.2f}")
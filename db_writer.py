@@ -0,0 +1,381 @@
+import os
+import queue
+import secrets
+import sqlite3
+import threading
+import time
+import importlib
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+import metrics
+
+# Configuration
+WRITER_ADDRESS = os.getenv("DB_WRITER_ADDRESS", "")  # e.g. "127.0.0.1:6010"; empty = direct writes
+# Shared secret for the writer socket: DB_WRITER_AUTHKEY if set, else the random key
+# the service writes (mode 0600) to WRITER_AUTHKEY_FILE at startup
+WRITER_AUTHKEY = os.getenv("DB_WRITER_AUTHKEY", "")
+WRITER_AUTHKEY_FILE = os.getenv("DB_WRITER_AUTHKEY_FILE",
+                                os.path.join(os.path.dirname(os.path.abspath(__file__)), ".db_writer.key"))
+WRITER_METRICS_PORT = 9110
+MAX_BATCH = 5000            # Commands folded into one group commit
+GROUP_COMMIT_WINDOW = 0.005  # Seconds to wait for more commands before committing
+MAX_QUEUE = 100_000         # Backpressure: client sockets stall once this many commands wait
+
+# Write procedures the service may run: name -> "module:function".
+# Each function takes a cursor as its first argument and must not commit.
+PROCEDURES = {
+    "log_trade": "database_manager:apply_trade",
+    "log_trades": "database_manager:apply_trades",
+    "close_position": "database_manager:apply_close_position",
+    "update_wallet_balance": "database_manager:apply_wallet_balance",
+    "place_order": "database_manager:apply_place_order",
+    "place_oco": "database_manager:apply_place_oco",
+    "cancel_order": "database_manager:apply_cancel_order",
+    "add_alert": "database_manager:apply_add_alert",
+    "delete_alert": "database_manager:apply_delete_alert",
+    "alert_events": "database_manager:apply_alert_events",
+    "order_fills": "database_manager:apply_fills",
+    "create_account": "database_manager:apply_create_account",
+    "reset_account": "database_manager:apply_reset_account",
+    "store_ticks": "data_collector:apply_ticks",
+    "compaction_rollup": "compaction:apply_rollup",
+    "compaction_purge": "compaction:apply_purge",
+    "incremental_vacuum": "compaction:apply_incremental_vacuum",
+}
+
+QUEUE_DEPTH = metrics.REGISTRY.gauge("db_writer_queue_depth", "Commands waiting for the writer thread.")
+BATCH_SIZE = metrics.REGISTRY.histogram(
+    "db_writer_batch_commands", "Commands per group commit.", buckets=(1, 10, 100, 1000, 5000, 20000))
+WRITER_APPLIED = metrics.REGISTRY.counter(
+    "db_writer_applied_total", "Procedure calls committed by the writer.")
+WRITER_ERRORS = metrics.REGISTRY.counter("db_writer_errors_total", "Commands that failed inside the writer.")
+
+
+class WriterConnectionLost(sqlite3.OperationalError):
+    """A call reached the writer but its reply did not come back; it may or may not have committed."""
+
+
+def _parse_address(address):
+    host, _, port = address.rpartition(":")
+    return (host or "127.0.0.1", int(port))
+
+
+def create_authkey():
+    """
+    The service's key: DB_WRITER_AUTHKEY, or a fresh random key written to
+    WRITER_AUTHKEY_FILE readable by this user only. Raises OSError if it cannot be written.
+    """
+    if WRITER_AUTHKEY:
+        return WRITER_AUTHKEY.encode()
+    key = secrets.token_hex(32)
+    tmp = f"{WRITER_AUTHKEY_FILE}.{os.getpid()}"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    # Atomic: a client never reads a half-written key
+    os.replace(tmp, WRITER_AUTHKEY_FILE)
+    return key.encode()
+
+
+def load_authkey():
+    """The key clients authenticate with. Raises OSError when the service has not published one."""
+    if WRITER_AUTHKEY:
+        return WRITER_AUTHKEY.encode()
+    with open(WRITER_AUTHKEY_FILE) as f:
+        return f.read().strip().encode()
+
+
+def _error_reply(e):
+    # Class and message, so the client can raise what the procedure raised (ValueError stays ValueError)
+    return (False, (type(e).__module__, type(e).__qualname__, str(e)))
+
+
+def _rebuild_error(error):
+    module_name, class_name, message = error
+    try:
+        cls = getattr(importlib.import_module(module_name), class_name)
+        if isinstance(cls, type) and issubclass(cls, Exception):
+            return cls(message)
+    except Exception:
+        pass
+    return sqlite3.OperationalError(f"DB writer: {class_name}: {message}")
+
+
+def open_write_connection(db_name):
+    """Connection tuned for the single writer: WAL + NORMAL sync, explicit transactions."""
+    conn = sqlite3.connect(db_name, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.execute("PRAGMA busy_timeout = 5000")
+    return conn
+
+
+# --- SERVER ---
+
+class WriterService:
+    """
+    Owns one write connection per database file. Client threads enqueue
+    commands; a single writer thread drains the queue and group-commits
+    everything it collected for a database in one transaction.
+
+    Only registered PROCEDURES run; clients cannot send SQL. Commands
+    (tuples sent over the connection):
+      ("call", db, procedure, args, kwargs)    runs a registered procedure, replies (ok, result)
+      ("cast", db, procedure, args, kwargs)    same, without a reply (fire-and-forget)
+      ("flush",)                               replies once everything before it is committed
+    """
+
+    def __init__(self, address, authkey=None):
+        self.address = _parse_address(address)
+        self.authkey = authkey
+        self.commands = queue.Queue(maxsize=MAX_QUEUE)
+        self.connections = {}
+        self.procedures = {}
+
+    def _procedure(self, name):
+        fn = self.procedures.get(name)
+        if fn is None:
+            if name not in PROCEDURES:
+                raise ValueError(f"Unknown write procedure: {name}")
+            module_name, _, func_name = PROCEDURES[name].partition(":")
+            fn = getattr(importlib.import_module(module_name), func_name)
+            self.procedures[name] = fn
+        return fn
+
+    def _connection(self, db_name):
+        conn = self.connections.get(db_name)
+        if conn is None:
+            conn = open_write_connection(db_name)
+            self.connections[db_name] = conn
+        return conn
+
+    def _drain(self):
+        """Blocks for one command, then gathers more until the batch or window is full."""
+        batch = [self.commands.get()]
+        deadline = time.perf_counter() + GROUP_COMMIT_WINDOW
+        while len(batch) < MAX_BATCH:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self.commands.get(timeout=timeout))
+            except queue.Empty:
+                break
+        QUEUE_DEPTH.set(self.commands.qsize())
+        return batch
+
+    def _commit_batch(self, batch):
+        replies = []
+        by_db = {}
+        for conn, cmd in batch:
+            if cmd[0] == "flush":
+                replies.append((conn, (True, None)))
+            elif cmd[0] in ("call", "cast"):
+                by_db.setdefault(cmd[1], []).append((conn, cmd))
+            else:
+                WRITER_ERRORS.inc()
+                print(f"Writer: unsupported command {cmd[0]!r} ignored")
+
+        for db_name, items in by_db.items():
+            started = time.perf_counter()
+            group_replies = []
+            rows = 0
+            try:
+                db = self._connection(db_name)
+                cursor = db.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                for conn, cmd in items:
+                    # Savepoint per command: one bad command must not roll back the whole group
+                    cursor.execute("SAVEPOINT cmd")
+                    try:
+                        result = self._procedure(cmd[2])(cursor, *cmd[3], **cmd[4])
+                        if cmd[0] == "call":
+                            group_replies.append((conn, (True, result)))
+                        rows += 1
+                        cursor.execute("RELEASE cmd")
+                    except Exception as e:
+                        cursor.execute("ROLLBACK TO cmd")
+                        cursor.execute("RELEASE cmd")
+                        WRITER_ERRORS.inc()
+                        if cmd[0] == "call":
+                            group_replies.append((conn, _error_reply(e)))
+                        else:
+                            print(f"Writer error on {db_name}: {e}")
+                cursor.execute("COMMIT")
+            except Exception as e:
+                # BEGIN/COMMIT failed (e.g. locked by a direct writer or a migration):
+                # nothing in this group committed, so every caller gets the error
+                self._rollback(db_name)
+                WRITER_ERRORS.inc(len(items))
+                print(f"Writer: group commit on {db_name} failed ({e}); {len(items)} commands rejected")
+                error = _error_reply(e)
+                replies.extend((conn, error) for conn, cmd in items if cmd[0] == "call")
+                continue
+            replies.extend(group_replies)
+            # Every command waited for this one transaction
+            elapsed = time.perf_counter() - started
+            for conn, cmd in items:
+                metrics.DB_WRITE_LATENCY.observe(elapsed, db=db_name, op=cmd[2])
+            WRITER_APPLIED.inc(rows)
+        BATCH_SIZE.observe(len(batch))
+
+        # Replies go out only after COMMIT so callers never see uncommitted state
+        for conn, reply in replies:
+            try:
+                conn.send(reply)
+            except (OSError, EOFError):
+                pass
+
+    def _rollback(self, db_name):
+        db = self.connections.get(db_name)
+        if db is None:
+            return
+        try:
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+        except sqlite3.Error:
+            # Unusable connection: drop it so the next batch reopens the file
+            db.close()
+            del self.connections[db_name]
+
+    def _writer_loop(self):
+        while True:
+            try:
+                self._commit_batch(self._drain())
+            except Exception as e:
+                # The service has one writer thread; it must outlive any single batch
+                print(f"Writer loop error: {e}")
+
+    def _client_loop(self, conn):
+        try:
+            while True:
+                self.commands.put((conn, conn.recv()))
+        except (EOFError, OSError):
+            conn.close()
+
+    def serve_forever(self):
+        if not self.authkey:
+            raise RuntimeError("DB writer: refusing to listen without an authkey")
+        threading.Thread(target=self._writer_loop, name="db-writer", daemon=True).start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            print(f"DB writer listening on {self.address[0]}:{self.address[1]}")
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, OSError, EOFError) as e:
+                    # A client with the wrong key must not take the service down
+                    print(f"DB writer: rejected connection ({e})")
+                    continue
+                threading.Thread(target=self._client_loop, args=(conn,), daemon=True).start()
+
+
+# --- CLIENT ---
+
+class WriterClient:
+    """Thread-safe client; one socket per process is enough."""
+
+    def __init__(self, address):
+        self.conn = Client(_parse_address(address), authkey=load_authkey())
+        self.lock = threading.Lock()
+
+    def cast(self, db_name, procedure, *args, **kwargs):
+        """Queues a registered write procedure without waiting for its result."""
+        with self.lock:
+            self.conn.send(("cast", db_name, procedure, args, kwargs))
+
+    def call(self, db_name, procedure, *args, **kwargs):
+        """Runs a registered write procedure and waits for its committed result."""
+        with self.lock:
+            self.conn.send(("call", db_name, procedure, args, kwargs))
+            try:
+                ok, result = self.conn.recv()
+            except (EOFError, OSError) as e:
+                raise WriterConnectionLost(f"DB writer: no reply to {procedure} ({e})")
+        if not ok:
+            raise _rebuild_error(result)
+        return result
+
+    def flush(self):
+        """Blocks until every command sent so far is committed."""
+        with self.lock:
+            self.conn.send(("flush",))
+            self.conn.recv()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_writer():
+    """
+    Returns this process's WriterClient when DB_WRITER_ADDRESS is configured
+    and reachable, else None (callers then write to SQLite directly).
+    """
+    global _client
+    if not WRITER_ADDRESS:
+        return None
+    with _client_lock:
+        if _client is None:
+            try:
+                _client = WriterClient(WRITER_ADDRESS)
+            except (OSError, AuthenticationError) as e:
+                print(f"DB writer unreachable at {WRITER_ADDRESS} ({e}); writing directly.")
+                return None
+        return _client
+
+
+def reset_writer():
+    """Drops a broken client so the next get_writer() reconnects."""
+    global _client
+    with _client_lock:
+        _client = None
+
+
+def execute_write(db_name, procedure, fn, *args, wait=True):
+    """
+    Runs `fn(cursor, *args)` as one transaction: through the writer service
+    (registered as `procedure`) when configured, otherwise on a direct
+    connection. With wait=False the writer path does not block for the result.
+    """
+    writer = get_writer()
+    if writer is not None:
+        try:
+            if wait:
+                return writer.call(os.path.abspath(db_name), procedure, *args)
+            return writer.cast(os.path.abspath(db_name), procedure, *args)
+        except WriterConnectionLost:
+            # The command was delivered and may have committed; writing it here could apply it twice
+            reset_writer()
+            raise
+        except (OSError, EOFError):
+            # Never delivered: safe to write directly instead
+            reset_writer()
+    conn = sqlite3.connect(db_name, timeout=10, isolation_level=None)
+    try:
+        # Write lock before fn reads anything, as the service does: values fn derives
+        # from current rows (e.g. the next order/alert rev) then follow commit order
+        started = time.perf_counter()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn.cursor(), *args)
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        metrics.DB_WRITE_LATENCY.observe(time.perf_counter() - started, db=db_name, op=procedure)
+        return result
+    finally:
+        conn.close()
+
+
+def main():
+    try:
+        authkey = create_authkey()
+    except OSError as e:
+        raise SystemExit(f"DB writer: cannot create the authkey file {WRITER_AUTHKEY_FILE} ({e}); not starting")
+    metrics.start_metrics_server(WRITER_METRICS_PORT)
+    WriterService(WRITER_ADDRESS or "127.0.0.1:6010", authkey).serve_forever()
+
+
+if __name__ == "__main__":
+    main()
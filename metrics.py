@@ -0,0 +1,259 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Configuration
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+DEFAULT_METRICS_PORT = 9108
+
+def _label_key(labels):
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    body = ",".join(f'{k}="{v}"' for k, v in pairs)
+    return "{" + body + "}"
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1.0, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, key, val) for key, val in self._values.items()]
+
+class Gauge(Counter):
+    """Point-in-time value that can go up and down."""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+class Histogram:
+    """Cumulative bucket histogram (Prometheus semantics)."""
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Context manager that observes the wall-clock duration of its block."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def quantile(self, q, **labels):
+        """Approximates a quantile from the bucket counts (upper bucket bound)."""
+        series = self._series.get(_label_key(labels))
+        if not series or series["count"] == 0:
+            return None
+        target = q * series["count"]
+        for bound, cumulative in zip(self.buckets, series["counts"]):
+            if cumulative >= target:
+                return bound
+        return float("inf")
+
+    def samples(self):
+        out = []
+        with self._lock:
+            for key, series in self._series.items():
+                for bound, cumulative in zip(self.buckets, series["counts"]):
+                    out.append((f"{self.name}_bucket", key + (("le", repr(bound)),), cumulative))
+                out.append((f"{self.name}_bucket", key + (("le", "+Inf"),), series["count"]))
+                out.append((f"{self.name}_sum", key, series["sum"]))
+                out.append((f"{self.name}_count", key, series["count"]))
+        return out
+
+class Registry:
+    """Holds every metric family of the current process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _get_or_create(self, cls, name, help_text, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = cls(name, help_text, **kwargs)
+                self._metrics[name] = metric
+            return metric
+
+    def counter(self, name, help_text):
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name, help_text):
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self):
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, key, val in metric.samples():
+                lines.append(f"{name}{_format_labels(key)} {val}")
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self):
+        """Flat list of dicts (one per series) for dashboards and benchmarks."""
+        rows = []
+        for metric in list(self._metrics.values()):
+            if isinstance(metric, Histogram):
+                for key, series in list(metric._series.items()):
+                    labels = dict(key)
+                    count = series["count"]
+                    rows.append({
+                        "metric": metric.name,
+                        "labels": _format_labels(key),
+                        "count": count,
+                        "avg": series["sum"] / count if count else 0.0,
+                        "p50": metric.quantile(0.5, **labels),
+                        "p95": metric.quantile(0.95, **labels),
+                    })
+            else:
+                for _, key, val in metric.samples():
+                    rows.append({"metric": metric.name, "labels": _format_labels(key), "value": val})
+        return rows
+
+REGISTRY = Registry()
+
+# --- SHARED METRIC FAMILIES ---
+HTTP_LATENCY = REGISTRY.histogram(
+    "http_request_duration_seconds", "Outbound HTTP latency per service and endpoint.")
+HTTP_RESPONSES = REGISTRY.counter(
+    "http_responses_total", "Outbound HTTP responses per service, endpoint and status code.")
+DB_WRITE_LATENCY = REGISTRY.histogram(
+    "db_write_duration_seconds", "SQLite write transaction latency per database and procedure, observed at COMMIT by whichever process commits.")
+ROWS_INGESTED = REGISTRY.counter(
+    "collector_rows_ingested_total", "Price rows written by the collector.")
+INGEST_RATE = REGISTRY.gauge(
+    "collector_ingest_rows_per_second", "Rows per second achieved by the last ingest batch.")
+TICK_AGE = REGISTRY.gauge(
+    "collector_tick_age_seconds", "Age of the newest upstream price per coin at ingest time.")
+LLM_LATENCY = REGISTRY.histogram(
+    "llm_request_duration_seconds", "Gemini call latency per model and outcome.")
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "Gemini calls per outcome (ok, quota, error), counted once each, also when abandoned.")
+LLM_SIGNALS = REGISTRY.counter(
+    "llm_signals_total", "get_trading_signal answers by source (gemini, quota_fallback, timeout_fallback, error).")
+LLM_PROMPT_TOKENS = REGISTRY.histogram(
+    "llm_prompt_tokens", "Prompt size per Gemini call (estimated before sending, billed from usage metadata).",
+    buckets=(50, 100, 200, 400, 800, 1600, 3200, 6400))
+LLM_CONTEXT_TICKS = REGISTRY.counter(
+    "llm_context_ticks_total", "Price ticks summarized into Gemini prompts (divide by llm_request_duration_seconds_sum).")
+CACHE_REQUESTS = REGISTRY.counter(
+    "cache_requests_total", "Cache lookups per cache and result (hit/miss).")
+APP_RERUN = REGISTRY.histogram(
+    "app_rerun_duration_seconds", "Duration of a full Streamlit script run.")
+
+def record_http(service, endpoint, status_code):
+    """Counts an HTTP response (429s show up as status=\"429\")."""
+    HTTP_RESPONSES.inc(service=service, endpoint=endpoint, status=status_code)
+
+def record_cache(cache, hit):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+def cache_hit_ratio(cache):
+    hits = CACHE_REQUESTS.value(cache=cache, result="hit")
+    misses = CACHE_REQUESTS.value(cache=cache, result="miss")
+    total = hits + misses
+    return hits / total if total else None
+
+def parse_exposition(text):
+    """
+    Parses Prometheus text output (e.g. the collector's /metrics) into
+    a list of {"metric", "labels", "value"} dicts. Buckets are skipped.
+    """
+    rows = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        try:
+            series, value = line.rsplit(" ", 1)
+            name, _, labels = series.partition("{")
+            if name.endswith("_bucket"):
+                continue
+            rows.append({"metric": name, "labels": ("{" + labels) if labels else "", "value": float(value)})
+        except ValueError:
+            continue
+    return rows
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_response(404)
+            self.end_headers()
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # Keep scrapes out of stdout
+
+_server = None
+
+def start_metrics_server(port=None, host="127.0.0.1"):
+    """
+    Serves /metrics from a daemon thread. Safe to call repeatedly;
+    returns the bound port, or None if the port is unavailable.
+    """
+    global _server
+    if _server is not None:
+        return _server.server_address[1]
+    port = int(port if port is not None else os.getenv("METRICS_PORT", DEFAULT_METRICS_PORT))
+    try:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    except OSError as e:
+        print(f"Metrics endpoint disabled (port {port}): {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-server", daemon=True).start()
+    return _server.server_address[1]
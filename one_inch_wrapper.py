@@ -1,9 +1,14 @@
 import requests
 import os
 from dotenv import load_dotenv
+import metrics
 
 load_dotenv()
 
+# Override to point at replay_server.py for load tests
+ONE_INCH_BASE_URL = os.getenv("ONE_INCH_BASE_URL", "https://api.1inch.dev/swap/v6.0")
+REQUEST_TIMEOUT = 10  # Seconds
+
 class OneInchService:
     """
     Service wrapper for the 1inch Swap API v6.0.
@@ -15,7 +20,7 @@ class OneInchService:
         Initializes the 1inch service.
         :param chain_id: The ID of the blockchain (1 for Ethereum, 56 for BSC, 137 for Polygon, etc.)
         """
-        self.base_url = f"https://api.1inch.dev/swap/v6.0/{chain_id}"
+        self.base_url = f"{ONE_INCH_BASE_URL}/{chain_id}"
         self.api_key = os.getenv("ONE_INCH_API_KEY")
         
         # Headers required for 1inch Developer Portal API
@@ -23,6 +28,9 @@ class OneInchService:
             "Authorization": f"Bearer {self.api_key}",
             "accept": "application/json"
         }
+        # Keep-alive: repeat calls reuse the TLS connection instead of a fresh handshake each
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
 
     def _make_request(self, endpoint, params):
         """Internal helper to handle API requests."""
@@ -31,7 +39,9 @@ class OneInchService:
 
         url = f"{self.base_url}{endpoint}"
         try:
-            response = requests.get(url, headers=self.headers, params=params)
+            with metrics.HTTP_LATENCY.time(service="1inch", endpoint=endpoint):
+                response = self.session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+            metrics.record_http("1inch", endpoint, response.status_code)
             if response.status_code == 200:
                 return response.json()
             else:
@@ -57,7 +67,7 @@ class OneInchService:
         }
         return self._make_request("/quote", params)
 
-    def get_swap_transaction(self, from_token, to_token, amount, wallet_address, slippage=1):
+    def get_swap_transaction(self, from_token, to_token, amount, wallet_address, slippage=1, disable_estimate=False):
         """
         Generates the raw transaction data (calldata) needed to execute a swap.
         :param from_token: Source token contract address
@@ -65,6 +75,7 @@ class OneInchService:
         :param amount: Amount in units of source token
         :param wallet_address: The address that will trigger the transaction
         :param slippage: Max allowed price slippage (default 1%)
+        :param disable_estimate: Skip 1inch's balance/allowance simulation (lets the calldata be built before approval)
         :return: JSON containing 'tx' object with 'data', 'to', 'value', etc.
         """
         params = {
@@ -74,6 +85,8 @@ class OneInchService:
             "from": wallet_address,
             "slippage": slippage
         }
+        if disable_estimate:
+            params["disableEstimate"] = "true"
         return self._make_request("/swap", params)
 
     def get_approve_transaction(self, token_address, amount=None):
@@ -87,6 +100,14 @@ class OneInchService:
             params["amount"] = str(amount)
         return self._make_request("/approve/transaction", params)
 
+    def get_allowance(self, token_address, wallet_address):
+        """
+        How much of a token the 1inch Router may currently spend for a wallet.
+        :return: JSON containing 'allowance' (string, token units).
+        """
+        params = {"tokenAddress": token_address, "walletAddress": wallet_address}
+        return self._make_request("/approve/allowance", params)
+
 if __name__ == "__main__":
     # Quick Test Block
     # Example: ETH (0xeeee...) to USDT (0xdac...) on Ethereum (chain 1)
@@ -0,0 +1,261 @@
+import argparse
+import heapq
+import sqlite3
+import time
+import metrics
+import database_manager
+from db_writer import execute_write
+
+# Configuration
+SYNC_INTERVAL = 1.0   # Seconds between incremental order syncs from trades.db
+GC_RATIO = 0.5        # Rebuild a heap once more than half its entries are dead
+
+MATCH_LATENCY = metrics.REGISTRY.histogram(
+    "order_engine_match_seconds", "Matching time per tick.",
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01))
+ORDERS_FILLED = metrics.REGISTRY.counter("order_engine_fills_total", "Orders filled by the paper engine.")
+RESTING_ORDERS = metrics.REGISTRY.gauge("order_engine_resting_orders", "Open orders held in the book.")
+
+
+class Order:
+    __slots__ = ("id", "symbol", "side", "order_type", "price", "oco_group")
+
+    def __init__(self, id, symbol, side, order_type, price, oco_group=None):
+        self.id = id
+        self.symbol = symbol
+        self.side = side
+        self.order_type = order_type
+        self.price = price
+        self.oco_group = oco_group
+
+
+class CoinBook:
+    """
+    Four price-sorted heaps per coin, each keyed so its top is the next order
+    a moving price would cross:
+      BUY LIMIT   fills when price <= limit  -> max-heap on limit
+      SELL LIMIT  fills when price >= limit  -> min-heap on limit
+      BUY STOP    triggers when price >= stop -> min-heap on stop
+      SELL STOP   triggers when price <= stop -> max-heap on stop
+    Cancelled/filled orders are dropped lazily when they reach the top.
+    """
+
+    # (side, type) -> (heap name, sign): entries are (sign * price, order id)
+    HEAPS = {
+        ("BUY", "LIMIT"): ("buy_limit", -1),
+        ("SELL", "LIMIT"): ("sell_limit", 1),
+        ("BUY", "STOP"): ("buy_stop", 1),
+        ("SELL", "STOP"): ("sell_stop", -1),
+    }
+
+    def __init__(self):
+        self.buy_limit = []
+        self.sell_limit = []
+        self.buy_stop = []
+        self.sell_stop = []
+        self.dead = 0
+
+    def push(self, order):
+        name, sign = self.HEAPS[(order.side, order.order_type)]
+        heapq.heappush(getattr(self, name), (sign * order.price, order.id))
+
+    def compact(self, live):
+        """Drops dead entries once they dominate (keeps heap sizes bounded under churn)."""
+        for name, _ in self.HEAPS.values():
+            heap = [entry for entry in getattr(self, name) if entry[1] in live]
+            heapq.heapify(heap)
+            setattr(self, name, heap)
+        self.dead = 0
+
+    def size(self):
+        return len(self.buy_limit) + len(self.sell_limit) + len(self.buy_stop) + len(self.sell_stop)
+
+
+class OrderEngine:
+    """
+    In-memory matching for resting paper orders. Fills are queued and booked
+    through the trade ledger (database_manager.apply_fills) one batch per
+    flush, so a burst of crossings costs one transaction.
+    """
+
+    def __init__(self, db_name=None):
+        self.db_name = db_name or database_manager.DB_NAME
+        self.books = {}
+        self.orders = {}
+        self.oco = {}
+        self.pending = []
+        self.rev = 0
+        self.last_sync = 0.0
+
+    # --- BOOK MAINTENANCE ---
+
+    def add(self, order):
+        if order.id in self.orders:
+            return
+        self.orders[order.id] = order
+        self.books.setdefault(order.symbol, CoinBook()).push(order)
+        if order.oco_group is not None:
+            self.oco.setdefault(order.oco_group, set()).add(order.id)
+
+    def remove(self, order_id):
+        order = self.orders.pop(order_id, None)
+        if order is None:
+            return
+        self.books[order.symbol].dead += 1
+        if order.oco_group is not None:
+            group = self.oco.get(order.oco_group)
+            if group is not None:
+                group.discard(order_id)
+                if not group:
+                    del self.oco[order.oco_group]
+
+    def load(self):
+        """Rebuilds the book from every OPEN order (start-up, or after the DB rejected fills)."""
+        self.books, self.orders, self.oco = {}, {}, {}
+        conn = sqlite3.connect(self.db_name, isolation_level=None)
+        try:
+            # One read transaction: the open set and the rev watermark come from the same snapshot
+            conn.execute("BEGIN")
+            self.rev = conn.execute("SELECT COALESCE(MAX(rev), 0) FROM orders").fetchone()[0]
+            rows = conn.execute('''
+                SELECT id, symbol, side, order_type, price, oco_group
+                FROM orders WHERE status = 'OPEN' AND mode = 'Paper'
+            ''').fetchall()
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+        for row in rows:
+            self.add(Order(*row))
+        self.last_sync = time.time()
+        RESTING_ORDERS.set(len(self.orders))
+        return len(rows)
+
+    def sync(self):
+        """Applies every order change committed since the last sync (new, cancelled, filled)."""
+        conn = sqlite3.connect(self.db_name)
+        try:
+            rows = conn.execute('''
+                SELECT id, symbol, side, order_type, price, oco_group, status, rev
+                FROM orders WHERE rev > ? AND mode = 'Paper' ORDER BY rev
+            ''', (self.rev,)).fetchall()
+        finally:
+            conn.close()
+        for order_id, symbol, side, order_type, price, oco_group, status, rev in rows:
+            if status == "OPEN":
+                self.add(Order(order_id, symbol, side, order_type, price, oco_group))
+            else:
+                self.remove(order_id)
+            self.rev = rev
+        self._gc()
+        self.last_sync = time.time()
+        RESTING_ORDERS.set(len(self.orders))
+        return len(rows)
+
+    # --- MATCHING ---
+
+    def _fill(self, order_id, fill_price, fills):
+        order = self.orders.get(order_id)
+        fills.append((order_id, fill_price))
+        group = self.oco.get(order.oco_group) if order.oco_group is not None else None
+        self.remove(order_id)
+        if group:
+            for sibling in list(group):
+                self.remove(sibling)
+
+    def _gc(self, books=None):
+        # Between ticks only: compaction swaps the heap lists and is O(n)
+        for book in books if books is not None else self.books.values():
+            if book.dead > GC_RATIO * book.size():
+                book.compact(self.orders)
+
+    def _pop_crossed(self, book, heap, sign, price, fills):
+        # Entries are (sign * trigger price) and every heap is a min-heap, so a
+        # tick crosses the top when sign * price reaches the key. Every crossed
+        # order fills at the tick: for a limit that is min(limit, price) on a BUY
+        # and max(limit, price) on a SELL, so a gap through the limit fills better
+        orders = self.orders
+        key_price = sign * price
+        while heap and heap[0][0] <= key_price:
+            key, order_id = heapq.heappop(heap)
+            if order_id not in orders:
+                book.dead = max(book.dead - 1, 0)
+                continue
+            self._fill(order_id, price, fills)
+            book.dead -= 1  # remove() counted the entry we just popped
+
+    def on_tick(self, symbol, price):
+        """Fills every order the tick crosses. Returns [(order_id, fill_price), ...]."""
+        book = self.books.get(symbol)
+        if book is None:
+            return []
+        started = time.perf_counter()
+        fills = []
+        # Limits fill at the tick once it is at or through their price; stops become market orders at the tick
+        self._pop_crossed(book, book.buy_limit, -1, price, fills)
+        self._pop_crossed(book, book.sell_limit, 1, price, fills)
+        self._pop_crossed(book, book.buy_stop, 1, price, fills)
+        self._pop_crossed(book, book.sell_stop, -1, price, fills)
+        self.pending.extend(fills)
+        MATCH_LATENCY.observe(time.perf_counter() - started)
+        return fills
+
+    def flush(self):
+        """Books queued fills in one transaction. Returns the order ids actually filled."""
+        self._gc()
+        if not self.pending:
+            return []
+        fills = self.pending
+        try:
+            filled = execute_write(self.db_name, "order_fills", database_manager.apply_fills, fills)
+        except Exception as e:
+            # The crossed orders are already out of the book, so keeping the fills
+            # queued retries them on the next flush without matching them twice
+            print(f"Order engine: booking {len(fills)} fills failed ({e}); retrying next flush")
+            return []
+        self.pending = []
+        ORDERS_FILLED.inc(len(filled))
+        if len(filled) < len(fills):
+            # Some order was cancelled in trades.db before the engine synced; OCO
+            # siblings dropped optimistically may still be open, so reload the book
+            self.load()
+        RESTING_ORDERS.set(len(self.orders))
+        return filled
+
+    def process(self, ticks):
+        """One tick-stream event: sync order changes if due, match every tick, book the fills."""
+        if time.time() - self.last_sync >= SYNC_INTERVAL:
+            self.sync()
+        for tick in ticks:
+            self.on_tick(tick["symbol"], tick["price"])
+        return self.flush()
+
+
+def run(url=None):
+    """Consumes the collector's SSE tick stream and matches resting orders until interrupted."""
+    import tick_stream
+    database_manager.init_db()
+    engine = OrderEngine()
+    print(f"Order engine: {engine.load()} resting orders loaded")
+
+    def on_ticks(ticks):
+        filled = engine.process(ticks)
+        if filled:
+            print(f"Filled orders: {filled}")
+
+    # Matching, syncing and booking all run on the ticker's thread, one event at a time
+    tick_stream.LiveTicker(url or tick_stream.TICK_STREAM_URL, on_ticks=on_ticks).start()
+    while True:
+        time.sleep(60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Paper-trading limit/stop/OCO matching engine.")
+    parser.add_argument("--url", help="Tick stream base URL (default: TICK_STREAM_URL)")
+    parser.add_argument("--metrics-port", type=int, default=9111)
+    args = parser.parse_args()
+    metrics.start_metrics_server(args.metrics_port)
+    run(args.url)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,423 @@
+"""
+Deterministic market-replay server for load testing.
+
+Mimics the upstream endpoints the bot calls:
+    GET /api/v3/coins/markets                    (CoinGecko)
+    GET /api/v3/coins/{id}/market_chart          (CoinGecko)
+    GET /swap/v6.0/{chain}/quote                 (1inch)
+    GET /swap/v6.0/{chain}/swap                  (1inch, calldata is a deterministic placeholder)
+    GET /swap/v6.0/{chain}/approve/transaction   (1inch)
+    GET /swap/v6.0/{chain}/approve/allowance     (1inch, always 0)
+plus GET /stats (served/rejected counters as JSON).
+
+Prices come from fixed paths (a seeded random walk per coin, or the ticks
+recorded in crypto_bot.db) sampled every REPLAY_STEP seconds of replay time.
+Replay time runs `speed` times faster than the wall clock from `start`, and
+every price is a pure function of (seed, coin, replay time), so two runs
+with the same options serve the same market. Latency and 429s are injected
+on top; 429s come from a seeded RNG, so their sequence repeats too.
+
+Point the bot at it with:
+    COINGECKO_BASE_URL=http://127.0.0.1:8790/api/v3
+    ONE_INCH_BASE_URL=http://127.0.0.1:8790/swap/v6.0
+    ONE_INCH_API_KEY=replay   (any value; the key is not checked)
+
+Usage:
+    python replay_server.py --coins 500 --speed 60 --latency-ms 80 --error-rate 0.02
+    python replay_server.py --from-db crypto_bot.db --speed 10
+"""
+import argparse
+import hashlib
+import json
+import math
+import random
+import re
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import numpy as np
+
+import metrics
+
+# Configuration
+REPLAY_PORT = 8790
+REPLAY_COINS = 100
+REPLAY_SEED = 7
+REPLAY_STEP = 300         # Seconds between path points (CoinGecko's 1-day chart granularity)
+REPLAY_CYCLE_DAYS = 30    # Synthetic paths repeat after this much replay time, without a jump
+MAX_PER_PAGE = 250        # CoinGecko's /coins/markets page limit
+SWAP_FEE = 0.003          # Taken off every replayed 1inch quote
+ROUTER_ADDRESS = "0x111111125421ca6dc452d289314280a0f8842a65"  # 1inch v6 router (spender/recipient in replayed txs)
+GAS_PRICE = "20000000000"
+
+# (id, symbol, name, starting price, circulating supply); the rest of the universe is synthetic
+KNOWN_COINS = [
+    ("bitcoin", "btc", "Bitcoin", 60000.0, 19.7e6),
+    ("ethereum", "eth", "Ethereum", 3000.0, 120e6),
+    ("binancecoin", "bnb", "BNB", 550.0, 146e6),
+    ("solana", "sol", "Solana", 150.0, 460e6),
+    ("cardano", "ada", "Cardano", 0.45, 35e9),
+]
+# 1inch token address -> (coin id, decimals); unknown addresses map to a coin by hash
+TOKENS = {
+    "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee": ("ethereum", 18),
+    "0xa0b86991c6218b36c1d19d4a2e9eb0ce3606eb48": ("usd-coin", 6),
+    "0xdac17f958d2ee523a2206206994597c13d831ec7": ("tether", 6),
+}
+STABLECOINS = {"usd-coin", "tether"}
+
+REPLAY_REQUESTS = metrics.REGISTRY.counter("replay_requests_total", "Requests served by the replay server.")
+REPLAY_REJECTED = metrics.REGISTRY.counter("replay_rate_limited_total", "Injected 429 responses.")
+
+_CHART_PATH = re.compile(r"^/api/v3/coins/([^/]+)/market_chart$")
+_ONE_INCH_PATH = re.compile(r"^/swap/v6\.0/(\d+)(/quote|/swap|/approve/transaction|/approve/allowance)$")
+
+
+def _iso(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+
+
+class ReplayMarket:
+    """
+    The replayed universe: `paths` is a (coins, points) price grid at
+    REPLAY_STEP spacing that repeats every `points` steps of replay time.
+    """
+
+    def __init__(self, coins=REPLAY_COINS, seed=REPLAY_SEED, speed=1.0, start=None, db_name=None):
+        self.speed = speed
+        self.origin = 0     # Replay time of path point 0 (the first recorded tick when replaying a DB)
+        if db_name:
+            self._load_recorded(db_name)
+        else:
+            self._generate(coins, seed)
+        self.start = (self.origin or time.time()) if start is None else start
+        self.wall0 = time.time()
+        self.index = {coin_id: i for i, coin_id in enumerate(self.ids)}
+
+    def _generate(self, coins, seed):
+        rng = np.random.default_rng(seed)
+        points = REPLAY_CYCLE_DAYS * 86400 // REPLAY_STEP
+        known = KNOWN_COINS[:coins]
+        self.ids = [k[0] for k in known] + [f"replay-{i:04d}" for i in range(len(known), coins)]
+        self.symbols = [k[1] for k in known] + [f"r{i:04d}" for i in range(len(known), coins)]
+        self.names = [k[2] for k in known] + [f"Replay Coin {i:04d}" for i in range(len(known), coins)]
+        extra = coins - len(known)
+        start = np.concatenate([[k[3] for k in known], np.exp(rng.uniform(np.log(0.001), np.log(500), extra))])
+        # Synthetic market caps $10M-$50B, so the known coins stay on top
+        cap = np.exp(rng.uniform(np.log(1e7), np.log(5e10), extra))
+        self.supply = np.concatenate([[k[4] for k in known], cap / start[len(known):]])
+        # Annualised volatility 40-120% per coin, plus a market factor everything loads on
+        sigma = rng.uniform(0.4, 1.2, coins) / np.sqrt(365 * 86400 / REPLAY_STEP)
+        market = rng.normal(0, 1, points)
+        steps = (0.5 * market + 0.85 * rng.normal(0, 1, (coins, points))) * sigma[:, None]
+        walk = np.cumsum(steps, axis=1)
+        # Brownian bridge: pin the last point to the first so the cycle has no seam
+        walk -= walk[:, -1:] * np.arange(1, points + 1) / points
+        self.paths = (start[:, None] * np.exp(walk)).astype(np.float32)
+
+    def _load_recorded(self, db_name):
+        """Resamples every coin's stored ticks onto one REPLAY_STEP grid spanning the recording."""
+        conn = sqlite3.connect(db_name)
+        try:
+            rows = conn.execute('''
+                SELECT c.symbol, t.ts, t.price FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+                ORDER BY c.symbol, t.ts
+            ''').fetchall()
+        finally:
+            conn.close()
+        if not rows:
+            raise ValueError(f"No ticks recorded in {db_name}")
+        by_symbol = {}
+        for symbol, ts, price in rows:
+            by_symbol.setdefault(symbol, ([], []))
+            by_symbol[symbol][0].append(ts)
+            by_symbol[symbol][1].append(price)
+        first = min(ts[0] for ts, _ in by_symbol.values())
+        last = max(ts[-1] for ts, _ in by_symbol.values())
+        grid = np.arange(first, max(last, first + REPLAY_STEP) + 1, REPLAY_STEP)
+        self.origin = first
+        known = {k[1].upper(): k for k in KNOWN_COINS}
+        self.ids, self.symbols, self.names, supply, paths = [], [], [], [], []
+        for symbol, (ts, prices) in sorted(by_symbol.items()):
+            k = known.get(symbol)
+            self.ids.append(k[0] if k else symbol.lower())
+            self.symbols.append(symbol.lower())
+            self.names.append(k[2] if k else symbol)
+            supply.append(k[4] if k else 1e9)
+            paths.append(np.interp(grid, ts, prices))
+        self.supply = np.array(supply)
+        self.paths = np.array(paths, dtype=np.float32)
+
+    # --- PRICES ---
+
+    def now(self):
+        """Current replay time (epoch seconds)."""
+        return self.start + (time.time() - self.wall0) * self.speed
+
+    def prices_at(self, ts, rows=None):
+        """Prices of `rows` (all coins when None) at replay time `ts`, interpolated between path points."""
+        paths = self.paths if rows is None else self.paths[rows]
+        position = (ts - self.origin) / REPLAY_STEP
+        i = math.floor(position)
+        frac = position - i
+        points = paths.shape[1]
+        return paths[:, i % points] * (1 - frac) + paths[:, (i + 1) % points] * frac
+
+    def window(self, row, end, seconds, step):
+        """[(ts, price), ...] for one coin over the `seconds` before `end`, every `step` seconds."""
+        points = self.paths.shape[1]
+        stamps = np.arange(end - seconds, end, step, dtype=np.int64)
+        stamps = stamps - (stamps - self.origin) % REPLAY_STEP
+        prices = self.paths[row, ((stamps - self.origin) // REPLAY_STEP) % points]
+        return list(zip(stamps.tolist(), prices.tolist())) + [(int(end), float(self.prices_at(end, [row])[0]))]
+
+    def price_of(self, coin_id, ts):
+        if coin_id in STABLECOINS:
+            return 1.0
+        return float(self.prices_at(ts, [self.index[coin_id]])[0])
+
+    # --- PAYLOADS ---
+
+    def markets(self, params):
+        """/coins/markets list (CoinGecko field names), market-cap ordered and paged."""
+        ts = self.now()
+        price = self.prices_at(ts)
+        day_ago = self.prices_at(ts - 86400)
+        hour_ago = self.prices_at(ts - 3600)
+        week_ago = self.prices_at(ts - 7 * 86400)
+        cap = price * self.supply
+        ids = params.get("ids", [""])[0]
+        if ids:
+            rows = [self.index[c] for c in ids.split(",") if c in self.index]
+        else:
+            per_page = min(int(params.get("per_page", ["100"])[0]), MAX_PER_PAGE)
+            page = max(int(params.get("page", ["1"])[0]), 1)
+            rows = np.argsort(-cap)[(page - 1) * per_page:page * per_page].tolist()
+        rank = np.empty(len(cap), dtype=np.int64)
+        rank[np.argsort(-cap)] = np.arange(1, len(cap) + 1)
+        wanted = params.get("price_change_percentage", [""])[0].split(",")
+        rows = sorted(rows, key=lambda r: -cap[r])
+        day_points = ((np.arange(int(ts - 86400), int(ts), REPLAY_STEP) - self.origin) // REPLAY_STEP) % self.paths.shape[1]
+        high = self.paths[np.ix_(rows, day_points)].max(axis=1, initial=0) if rows else []
+        low = self.paths[np.ix_(rows, day_points)].min(axis=1, initial=np.inf) if rows else []
+        coins = []
+        for j, i in enumerate(rows):
+            coin = {
+                "id": self.ids[i],
+                "symbol": self.symbols[i],
+                "name": self.names[i],
+                "image": f"https://assets.coingecko.com/coins/images/{i + 1}/large/{self.ids[i]}.png",
+                "current_price": round(float(price[i]), 8),
+                "market_cap": round(float(cap[i])),
+                "market_cap_rank": int(rank[i]),
+                "total_volume": round(float(cap[i]) * 0.04),
+                "high_24h": round(float(max(high[j], price[i])), 8),
+                "low_24h": round(float(min(low[j], price[i])), 8),
+                "price_change_24h": round(float(price[i] - day_ago[i]), 8),
+                "price_change_percentage_24h": round(float(price[i] / day_ago[i] - 1) * 100, 5),
+                "circulating_supply": float(self.supply[i]),
+                "last_updated": _iso(ts),
+            }
+            for label, before in (("1h", hour_ago), ("24h", day_ago), ("7d", week_ago)):
+                if label in wanted:
+                    coin[f"price_change_percentage_{label}_in_currency"] = round(float(price[i] / before[i] - 1) * 100, 5)
+            coins.append(coin)
+        return coins
+
+    def market_chart(self, coin_id, params):
+        """/coins/{id}/market_chart with CoinGecko's automatic granularity (or ?interval=)."""
+        row = self.index[coin_id]
+        days = params.get("days", ["1"])[0]
+        seconds = int(self.paths.shape[1] * REPLAY_STEP if days == "max" else float(days) * 86400)
+        interval = params.get("interval", [""])[0]
+        if interval == "daily" or (not interval and seconds > 90 * 86400):
+            step = 86400
+        elif interval == "hourly" or seconds > 86400:
+            step = 3600
+        else:
+            step = REPLAY_STEP
+        points = self.window(row, self.now(), seconds, step)
+        supply = float(self.supply[row])
+        return {
+            "prices": [[ts * 1000, p] for ts, p in points],
+            "market_caps": [[ts * 1000, p * supply] for ts, p in points],
+            "total_volumes": [[ts * 1000, p * supply * 0.04] for ts, p in points],
+        }
+
+    def token(self, address):
+        """1inch token address -> (coin id, decimals)."""
+        address = address.lower()
+        if address in TOKENS:
+            return TOKENS[address]
+        return self.ids[int(hashlib.sha1(address.encode()).hexdigest(), 16) % len(self.ids)], 18
+
+    def quote(self, params):
+        """1inch /quote: `amount` src units -> dstAmount, priced off the replayed market minus SWAP_FEE."""
+        src, src_decimals = self.token(params["src"][0])
+        dst, dst_decimals = self.token(params["dst"][0])
+        ts = self.now()
+        value = int(params["amount"][0]) / 10 ** src_decimals * self.price_of(src, ts)
+        out = value / self.price_of(dst, ts) * (1 - SWAP_FEE)
+        return {"dstAmount": str(int(out * 10 ** dst_decimals))}
+
+    def swap(self, params):
+        """1inch /swap: the quote plus a router transaction (placeholder calldata, stable for the same request)."""
+        quote = self.quote(params)
+        src = params["src"][0].lower()
+        digest = hashlib.sha1(json.dumps(sorted(params.items())).encode()).hexdigest()
+        quote["tx"] = {
+            "from": params["from"][0],
+            "to": ROUTER_ADDRESS,
+            "data": "0x07ed2379" + digest * 8,
+            "value": params["amount"][0] if src == "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee" else "0",
+            "gas": 250000,
+            "gasPrice": GAS_PRICE,
+        }
+        return quote
+
+    def approve_transaction(self, params):
+        """1inch /approve/transaction: ERC-20 approve(router, amount) calldata (unlimited without ?amount=)."""
+        amount = int(params.get("amount", [str(2 ** 256 - 1)])[0])
+        return {
+            "data": "0x095ea7b3" + ROUTER_ADDRESS[2:].rjust(64, "0") + format(amount, "064x"),
+            "gasPrice": GAS_PRICE,
+            "to": params["tokenAddress"][0],
+            "value": "0",
+        }
+
+
+class Faults:
+    """Injected latency and 429s. Draws come from one seeded RNG, so a run's fault sequence repeats."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, seed=REPLAY_SEED):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def draw(self):
+        """(delay seconds, reject with 429?) for the next request."""
+        with self.lock:
+            delay = max(self.latency + self.rng.uniform(-self.jitter, self.jitter), 0.0)
+            return delay, self.rng.random() < self.error_rate
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    market = None
+    faults = None
+    stats = None
+    stats_lock = threading.Lock()
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        if status == 429:
+            self.send_header("Retry-After", "1")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _count(self, endpoint, status):
+        with self.stats_lock:
+            key = f"{endpoint} {status}"
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        if url.path == "/stats":
+            with self.stats_lock:
+                self._send_json(dict(self.stats, replay_time=_iso(self.market.now())))
+            return
+        chart = _CHART_PATH.match(url.path)
+        one_inch = _ONE_INCH_PATH.match(url.path)
+        if url.path == "/api/v3/coins/markets":
+            endpoint, build = "/coins/markets", lambda: self.market.markets(params)
+        elif chart and chart.group(1) in self.market.index:
+            endpoint, build = "/coins/{id}/market_chart", lambda: self.market.market_chart(chart.group(1), params)
+        elif one_inch:
+            endpoint = one_inch.group(2)
+            build = {
+                "/quote": lambda: self.market.quote(params),
+                "/swap": lambda: self.market.swap(params),
+                "/approve/transaction": lambda: self.market.approve_transaction(params),
+                "/approve/allowance": lambda: {"allowance": "0"},
+            }[endpoint]
+        else:
+            self._count("other", 404)
+            self._send_json({"error": "not found"}, 404)
+            return
+
+        delay, reject = self.faults.draw()
+        if delay:
+            time.sleep(delay)
+        REPLAY_REQUESTS.inc(endpoint=endpoint)
+        if reject:
+            REPLAY_REJECTED.inc(endpoint=endpoint)
+            self._count(endpoint, 429)
+            self._send_json({"status": {"error_code": 429, "error_message": "You've exceeded the Rate Limit."}}, 429)
+            return
+        try:
+            payload = build()
+        except (KeyError, ValueError) as e:
+            self._count(endpoint, 400)
+            self._send_json({"error": f"bad request: {e}"}, 400)
+            return
+        self._count(endpoint, 200)
+        self._send_json(payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default backlog of 5 drops SYNs under load and shows up as 1 s client retransmits
+    request_queue_size = 1024
+
+
+def start_server(market, faults=None, port=REPLAY_PORT, host="127.0.0.1"):
+    """Serves `market` from a daemon thread; returns the server (its port is server_address[1])."""
+    handler = type("ReplayHandler", (_ReplayHandler,), {
+        "market": market, "faults": faults or Faults(), "stats": {},
+    })
+    server = _ReplayServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, name="replay-server", daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic CoinGecko/1inch replay server.")
+    parser.add_argument("--port", type=int, default=REPLAY_PORT)
+    parser.add_argument("--coins", type=int, default=REPLAY_COINS, help="Synthetic universe size")
+    parser.add_argument("--seed", type=int, default=REPLAY_SEED)
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay seconds per wall-clock second")
+    parser.add_argument("--start", help="Replay start (ISO date, UTC); default now, or the recording's start with --from-db")
+    parser.add_argument("--from-db", help="Replay the ticks recorded in this crypto_bot.db instead")
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests answered with 429")
+    parser.add_argument("--metrics-port", type=int, default=9113)
+    args = parser.parse_args()
+    start = datetime.fromisoformat(args.start).replace(tzinfo=timezone.utc).timestamp() if args.start else None
+    market = ReplayMarket(args.coins, args.seed, args.speed, start, args.from_db)
+    server = start_server(market, Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.seed), args.port)
+    metrics.start_metrics_server(args.metrics_port)
+    print(f"Replaying {len(market.ids)} coins at {args.speed:g}x on http://127.0.0.1:{server.server_address[1]} "
+          f"(latency {args.latency_ms:g}±{args.jitter_ms:g} ms, 429 rate {args.error_rate:g})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import metrics
+
+# Configuration
+BOT_DB = "crypto_bot.db"
+RISK_PATHS = 100_000          # Monte Carlo paths per run
+RISK_STEPS = 60               # Steps per path (liquidation is checked at every step)
+RISK_HORIZON_MINUTES = 60     # Simulated horizon
+RETURN_LOOKBACK = 1440        # Newest ticks per coin used to estimate returns (~1 day)
+MIN_RETURN_SAMPLES = 30       # Fewer common samples -> coins are simulated as uncorrelated
+RISK_CHUNK = 25_000           # Paths per process-pool task
+RISK_WORKERS = int(os.getenv("RISK_WORKERS", min(4, os.cpu_count() or 1)))
+MAINTENANCE_MARGIN = 0.005    # Isolated margin: liquidated once the loss reaches 1/leverage - this
+VAR_LEVELS = (0.95, 0.99)
+STRESS_SHOCKS = (-0.05, -0.10, -0.20, -0.30)
+
+RISK_LATENCY = metrics.REGISTRY.histogram(
+    "risk_simulation_seconds", "Monte Carlo VaR run time.",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+
+_pool = None
+
+
+def liquidation_price(entry, leverage):
+    """Mark price at which an isolated-margin long is liquidated (None at 1x: never)."""
+    if leverage <= 1:
+        return None
+    return entry * (1 - 1 / leverage + MAINTENANCE_MARGIN)
+
+
+def load_returns(symbols, db_name=None, lookback=RETURN_LOOKBACK):
+    """
+    Per-minute log-return covariance for `symbols` from the tick store.
+    Returns (covariance matrix, sample count, symbols with no history).
+    Ticks are aligned on minute buckets; returns across collector gaps are
+    scaled back to one minute.
+    """
+    conn = sqlite3.connect(db_name or BOT_DB)
+    series = {}
+    try:
+        for symbol in symbols:
+            rows = conn.execute('''
+                SELECT t.ts / 60, t.price FROM ticks t JOIN coins c ON c.coin_id = t.coin_id
+                WHERE c.symbol = ? ORDER BY t.ts DESC LIMIT ?
+            ''', (symbol.upper(), lookback)).fetchall()
+            if len(rows) > 1:
+                series[symbol] = dict(rows)
+    except sqlite3.OperationalError as e:
+        print(f"Risk: no tick history ({e})")
+    finally:
+        conn.close()
+    missing = [s for s in symbols if s not in series]
+    k = len(symbols)
+    cov = np.zeros((k, k))
+    if not series:
+        return cov, 0, missing
+
+    common = sorted(set.intersection(*(set(v) for v in series.values()))) if len(series) == len(symbols) else []
+    if len(common) > MIN_RETURN_SAMPLES:
+        minutes = np.array(common, dtype=np.float64)
+        logs = np.log(np.array([[series[s][m] for m in common] for s in symbols]))
+        gaps = np.diff(minutes)
+        # Divide each return by sqrt(gap) so every sample is a one-minute return
+        returns = np.diff(logs, axis=1) / np.sqrt(gaps)
+        return np.atleast_2d(np.cov(returns)), returns.shape[1], missing
+
+    # Too little overlap for a joint estimate: per-coin variance, zero correlation
+    samples = 0
+    for i, symbol in enumerate(symbols):
+        if symbol in series:
+            minutes = np.array(sorted(series[symbol]), dtype=np.float64)
+            logs = np.log(np.array([series[symbol][m] for m in minutes]))
+            returns = np.diff(logs) / np.sqrt(np.diff(minutes))
+            cov[i, i] = returns.var(ddof=1) if len(returns) > 1 else 0.0
+            samples = max(samples, len(returns))
+    return cov, samples, missing
+
+
+def _simulate_chunk(args):
+    """
+    One block of paths. Log prices follow a zero-drift correlated Gaussian
+    walk; a position is liquidated the first step its price touches its
+    liquidation level and then loses its whole equity.
+    Returns (per-position P&L [paths, positions] float32, liquidated flags).
+    """
+    seed, paths, steps, chol, marks, coin_idx, amounts, equity, liq_levels = args
+    rng = np.random.default_rng(seed)
+    k = chol.shape[0]
+    log_move = np.zeros((paths, k), dtype=np.float32)
+    low = np.zeros((paths, k), dtype=np.float32)
+    chol32 = chol.astype(np.float32).T
+    for _ in range(steps):
+        log_move += rng.standard_normal((paths, k), dtype=np.float32) @ chol32
+        np.minimum(low, log_move, out=low)
+    final_prices = marks[coin_idx] * np.exp(log_move[:, coin_idx])
+    # Liquidated if the path's lowest price reached the position's liquidation level
+    liquidated = marks[coin_idx] * np.exp(low[:, coin_idx]) <= liq_levels
+    pnl = (final_prices - marks[coin_idx]) * amounts
+    pnl = np.where(liquidated, -equity, pnl).astype(np.float32)
+    return pnl, liquidated
+
+
+def _get_pool(workers):
+    global _pool
+    if _pool is None:
+        import multiprocessing
+        # forkserver: safe to start from the dashboard's threaded server
+        _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("forkserver"))
+    return _pool
+
+
+def _var_cvar(pnl, level):
+    var = -np.quantile(pnl, 1 - level)
+    tail = pnl[pnl <= -var]
+    return float(var), float(-tail.mean()) if len(tail) else float(var)
+
+
+def simulate(positions, marks, cov, paths=RISK_PATHS, steps=RISK_STEPS, horizon_minutes=RISK_HORIZON_MINUTES,
+             workers=RISK_WORKERS, seed=None):
+    """
+    Monte Carlo P&L over the horizon for a long book.
+    :param positions: list of dicts with symbol, amount, avg_price, leverage.
+    :param marks: dict symbol -> current price.
+    :param cov: per-minute log-return covariance, in sorted(marks) order.
+    Returns portfolio VaR/CVaR per level plus per-position VaR and liquidation probability.
+    """
+    started = time.perf_counter()
+    symbols = sorted(marks)
+    coin_idx = np.array([symbols.index(p["symbol"]) for p in positions])
+    mark_arr = np.array([marks[s] for s in symbols], dtype=np.float32)
+    amounts = np.array([p["amount"] for p in positions], dtype=np.float32)
+    entries = np.array([p["avg_price"] for p in positions], dtype=np.float32)
+    leverage = np.array([max(p.get("leverage") or 1, 1) for p in positions], dtype=np.float32)
+    # Equity at risk per position: posted margin plus unrealized P&L (isolated margin never goes below 0)
+    equity = np.maximum(entries * amounts / leverage + (mark_arr[coin_idx] - entries) * amounts, 0)
+    liq_levels = np.array([liquidation_price(e, l) or 0.0 for e, l in zip(entries, leverage)], dtype=np.float32)
+
+    step_cov = np.asarray(cov, dtype=np.float64) * horizon_minutes / steps
+    try:
+        chol = np.linalg.cholesky(step_cov)
+    except np.linalg.LinAlgError:
+        # Flat or perfectly correlated series: factor through the eigen-decomposition instead
+        values, vectors = np.linalg.eigh(step_cov)
+        chol = vectors * np.sqrt(np.clip(values, 0, None))
+
+    seeds = np.random.SeedSequence(seed).spawn((paths + RISK_CHUNK - 1) // RISK_CHUNK)
+    sizes = [min(RISK_CHUNK, paths - i * RISK_CHUNK) for i in range(len(seeds))]
+    tasks = [(s, n, steps, chol, mark_arr, coin_idx, amounts, equity, liq_levels) for s, n in zip(seeds, sizes)]
+    if workers > 1 and len(tasks) > 1:
+        results = list(_get_pool(workers).map(_simulate_chunk, tasks))
+    else:
+        results = [_simulate_chunk(t) for t in tasks]
+    pnl = np.concatenate([r[0] for r in results])
+    liquidated = np.concatenate([r[1] for r in results])
+    book = pnl.sum(axis=1)
+
+    report = {"paths": paths, "horizon_minutes": horizon_minutes, "positions": []}
+    for level in VAR_LEVELS:
+        report[f"var_{int(level * 100)}"], report[f"cvar_{int(level * 100)}"] = _var_cvar(book, level)
+    report["p_any_liquidation"] = float(liquidated.any(axis=1).mean())
+    worst = max(VAR_LEVELS)
+    for i, p in enumerate(positions):
+        var, cvar = _var_cvar(pnl[:, i], worst)
+        report["positions"].append({
+            "id": p.get("id"), "symbol": p["symbol"], "leverage": float(leverage[i]),
+            "liquidation_price": float(liq_levels[i]) or None,
+            "p_liquidation": float(liquidated[:, i].mean()),
+            f"var_{int(worst * 100)}": var, f"cvar_{int(worst * 100)}": cvar,
+        })
+    report["seconds"] = time.perf_counter() - started
+    RISK_LATENCY.observe(report["seconds"])
+    return report
+
+
+def stress_test(positions, marks, shocks=STRESS_SHOCKS):
+    """Instant uniform price shocks: book P&L and positions liquidated per shock."""
+    rows = []
+    for shock in shocks:
+        pnl = 0.0
+        liquidated = 0
+        for p in positions:
+            mark = marks[p["symbol"]]
+            price = mark * (1 + shock)
+            lev = max(p.get("leverage") or 1, 1)
+            liq = liquidation_price(p["avg_price"], lev)
+            if liq is not None and price <= liq:
+                liquidated += 1
+                pnl -= max(p["avg_price"] * p["amount"] / lev + (mark - p["avg_price"]) * p["amount"], 0.0)
+            else:
+                pnl += (price - mark) * p["amount"]
+        rows.append({"shock": shock, "pnl": pnl, "liquidated": liquidated})
+    return rows
+
+
+def portfolio_risk(positions, marks, db_name=None, paths=RISK_PATHS, horizon_minutes=RISK_HORIZON_MINUTES, seed=None,
+                   cov=None, samples=0):
+    """
+    Runs simulate() and stress_test() for the book. `cov` (sorted(marks)
+    order, e.g. from correlation.RollingCovariance) skips the tick-store
+    estimate.
+    """
+    symbols = sorted(marks)
+    if cov is None:
+        cov, samples, missing = load_returns(symbols, db_name)
+    else:
+        missing = []
+    report = simulate(positions, marks, cov, paths, horizon_minutes=horizon_minutes, seed=seed)
+    report["return_samples"] = samples
+    report["no_history"] = missing
+    report["stress"] = stress_test(positions, marks)
+    return report
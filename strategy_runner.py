@@ -0,0 +1,175 @@
+import argparse
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+import metrics
+import ai_brain
+import database_manager
+
+# Configuration
+CYCLE_SECONDS = 10          # Seconds between watchlist evaluations
+RUNNER_WORKERS = 8          # Evaluation threads (Gemini calls are network-bound)
+RUNNER_ACCOUNT = os.getenv("RUNNER_ACCOUNT", "strategy-runner")
+WATCHLIST = [s for s in os.getenv("STRATEGY_WATCHLIST", "").upper().split(",") if s]  # Empty = every collected coin
+MIN_CONFIDENCE = 70         # Signals below this confidence are ignored
+POSITION_FRACTION = 0.02    # Share of the balance a 100%-confidence BUY spends
+MAX_COIN_FRACTION = 0.10    # Open cost basis cap per coin, as a share of the starting balance
+MIN_NOTIONAL = 5.0          # Smaller orders are skipped
+
+CYCLE_LATENCY = metrics.REGISTRY.histogram(
+    "strategy_cycle_seconds", "Strategy runner time per cycle and phase.",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0))
+SIGNALS = metrics.REGISTRY.counter("strategy_signals_total", "Watchlist signals evaluated, by action.")
+ORDERS_SUBMITTED = metrics.REGISTRY.counter("strategy_orders_total", "Paper trades submitted by the runner.")
+CYCLE_OVERRUNS = metrics.REGISTRY.counter("strategy_cycle_overruns_total", "Cycles that took longer than the cadence.")
+
+
+def load_watchlist(db_name=None):
+    """Every symbol the collector stores, in coin_id order."""
+    conn = sqlite3.connect(db_name or ai_brain.BOT_DB)
+    try:
+        return [row[0] for row in conn.execute("SELECT symbol FROM coins ORDER BY coin_id")]
+    finally:
+        conn.close()
+
+
+def evaluate(symbol, use_gemini=False):
+    """
+    Local indicator signal for one coin (last hour of ticks). With use_gemini,
+    actionable local signals are confirmed by get_trading_signal.
+    Returns a signal dict with the latest price, or None without history.
+    """
+    history = ai_brain.fetch_recent_history(symbol)
+    if not history:
+        return None
+    signal = ai_brain.local_technical_fallback(history, symbol)
+    if use_gemini and signal["action"] != "HOLD" and signal["confidence"] >= MIN_CONFIDENCE:
+        ai = ai_brain.get_trading_signal(symbol)
+        # Anything other than a parsed model or an error-free dict (e.g. None) keeps the local signal
+        if hasattr(ai, "model_dump"):
+            signal = ai.model_dump()
+        elif isinstance(ai, dict) and "error" not in ai:
+            signal = ai
+    return {"symbol": symbol, "price": history[-1]["price_usd"], "action": str(signal["action"]).upper(),
+            "confidence": int(signal["confidence"]), "reasoning": signal["reasoning"]}
+
+
+class StrategyRunner:
+    """
+    Evaluates the watchlist on a worker pool, sizes the actionable signals
+    against its paper account and books them as one batch per cycle.
+    """
+
+    def __init__(self, watchlist=None, workers=RUNNER_WORKERS, use_gemini=False, account=RUNNER_ACCOUNT):
+        database_manager.init_db()
+        self.watchlist = [s.upper() for s in watchlist] if watchlist else load_watchlist()
+        self.workers = max(1, workers)
+        self.use_gemini = use_gemini
+        self.account_id = database_manager.create_account(account, "strategy")
+        self.pool = ThreadPoolExecutor(self.workers, thread_name_prefix="strategy")
+        self.last_cycle = None
+
+    def evaluate_all(self):
+        # One task per worker, each over an interleaved slice, keeps pool overhead per coin negligible
+        chunks = [self.watchlist[i::self.workers] for i in range(self.workers)]
+        results = self.pool.map(self._evaluate_chunk, chunks)
+        return [signal for chunk in results for signal in chunk if signal is not None]
+
+    def _evaluate_chunk(self, chunk):
+        # One failing coin must not drop the rest of its chunk (or the whole cycle)
+        signals = []
+        for symbol in chunk:
+            try:
+                signals.append(evaluate(symbol, self.use_gemini))
+            except Exception as e:
+                print(f"Strategy runner: evaluating {symbol} failed: {e}")
+        return signals
+
+    def size_orders(self, signals):
+        """Turns signals into (coin, action, price, amount, reasoning) trades for this account."""
+        account = database_manager.get_account(self.account_id)
+        balance = account["balance"]
+        coin_cap = account["initial_balance"] * MAX_COIN_FRACTION
+        held = {row.coin: (row.open_amount, row.cost_basis)
+                for row in database_manager.get_position_summary("Paper", self.account_id).itertuples()}
+        trades = []
+        for s in signals:
+            SIGNALS.inc(action=s["action"])
+            if s["confidence"] < MIN_CONFIDENCE or s["price"] <= 0:
+                continue
+            open_amount, cost_basis = held.get(s["symbol"], (0.0, 0.0))
+            if s["action"] == "BUY":
+                notional = min(balance * POSITION_FRACTION * s["confidence"] / 100, coin_cap - cost_basis, balance)
+                if notional < MIN_NOTIONAL:
+                    continue
+                balance -= notional  # Later signals in the batch see the reduced buying power
+                trades.append((s["symbol"], "BUY", s["price"], notional / s["price"], f"Runner: {s['reasoning']}"))
+            elif s["action"] == "SELL" and open_amount > 0:
+                trades.append((s["symbol"], "SELL", s["price"], open_amount, f"Runner: {s['reasoning']}"))
+        return trades
+
+    def run_cycle(self):
+        """One evaluation + submission pass. Returns its timing and counts."""
+        started = time.perf_counter()
+        signals = self.evaluate_all()
+        evaluated = time.perf_counter()
+        trades = self.size_orders(signals)
+        if trades:
+            database_manager.log_trades(trades, "Paper", self.account_id)
+            for trade in trades:
+                ORDERS_SUBMITTED.inc(action=trade[1])
+        finished = time.perf_counter()
+        CYCLE_LATENCY.observe(evaluated - started, phase="evaluate")
+        CYCLE_LATENCY.observe(finished - evaluated, phase="submit")
+        CYCLE_LATENCY.observe(finished - started, phase="total")
+        self.last_cycle = {
+            "coins": len(self.watchlist),
+            "signals": len(signals),
+            "orders": len(trades),
+            "evaluate_ms": (evaluated - started) * 1e3,
+            "submit_ms": (finished - evaluated) * 1e3,
+            "total_ms": (finished - started) * 1e3,
+        }
+        return self.last_cycle
+
+    def run_forever(self, interval=CYCLE_SECONDS):
+        next_run = time.monotonic()
+        while True:
+            try:
+                c = self.run_cycle()
+                print(f"Cycle: {c['coins']} coins, {c['orders']} orders in {c['total_ms']:.0f} ms "
+                      f"(evaluate {c['evaluate_ms']:.0f} ms, submit {c['submit_ms']:.0f} ms)")
+            except Exception as e:
+                print(f"Strategy cycle error: {e}")
+            next_run += interval
+            delay = next_run - time.monotonic()
+            if delay < 0:
+                # Overran the cadence: start the next cycle now instead of queueing catch-ups
+                CYCLE_OVERRUNS.inc()
+                next_run = time.monotonic()
+                delay = 0
+            time.sleep(delay)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless paper-trading strategy runner.")
+    parser.add_argument("--watchlist", help="Comma-separated symbols (default: STRATEGY_WATCHLIST or every collected coin)")
+    parser.add_argument("--interval", type=float, default=CYCLE_SECONDS)
+    parser.add_argument("--workers", type=int, default=RUNNER_WORKERS)
+    parser.add_argument("--gemini", action="store_true", help="Confirm actionable local signals with Gemini")
+    parser.add_argument("--account", default=RUNNER_ACCOUNT)
+    parser.add_argument("--metrics-port", type=int, default=9112)
+    args = parser.parse_args()
+    metrics.start_metrics_server(args.metrics_port)
+    import data_collector
+    data_collector.init_db()  # Migrates a legacy price_history DB before the first read
+    watchlist = [s for s in args.watchlist.split(",") if s] if args.watchlist else WATCHLIST
+    runner = StrategyRunner(watchlist, args.workers, args.gemini, args.account)
+    print(f"Strategy runner: {len(runner.watchlist)} coins every {args.interval:g}s "
+          f"on account #{runner.account_id} ({args.account})")
+    runner.run_forever(args.interval)
+
+
+if __name__ == "__main__":
+    main()
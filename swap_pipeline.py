@@ -0,0 +1,205 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+import metrics
+from one_inch_wrapper import OneInchService
+
+# Configuration
+SWAP_TTL = 20            # Seconds a prefetched bundle stays signable
+SWAP_KEEP_WARM = 120     # The latest bundle per wallet and coin, if requested within this many seconds, is re-fetched before it expires
+SWAP_REFRESH_AHEAD = 5   # ...this many seconds before their TTL runs out
+SWAP_WORKERS = 8
+NATIVE_TOKEN = "0xeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeeee"
+# Live buys spend USDT, the same source token as the Trust Wallet 1inch link
+USDT_ADDRESS = "0xdac17f958d2ee523a2206206994597c13d831ec7"
+USDT_DECIMALS = 6
+
+PIPELINE_LATENCY = metrics.REGISTRY.histogram(
+    "swap_pipeline_seconds", "Time from request to a signable swap bundle, by result (hit, in_flight, miss, stale, moved).")
+PREFETCHES = metrics.REGISTRY.counter("swap_pipeline_prefetch_total", "Bundles fetched (four parallel 1inch calls each).")
+
+
+class SwapBundle:
+    """
+    The four 1inch calls behind one swap (quote, allowance, approval
+    calldata, swap calldata), started together. `mark_price` is the coin's
+    price when they were started, for the slippage check in fresh().
+    """
+
+    def __init__(self, key, mark_price, futures):
+        self.key = key
+        self.mark_price = mark_price
+        self.futures = futures
+        self.fetched_at = time.time()
+        self.requested_at = self.fetched_at
+
+    def done(self):
+        return all(f.done() for f in self.futures.values())
+
+    def failed(self):
+        return self.done() and any("error" in f.result() for f in self.futures.values())
+
+    def fresh(self, mark_price, slippage, now=None):
+        """Inside the TTL, not failed, and the mark has not moved further than the slippage allowance."""
+        if (now or time.time()) - self.fetched_at >= SWAP_TTL or self.failed():
+            return False
+        return not self.moved(mark_price, slippage)
+
+    def moved(self, mark_price, slippage):
+        if not mark_price or not self.mark_price:
+            return False
+        return abs(mark_price / self.mark_price - 1) * 100 > slippage
+
+    def result(self, timeout=None):
+        """Waits for the four calls and assembles the transactions to sign, in order."""
+        wait(self.futures.values(), timeout)
+        results = {name: f.result() if f.done() else {"error": "Timed out"} for name, f in self.futures.items()}
+        src, _, amount, _, _ = self.key
+        errors = {name: r.get("message", r["error"]) for name, r in results.items() if "error" in r}
+        approve_needed = src != NATIVE_TOKEN and int(results["allowance"].get("allowance", 0)) < amount
+        transactions = []
+        if not errors:
+            if approve_needed:
+                transactions.append(results["approve"])
+            transactions.append(results["swap"]["tx"])
+        return {
+            "dst_amount": results["quote"].get("dstAmount"),
+            "approve_needed": approve_needed,
+            "transactions": transactions,
+            "errors": errors,
+            "age": time.time() - self.fetched_at,
+        }
+
+
+class SwapPipeline:
+    """
+    Prefetches everything a Live swap needs so the click only reads a cache:
+    prefetch() starts the quote, allowance, approval and swap calls in
+    parallel, get() returns the bundle if it is still fresh, and a
+    background thread re-fetches the latest bundle asked for per wallet and
+    coin before its TTL runs out (amounts the user has since changed are
+    left to expire). A bundle is dropped once the mark price moves further
+    than the swap's slippage setting.
+    """
+
+    def __init__(self, chain_id=1, service=None):
+        self.service = service or OneInchService(chain_id)
+        self.pool = ThreadPoolExecutor(SWAP_WORKERS, thread_name_prefix="swap-prefetch")
+        self.bundles = {}
+        # (wallet, dst) -> (latest key, last mark price, mark source) for the refresher
+        self.latest = {}
+        self.lock = threading.Lock()
+        self.refresher = None
+
+    @staticmethod
+    def _key(src, dst, amount, wallet, slippage):
+        return (src.lower(), dst.lower(), int(amount), wallet.lower(), slippage)
+
+    def _fetch(self, key, mark_price):
+        src, dst, amount, wallet, slippage = key
+        service = self.service
+        futures = {
+            "quote": self.pool.submit(service.get_quote, src, dst, amount),
+            "allowance": self.pool.submit(service.get_allowance, src, wallet) if src != NATIVE_TOKEN
+                         else self.pool.submit(dict, allowance=str(amount)),
+            "approve": self.pool.submit(service.get_approve_transaction, src, amount) if src != NATIVE_TOKEN
+                       else self.pool.submit(dict),
+            # disableEstimate: 1inch would otherwise refuse to build the swap before the approval is mined
+            "swap": self.pool.submit(service.get_swap_transaction, src, dst, amount, wallet, slippage, True),
+        }
+        PREFETCHES.inc()
+        return SwapBundle(key, mark_price, futures)
+
+    def _touch(self, key, mark_price, mark_source=None):
+        src, dst, amount, wallet, slippage = key
+        previous = self.latest.get((wallet, dst))
+        if mark_source is None and previous is not None and previous[0] == key:
+            mark_source = previous[2]
+        self.latest[(wallet, dst)] = (key, mark_price, mark_source)
+        self.bundles[key].requested_at = time.time()
+
+    def prefetch(self, src, dst, amount, wallet, slippage=1, mark_price=None, mark_source=None):
+        """
+        Starts the bundle for this swap unless a fresh one exists. Returns it
+        without waiting. `mark_source` (no arguments, returns the coin's current
+        price) gives background re-fetches a current mark.
+        """
+        key = self._key(src, dst, amount, wallet, slippage)
+        with self.lock:
+            bundle = self.bundles.get(key)
+            if bundle is None or not bundle.fresh(mark_price, slippage):
+                bundle = self.bundles[key] = self._fetch(key, mark_price)
+            self._touch(key, mark_price, mark_source)
+            self._start_refresher()
+        return bundle
+
+    def get(self, src, dst, amount, wallet, slippage=1, mark_price=None, timeout=15):
+        """Signable transactions for this swap: a cache hit after prefetch(), else all four calls at once."""
+        started = time.perf_counter()
+        key = self._key(src, dst, amount, wallet, slippage)
+        with self.lock:
+            bundle = self.bundles.get(key)
+            if bundle is None:
+                outcome = "miss"
+            elif bundle.moved(mark_price, slippage):
+                outcome = "moved"
+            elif not bundle.fresh(mark_price, slippage):
+                outcome = "stale"
+            else:
+                outcome = "hit" if bundle.done() else "in_flight"
+            if outcome in ("miss", "moved", "stale"):
+                bundle = self.bundles[key] = self._fetch(key, mark_price)
+            self._touch(key, mark_price)
+        result = bundle.result(timeout)
+        result["cache"] = outcome
+        result["seconds"] = time.perf_counter() - started
+        PIPELINE_LATENCY.observe(result["seconds"], result=outcome)
+        return result
+
+    def _start_refresher(self):
+        if self.refresher is None:
+            self.refresher = threading.Thread(target=self._refresh_loop, name="swap-refresh", daemon=True)
+            self.refresher.start()
+
+    def _current_mark(self, latest):
+        key, mark_price, mark_source = latest
+        if mark_source is not None:
+            try:
+                return mark_source() or mark_price
+            except Exception as e:
+                print(f"Swap pipeline: mark price lookup failed: {e}")
+        return mark_price
+
+    def refresh_once(self, now=None):
+        """
+        One refresher pass: re-fetches the latest bundle per (wallet, dst)
+        shortly before it expires, at the current mark, and drops bundles
+        that were superseded and have expired or were not requested within
+        SWAP_KEEP_WARM. Returns the number of bundles re-fetched.
+        """
+        now = now or time.time()
+        refetched = 0
+        with self.lock:
+            for key, bundle in list(self.bundles.items()):
+                src, dst, amount, wallet, slippage = key
+                latest = self.latest.get((wallet, dst))
+                current = latest is not None and latest[0] == key
+                if now - bundle.requested_at > SWAP_KEEP_WARM:
+                    del self.bundles[key]
+                    if current:
+                        del self.latest[(wallet, dst)]
+                elif not current:
+                    # Superseded (the user changed amount or slippage): kept only while signable
+                    if now - bundle.fetched_at >= SWAP_TTL:
+                        del self.bundles[key]
+                elif now - bundle.fetched_at >= SWAP_TTL - SWAP_REFRESH_AHEAD and bundle.done():
+                    refreshed = self._fetch(key, self._current_mark(latest))
+                    refreshed.requested_at = bundle.requested_at
+                    self.bundles[key] = refreshed
+                    refetched += 1
+        return refetched
+
+    def _refresh_loop(self):
+        while True:
+            time.sleep(1)
+            self.refresh_once()
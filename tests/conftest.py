@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import database_manager
+import db_writer
+
+
+@pytest.fixture
+def trades_db(tmp_path, monkeypatch):
+    """A fresh trades.db in a temp dir, written directly (no writer service)."""
+    path = str(tmp_path / "trades.db")
+    monkeypatch.setattr(db_writer, "WRITER_ADDRESS", "")
+    monkeypatch.setattr(database_manager, "DB_NAME", path)
+    database_manager.init_db()
+    return path
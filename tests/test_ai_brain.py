@@ -0,0 +1,70 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import ai_brain
+import metrics
+
+
+class FakeClient:
+    def __init__(self, generate):
+        self.models = SimpleNamespace(generate_content=generate)
+
+
+def _history(symbol, limit=12):
+    return [{"price_usd": 100.0 + i, "timestamp": f"2026-01-01 00:{i:02d}:00"} for i in range(30)]
+
+
+def _counts():
+    requests = {o: metrics.LLM_REQUESTS.value(outcome=o) for o in ("ok", "quota", "error")}
+    signals = {s: metrics.LLM_SIGNALS.value(source=s) for s in ("gemini", "quota_fallback", "timeout_fallback", "error")}
+    return requests, signals
+
+
+def _delta(before, after):
+    return {k: after[k] - before[k] for k in after if after[k] != before[k]}
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    monkeypatch.setattr(ai_brain, "fetch_recent_history", _history)
+
+    def use(generate):
+        monkeypatch.setattr(ai_brain, "_get_client", lambda api_key: FakeClient(generate))
+    return use
+
+
+def test_abandoned_call_is_counted_once(gemini):
+    release = threading.Event()
+
+    def slow(**kwargs):
+        release.wait(5)
+        return SimpleNamespace(parsed={"action": "HOLD"}, usage_metadata=None)
+
+    gemini(slow)
+    requests, signals = _counts()
+    assert ai_brain.get_trading_signal("BTC", deadline=0.05)["reasoning"].startswith("(AI Offline)")
+    release.set()
+    # The abandoned call still finishes in the background and records its own outcome
+    for _ in range(100):
+        after_requests, after_signals = _counts()
+        if after_requests != requests:
+            break
+        time.sleep(0.05)
+    assert _delta(signals, after_signals) == {"timeout_fallback": 1}
+    assert _delta(requests, after_requests) == {"ok": 1}
+
+
+def test_quota_fallback_is_counted_once(gemini):
+    def exhausted(**kwargs):
+        raise RuntimeError("429 RESOURCE_EXHAUSTED")
+
+    gemini(exhausted)
+    requests, signals = _counts()
+    ai_brain.get_trading_signal("BTC")
+    after_requests, after_signals = _counts()
+    assert _delta(requests, after_requests) == {"quota": 1}
+    assert _delta(signals, after_signals) == {"quota_fallback": 1}
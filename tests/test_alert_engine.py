@@ -0,0 +1,45 @@
+import sqlite3
+
+import alert_engine
+import database_manager
+
+
+def test_failed_flush_keeps_firings_queued(trades_db, monkeypatch):
+    alert_id = database_manager.add_alert("BTC", "ABOVE", 100.0)
+    engine = alert_engine.AlertEngine(trades_db, price_db=":memory:")
+    assert engine.load() == 1
+
+    real_write = alert_engine.execute_write
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(alert_engine, "execute_write", locked)
+    assert engine.on_tick("BTC", 1_700_000_000, 101.0) == 1
+    assert engine.flush() == 0
+    assert len(engine.pending) == 1
+
+    monkeypatch.setattr(alert_engine, "execute_write", real_write)
+    assert engine.flush() == 1
+    assert engine.pending == []
+    events = database_manager.get_alert_events()
+    assert [e["alert_id"] for e in events] == [alert_id]
+    conn = sqlite3.connect(trades_db)
+    assert conn.execute("SELECT status FROM alerts WHERE id = ?", (alert_id,)).fetchone()[0] == "TRIGGERED"
+    conn.close()
+
+
+def test_suppressed_crossings_do_not_extend_the_cooldown(trades_db):
+    database_manager.add_alert("BTC", "ABOVE", 100.0, repeating=True)
+    engine = alert_engine.AlertEngine(trades_db, price_db=":memory:")
+    engine.load()
+    start, step = 1_700_000_000, alert_engine.ALERT_COOLDOWN // 3
+    fired = []
+    # Re-crosses every third of the cooldown: fires at the start, then once the cooldown has passed
+    for i in range(7):
+        ts = start + i * step
+        engine.on_tick("BTC", ts - 1, 99.0)
+        if engine.on_tick("BTC", ts, 101.0):
+            fired.append(ts)
+        engine.pending.clear()
+    assert fired == [start, start + 3 * step, start + 6 * step]
@@ -0,0 +1,120 @@
+import sqlite3
+import threading
+
+import pytest
+
+import compaction
+import data_collector
+import db_writer
+
+HOUR = 3600
+NOW = 1_700_000_000 // HOUR * HOUR
+
+
+@pytest.fixture
+def prices_db(tmp_path, monkeypatch):
+    path = str(tmp_path / "crypto_bot.db")
+    monkeypatch.setattr(db_writer, "WRITER_ADDRESS", "")
+    monkeypatch.setattr(data_collector, "DB_NAME", path)
+    data_collector.init_db()
+    return path
+
+
+def _ticks(symbol, start, end, step=60):
+    return [(ts, symbol, 100.0 + (ts - start) / 60, 1.0, 0.0) for ts in range(start, end, step)]
+
+
+def _bars(path, table, symbol):
+    conn = sqlite3.connect(path)
+    rows = conn.execute(f"SELECT b.ts FROM {table} b JOIN coins c ON c.coin_id = b.coin_id WHERE c.symbol = ?",
+                        (symbol,)).fetchall()
+    conn.close()
+    return [ts for (ts,) in rows]
+
+
+def test_backfilled_coin_is_rolled_up_before_its_ticks_expire(prices_db):
+    data_collector.write_ticks(_ticks("BTC", NOW - 2 * HOUR, NOW))
+    compaction.compact_once(prices_db, NOW)
+    assert len(_bars(prices_db, "bars_1m", "BTC")) == 120
+
+    # A coin added later gets 24h of history, all of it below both watermarks
+    data_collector.write_ticks(_ticks("ETH", NOW - 24 * HOUR, NOW))
+    compaction.compact_once(prices_db, NOW)
+    assert len(_bars(prices_db, "bars_1m", "ETH")) == 24 * 60
+    assert len(_bars(prices_db, "bars_1h", "ETH")) == 24
+
+    # Once raw retention passes, the ticks go but the bars stay
+    summary = compaction.compact_once(prices_db, NOW + compaction.RETENTION["ticks"] + HOUR)
+    assert summary["purged_ticks"] == 26 * 60
+    assert len(_bars(prices_db, "bars_1m", "ETH")) == 24 * 60
+
+
+def test_purge_keeps_ticks_of_buckets_not_yet_rerolled(prices_db):
+    data_collector.write_ticks(_ticks("BTC", NOW - HOUR, NOW))
+    compaction.compact_once(prices_db, NOW)
+    data_collector.write_ticks(_ticks("ETH", NOW - HOUR, NOW))
+
+    conn = sqlite3.connect(prices_db)
+    cursor = conn.cursor()
+    assert compaction.apply_purge(cursor, "ticks", NOW, job="ticks_to_1m") == 60
+    conn.commit()
+    conn.close()
+    assert len(_bars(prices_db, "bars_1m", "ETH")) == 0
+    compaction.compact_once(prices_db, NOW)
+    assert len(_bars(prices_db, "bars_1m", "ETH")) == 60
+
+
+def _free_pages_without_incremental_vacuum(path):
+    conn = sqlite3.connect(path, isolation_level=None)
+    conn.execute("PRAGMA auto_vacuum = NONE")
+    conn.execute("VACUUM")
+    conn.execute("CREATE TABLE filler (blob BLOB)")
+    conn.executemany("INSERT INTO filler VALUES (?)", [(b"x" * 4000,) for _ in range(200)])
+    conn.execute("DROP TABLE filler")
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 0
+    assert conn.execute("PRAGMA freelist_count").fetchone()[0] > 0
+    conn.close()
+
+
+def test_compaction_finishes_without_incremental_auto_vacuum(prices_db):
+    _free_pages_without_incremental_vacuum(prices_db)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (compaction.compact_once(prices_db, NOW), done.set()), daemon=True)
+    thread.start()
+    assert done.wait(5)
+
+
+class _LockedVacuum:
+    """Connection whose VACUUM fails as it does while another process holds the file."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self.conn, name)
+
+    def execute(self, sql, *args):
+        if sql == "VACUUM":
+            raise sqlite3.OperationalError("database is locked")
+        return self.conn.execute(sql, *args)
+
+
+def test_init_db_retries_the_auto_vacuum_conversion(prices_db, monkeypatch):
+    _free_pages_without_incremental_vacuum(prices_db)
+    conn = sqlite3.connect(prices_db)
+    conn.execute("PRAGMA user_version = 3")
+    conn.close()
+
+    connect = sqlite3.connect
+    monkeypatch.setattr(sqlite3, "connect", lambda *args, **kwargs: _LockedVacuum(connect(*args, **kwargs)))
+    data_collector.init_db()
+    monkeypatch.setattr(sqlite3, "connect", connect)
+    conn = sqlite3.connect(prices_db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] < data_collector.SCHEMA_VERSION
+    conn.close()
+
+    data_collector.init_db()
+    conn = sqlite3.connect(prices_db)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == data_collector.SCHEMA_VERSION
+    assert conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    conn.close()
@@ -0,0 +1,34 @@
+import sqlite3
+
+import numpy as np
+
+import correlation
+
+
+def _tick_store(path, series):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE coins (coin_id INTEGER PRIMARY KEY, symbol TEXT)")
+    conn.execute("CREATE TABLE ticks (coin_id INTEGER, ts INTEGER, price REAL, PRIMARY KEY (coin_id, ts))")
+    for coin_id, (symbol, rows) in enumerate(series.items(), 1):
+        conn.execute("INSERT INTO coins VALUES (?, ?)", (coin_id, symbol))
+        conn.executemany("INSERT INTO ticks VALUES (?, ?, ?)", [(coin_id, ts, price) for ts, price in rows])
+    conn.commit()
+    conn.close()
+
+
+def test_seed_aligns_backfill_with_offset_timestamps(tmp_path):
+    rng = np.random.default_rng(3)
+    market = rng.normal(0, 0.002, 400)
+    start = 1_700_000_000
+    series = {}
+    # Same minutes, different seconds per coin (what market_chart backfill returns)
+    for symbol, offset in (("AAA", 5), ("BBB", 37)):
+        logs = np.cumsum(market + rng.normal(0, 0.0003, len(market)))
+        series[symbol] = [(start + 60 * i + offset, 100 * float(np.exp(x))) for i, x in enumerate(logs)]
+    db = str(tmp_path / "crypto_bot.db")
+    _tick_store(db, series)
+
+    symbols, corr, vol = correlation.load_engine(db).correlation(["AAA", "BBB"])
+    assert corr[0, 1] > 0.95
+    # Per-minute variance, not diluted by half-empty batches
+    assert 0.0015 < vol[0] < 0.0025
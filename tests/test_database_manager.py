@@ -0,0 +1,59 @@
+import sqlite3
+import threading
+
+import pytest
+
+import database_manager
+
+
+@pytest.mark.parametrize("table, write", [
+    ("orders", lambda i: database_manager.place_order("Bitcoin", "BTC", "BUY", "LIMIT", 100.0 + i, 1.0)),
+    ("alerts", lambda i: database_manager.add_alert("BTC", "ABOVE", 100.0 + i)),
+])
+def test_concurrent_direct_writes_get_distinct_revs(trades_db, table, write):
+    errors = []
+
+    def place(n):
+        for i in range(n):
+            try:
+                write(i)
+            except sqlite3.Error as e:
+                errors.append(e)
+
+    threads = [threading.Thread(target=place, args=(40,)) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    conn = sqlite3.connect(trades_db)
+    revs = [rev for rev, in conn.execute(f"SELECT rev FROM {table} ORDER BY id")]
+    conn.close()
+    assert errors == []
+    assert len(revs) == 160
+    # Revs follow commit order, so an engine syncing on rev > N never skips a row
+    assert revs == sorted(set(revs))
+
+
+def test_oversized_sell_credits_only_the_matched_amount(trades_db):
+    database_manager.update_wallet_balance(1000.0)
+    database_manager.log_trade("bitcoin", "BUY", 150.0, 2.0)
+    assert database_manager.get_wallet_balance() == pytest.approx(700.0)
+
+    database_manager.log_trade("bitcoin", "SELL", 150.0, 5.0)
+    assert database_manager.get_wallet_balance() == pytest.approx(1000.0)
+    summary = database_manager.get_position_summary()
+    assert summary["open_amount"].tolist() == [0.0]
+    assert summary["sold"].tolist() == [2.0]
+
+
+def test_average_cost_nets_across_leverages(trades_db, monkeypatch):
+    monkeypatch.setattr(database_manager, "LOT_METHOD", "AVERAGE")
+    database_manager.log_trade("bitcoin", "BUY", 100.0, 1.0, leverage=1)
+    database_manager.log_trade("bitcoin", "BUY", 200.0, 1.0, leverage=5)
+    lots = database_manager.get_open_positions()
+    assert len(lots) == 1
+    assert lots["avg_price"].iloc[0] == pytest.approx(150.0)
+
+    database_manager.log_trade("bitcoin", "SELL", 150.0, 1.0)
+    assert database_manager.get_portfolio_summary()["realized_pnl"] == pytest.approx(0.0)
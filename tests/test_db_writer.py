@@ -0,0 +1,120 @@
+import os
+import sqlite3
+
+import pytest
+
+import db_writer
+
+
+class _Reply:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, message):
+        self.sent.append(message)
+
+
+def _service(db):
+    service = db_writer.WriterService("127.0.0.1:0")
+    # No busy wait, so the locked case fails immediately
+    conn = sqlite3.connect(db, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA busy_timeout = 0")
+    service.connections[db] = conn
+    service.procedures["insert"] = lambda cursor, x: cursor.execute("INSERT INTO t VALUES (?)", (x,))
+    return service
+
+
+def test_locked_group_commit_rejects_callers_and_recovers(tmp_path):
+    db = str(tmp_path / "w.db")
+    setup = sqlite3.connect(db)
+    setup.execute("CREATE TABLE t (x INTEGER)")
+    setup.commit()
+    service = _service(db)
+
+    blocker = sqlite3.connect(db, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    caller = _Reply()
+    service._commit_batch([(caller, ("call", db, "log_trade", (), {})),
+                           (caller, ("cast", db, "insert", (1,), {}))])
+    assert len(caller.sent) == 1
+    ok, error = caller.sent[0]
+    assert not ok and "locked" in error[2]
+    blocker.execute("ROLLBACK")
+
+    service._commit_batch([(caller, ("cast", db, "insert", (2,), {})),
+                           (caller, ("flush",))])
+    assert caller.sent[-1] == (True, None)
+    assert setup.execute("SELECT x FROM t").fetchall() == [(2,)]
+
+
+def test_lost_reply_is_not_written_again(tmp_path, monkeypatch):
+    class _Dead:
+        def call(self, *args):
+            raise db_writer.WriterConnectionLost("DB writer: no reply")
+
+    monkeypatch.setattr(db_writer, "get_writer", lambda: _Dead())
+    applied = []
+    with pytest.raises(db_writer.WriterConnectionLost):
+        db_writer.execute_write(str(tmp_path / "w.db"), "log_trade", lambda cursor: applied.append(1))
+    assert applied == []
+
+
+def test_undelivered_command_falls_back_to_direct_write(tmp_path, monkeypatch):
+    class _Closed:
+        def call(self, *args):
+            raise BrokenPipeError("closed")
+
+    monkeypatch.setattr(db_writer, "get_writer", lambda: _Closed())
+    assert db_writer.execute_write(str(tmp_path / "w.db"), "log_trade", lambda cursor: "direct") == "direct"
+
+
+def test_raw_sql_and_unknown_procedures_are_refused(tmp_path):
+    db = str(tmp_path / "w.db")
+    setup = sqlite3.connect(db)
+    setup.execute("CREATE TABLE t (x INTEGER)")
+    setup.commit()
+    service = _service(db)
+    caller = _Reply()
+    service._commit_batch([(caller, ("executemany", db, "DROP TABLE t", [()])),
+                           (caller, ("call", db, "drop_everything", (), {}))])
+    ok, error = caller.sent[0]
+    assert not ok and error[1] == "ValueError"
+    assert setup.execute("SELECT COUNT(*) FROM t").fetchone()[0] == 0
+
+
+def test_procedure_errors_keep_their_class(tmp_path):
+    db = str(tmp_path / "w.db")
+    service = _service(db)
+
+    def reject(cursor):
+        raise ValueError("insufficient balance")
+
+    service.procedures["reject"] = reject
+    caller = _Reply()
+    service._commit_batch([(caller, ("call", db, "reject", (), {}))])
+    ok, error = caller.sent[0]
+    assert not ok
+    rebuilt = db_writer._rebuild_error(error)
+    assert type(rebuilt) is ValueError and str(rebuilt) == "insufficient balance"
+
+
+def test_service_key_is_random_and_private(tmp_path, monkeypatch):
+    path = str(tmp_path / "writer.key")
+    monkeypatch.setattr(db_writer, "WRITER_AUTHKEY", "")
+    monkeypatch.setattr(db_writer, "WRITER_AUTHKEY_FILE", path)
+    first = db_writer.create_authkey()
+    assert db_writer.load_authkey() == first
+    assert os.stat(path).st_mode & 0o777 == 0o600
+    assert db_writer.create_authkey() != first
+    with pytest.raises(RuntimeError):
+        db_writer.WriterService("127.0.0.1:0").serve_forever()
+
+
+def test_direct_write_latency_is_recorded_at_commit(tmp_path):
+    db = str(tmp_path / "w.db")
+    before = sum(v for name, key, v in db_writer.metrics.DB_WRITE_LATENCY.samples()
+                 if name.endswith("_count") and ("op", "store_ticks") in key)
+    db_writer.execute_write(db, "store_ticks", lambda cursor: cursor.execute("CREATE TABLE t (x INTEGER)"))
+    after = sum(v for name, key, v in db_writer.metrics.DB_WRITE_LATENCY.samples()
+                if name.endswith("_count") and ("op", "store_ticks") in key)
+    assert after == before + 1
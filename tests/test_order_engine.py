@@ -0,0 +1,60 @@
+import sqlite3
+
+import database_manager
+import order_engine
+
+
+def _status(db, order_id):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT status FROM orders WHERE id = ?", (order_id,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_failed_flush_keeps_fills_queued(trades_db, monkeypatch):
+    order_id = database_manager.place_order("Bitcoin", "BTC", "BUY", "LIMIT", 100.0, 1.0)
+    engine = order_engine.OrderEngine(trades_db)
+    assert engine.load() == 1
+
+    real_write = order_engine.execute_write
+
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(order_engine, "execute_write", locked)
+    assert engine.on_tick("BTC", 99.0) == [(order_id, 99.0)]
+    assert engine.flush() == []
+    assert engine.pending == [(order_id, 99.0)]
+    assert _status(trades_db, order_id) == "OPEN"
+
+    # The order left the book, so another tick must not queue it twice
+    assert engine.on_tick("BTC", 98.0) == []
+
+    monkeypatch.setattr(order_engine, "execute_write", real_write)
+    assert engine.flush() == [order_id]
+    assert engine.pending == []
+    assert _status(trades_db, order_id) == "FILLED"
+
+
+def test_limit_orders_fill_at_the_better_price_on_a_gap(trades_db):
+    buy = database_manager.place_order("Bitcoin", "BTC", "BUY", "LIMIT", 100.0, 1.0)
+    sell = database_manager.place_order("Bitcoin", "BTC", "SELL", "LIMIT", 120.0, 1.0)
+    engine = order_engine.OrderEngine(trades_db)
+    engine.load()
+    # The price gaps from above 100 to 90, then from below 120 to 130
+    assert engine.on_tick("BTC", 90.0) == [(buy, 90.0)]
+    assert engine.on_tick("BTC", 130.0) == [(sell, 130.0)]
+    assert engine.flush() == [buy, sell]
+    assert database_manager.get_wallet_balance() == database_manager.PAPER_STARTING_BALANCE - 90.0 + 130.0
+
+
+def test_buy_fill_without_buying_power_is_cancelled(trades_db):
+    database_manager.update_wallet_balance(50.0)
+    order_id = database_manager.place_order("Bitcoin", "BTC", "BUY", "LIMIT", 100.0, 1.0)
+    engine = order_engine.OrderEngine(trades_db)
+    engine.load()
+    assert engine.on_tick("BTC", 99.0) == [(order_id, 99.0)]
+    assert engine.flush() == []
+    assert _status(trades_db, order_id) == "CANCELLED"
+    assert database_manager.get_wallet_balance() == 50.0
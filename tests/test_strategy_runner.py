@@ -0,0 +1,25 @@
+import ai_brain
+import strategy_runner
+
+LOCAL = {"action": "BUY", "confidence": 80, "reasoning": "local"}
+
+
+def _history(symbol, limit=12):
+    if symbol == "BAD":
+        raise ValueError("corrupt history")
+    return [{"price_usd": 100.0, "timestamp": "2026-01-01 00:00:00"}]
+
+
+def test_missing_gemini_answer_keeps_the_local_signal(monkeypatch):
+    monkeypatch.setattr(ai_brain, "fetch_recent_history", _history)
+    monkeypatch.setattr(ai_brain, "local_technical_fallback", lambda history, symbol: dict(LOCAL))
+    monkeypatch.setattr(ai_brain, "get_trading_signal", lambda symbol: None)
+    signal = strategy_runner.evaluate("BTC", use_gemini=True)
+    assert signal["action"] == "BUY" and signal["reasoning"] == "local"
+
+
+def test_failing_coin_does_not_drop_its_chunk(trades_db, monkeypatch):
+    monkeypatch.setattr(ai_brain, "fetch_recent_history", _history)
+    monkeypatch.setattr(ai_brain, "local_technical_fallback", lambda history, symbol: dict(LOCAL))
+    runner = strategy_runner.StrategyRunner(["BAD", "BTC", "ETH"], workers=1)
+    assert [s["symbol"] for s in runner.evaluate_all()] == ["BTC", "ETH"]
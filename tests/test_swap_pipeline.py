@@ -0,0 +1,53 @@
+import time
+
+import swap_pipeline
+
+WALLET = "0x00000000000000000000000000000000000a11ce"
+COIN = "0x2260fac5e5542a773aa44fbcfedf7c193bc2c599"
+
+
+class FakeService:
+    def __init__(self):
+        self.swaps = []
+
+    def get_quote(self, src, dst, amount):
+        return {"dstAmount": str(amount)}
+
+    def get_allowance(self, src, wallet):
+        return {"allowance": "0"}
+
+    def get_approve_transaction(self, src, amount):
+        return {"to": src}
+
+    def get_swap_transaction(self, src, dst, amount, wallet, slippage, disable_estimate=False):
+        self.swaps.append(amount)
+        return {"tx": {"to": dst}}
+
+
+def _expire(pipeline):
+    for bundle in pipeline.bundles.values():
+        bundle.result()
+        bundle.fetched_at -= swap_pipeline.SWAP_TTL
+
+
+def test_refresher_keeps_only_the_latest_amount_warm_at_the_current_mark():
+    service = FakeService()
+    pipeline = swap_pipeline.SwapPipeline(service=service)
+    pipeline._start_refresher = lambda: None
+    marks = [100.0]
+    src = swap_pipeline.USDT_ADDRESS
+    # The user edits the amount: three bundles, only the last one still wanted
+    for amount in (1_000, 1_500, 2_000):
+        pipeline.prefetch(src, COIN, amount, WALLET, 1, marks[0], mark_source=lambda: marks[0])
+    _expire(pipeline)
+    marks[0] = 103.0
+    service.swaps.clear()
+
+    assert pipeline.refresh_once(time.time()) == 1
+    (key, bundle), = pipeline.bundles.items()
+    bundle.result()
+    assert service.swaps == [2_000]
+    assert key[2] == 2_000
+    assert bundle.mark_price == 103.0
+    # The refreshed bundle checks slippage against the current mark, not the one from first prefetch
+    assert pipeline.get(src, COIN, 2_000, WALLET, 1, 103.5)["cache"] == "hit"
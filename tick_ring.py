@@ -0,0 +1,274 @@
+import os
+import secrets
+import sqlite3
+import time
+from multiprocessing import shared_memory, resource_tracker
+import numpy as np
+
+# Configuration
+TICK_RING_NAME = os.getenv("TICK_RING_NAME", "gravity_ticks")
+RING_CAPACITY = 1024   # Ticks kept per coin (~17h of 1-minute ticks)
+RING_MAX_COINS = 64
+READ_RETRIES = 100     # Seqlock retries before a reader gives up and falls back to SQLite
+
+_MAGIC = 0x47525654  # "GRVT"
+_LAYOUT = 1
+# Header slots (int64)
+_H_MAGIC, _H_LAYOUT, _H_CAPACITY, _H_MAX_COINS, _H_COINS, _H_GENERATION, _H_RETIRED, _H_TOKEN = range(8)
+_HEADER_SLOTS = 8
+_SYMBOL_DTYPE = "S16"
+
+
+def _layout(capacity, max_coins):
+    """Byte offsets of each array inside the segment."""
+    offsets = {}
+    pos = 0
+    for name, dtype, shape in (
+        ("header", np.int64, (_HEADER_SLOTS,)),
+        ("symbols", _SYMBOL_DTYPE, (max_coins,)),
+        ("seq", np.uint64, (max_coins,)),
+        ("head", np.int64, (max_coins,)),
+        # Every column is stored twice (slot i and i + capacity) so the newest
+        # window is always one contiguous slice, whatever the write position
+        ("ts", np.int64, (max_coins, 2 * capacity)),
+        ("price", np.float64, (max_coins, 2 * capacity)),
+        ("volume", np.float64, (max_coins, 2 * capacity)),
+    ):
+        size = int(np.dtype(dtype).itemsize * np.prod(shape))
+        offsets[name] = (dtype, shape, pos)
+        pos += (size + 63) // 64 * 64
+    return offsets, pos
+
+
+class TickRing:
+    """
+    Fixed-size per-coin ring of (epoch, price, volume) in shared memory.
+
+    The collector is the only writer. Each coin has a seqlock counter: the
+    writer makes it odd before touching the coin's slots and even again
+    afterwards, and readers retry until they see the same even value on both
+    sides of their read. SQLite stays the durable record; the ring only
+    serves "latest N" reads without a query.
+    """
+
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((_HEADER_SLOTS,), np.int64, shm.buf)
+        if header[_H_MAGIC] != _MAGIC or header[_H_LAYOUT] != _LAYOUT:
+            raise ValueError(f"Shared memory '{shm.name}' is not a tick ring")
+        self.capacity = int(header[_H_CAPACITY])
+        offsets, _ = _layout(self.capacity, int(header[_H_MAX_COINS]))
+        for name, (dtype, shape, pos) in offsets.items():
+            setattr(self, name, np.ndarray(shape, dtype, shm.buf, offset=pos))
+        self._index = {}
+        self._generation = None
+
+    @classmethod
+    def create(cls, name=TICK_RING_NAME, capacity=RING_CAPACITY, max_coins=RING_MAX_COINS):
+        """Creates (or re-initializes in place) the segment. Call from the collector only."""
+        offsets, size = _layout(capacity, max_coins)
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            generation = 0
+        except FileExistsError:
+            # Left over from a previous collector: reuse it when the layout matches
+            # so attached readers keep their mapping, otherwise retire and replace it
+            shm = shared_memory.SharedMemory(name=name)
+            header = np.ndarray((_HEADER_SLOTS,), np.int64, shm.buf)
+            if (shm.size >= size and header[_H_MAGIC] == _MAGIC and header[_H_LAYOUT] == _LAYOUT
+                    and header[_H_CAPACITY] == capacity and header[_H_MAX_COINS] == max_coins):
+                generation = int(header[_H_GENERATION]) + 1
+            else:
+                header[_H_RETIRED] = 1
+                del header
+                shm.close()
+                shm.unlink()
+                shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+                generation = 0
+        header = np.ndarray((_HEADER_SLOTS,), np.int64, shm.buf)
+        header[_H_COINS] = 0
+        for array_name, (dtype, shape, pos) in offsets.items():
+            if array_name != "header":
+                np.ndarray(shape, dtype, shm.buf, offset=pos).fill(0)
+        header[_H_MAGIC], header[_H_LAYOUT] = _MAGIC, _LAYOUT
+        header[_H_CAPACITY], header[_H_MAX_COINS] = capacity, max_coins
+        header[_H_RETIRED] = 0
+        if not generation:
+            # Identifies this segment; readers re-attach when the name points elsewhere
+            header[_H_TOKEN] = secrets.randbits(62)
+        header[_H_GENERATION] = generation  # Last: readers re-resolve symbols on change
+        del header
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=TICK_RING_NAME):
+        """Maps an existing segment read-only in spirit. Raises FileNotFoundError if absent."""
+        shm = shared_memory.SharedMemory(name=name)
+        # Python < 3.13 registers attached segments for cleanup at exit, which would
+        # unlink the collector's ring when a reader process stops
+        try:
+            resource_tracker.unregister(shm._name, "shared_memory")
+        except Exception:
+            pass
+        try:
+            return cls(shm, owner=False)
+        except ValueError:
+            shm.close()
+            raise
+
+    @property
+    def retired(self):
+        return bool(self.header[_H_RETIRED])
+
+    @property
+    def token(self):
+        return int(self.header[_H_TOKEN])
+
+    def close(self):
+        if self.owner:
+            self.header[_H_RETIRED] = 1
+        for name in ("header", "symbols", "seq", "head", "ts", "price", "volume"):
+            self.__dict__.pop(name, None)
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # A caller still holds window() views; the mapping goes when they do
+        if self.owner:
+            self.shm.unlink()
+
+    # --- WRITER ---
+
+    def _slot_for_write(self, symbol):
+        idx = self._index.get(symbol)
+        if idx is None:
+            count = int(self.header[_H_COINS])
+            if count >= len(self.symbols):
+                return None
+            idx = count
+            self.symbols[idx] = symbol.encode()
+            self.header[_H_COINS] = count + 1  # Publish after the name is in place
+            self._index[symbol] = idx
+        return idx
+
+    def append(self, symbol, ts, price, volume):
+        """Appends one tick. A tick at the newest timestamp replaces it; older ones are ignored."""
+        idx = self._slot_for_write(symbol)
+        if idx is None:
+            return False
+        head = int(self.head[idx])
+        cap = self.capacity
+        if head:
+            last = (head - 1) % cap
+            if ts < self.ts[idx, last]:
+                return False
+            if ts == self.ts[idx, last]:
+                head -= 1
+        pos = head % cap
+        self.seq[idx] += 1  # Odd: write in progress
+        for column, value in ((self.ts, ts), (self.price, price), (self.volume, volume or 0.0)):
+            column[idx, pos] = value
+            column[idx, pos + cap] = value
+        self.head[idx] = head + 1
+        self.seq[idx] += 1  # Even: consistent again
+        return True
+
+    def append_rows(self, rows):
+        """Appends (ts, symbol, price, volume, change_24h) rows, as built by data_collector.tick_rows."""
+        for ts, symbol, price, volume, _ in rows:
+            self.append(symbol, ts, price, volume)
+
+    # --- READER ---
+
+    def _slot_for_read(self, symbol):
+        generation = int(self.header[_H_GENERATION])
+        if generation != self._generation:
+            self._index = {}
+            self._generation = generation
+        idx = self._index.get(symbol)
+        if idx is None:
+            count = int(self.header[_H_COINS])
+            for i in range(count):
+                self._index[self.symbols[i].decode()] = i
+            idx = self._index.get(symbol)
+        return idx
+
+    def window(self, symbol, n=None, copy=False):
+        """
+        Latest `n` ticks (all buffered if None) for `symbol` as zero-copy,
+        chronological NumPy views (ts, price, volume), or None if the coin is
+        not buffered. The views stay intact until the writer appends
+        `capacity - n` more ticks for that coin; pass copy=True to take a
+        private snapshot inside the seqlock instead.
+        """
+        idx = self._slot_for_read(symbol.upper())
+        if idx is None:
+            return None
+        cap = self.capacity
+        for _ in range(READ_RETRIES):
+            before = int(self.seq[idx])
+            if before & 1:
+                continue
+            head = int(self.head[idx])
+            count = min(head, cap) if n is None else min(n, head, cap)
+            end = head % cap + cap
+            views = (self.ts[idx, end - count:end], self.price[idx, end - count:end],
+                     self.volume[idx, end - count:end])
+            if copy:
+                views = tuple(v.copy() for v in views)
+            if int(self.seq[idx]) == before:
+                return views
+        return None
+
+    def latest(self, symbol):
+        """(ts, price, volume) of the newest buffered tick, or None."""
+        views = self.window(symbol, 1)
+        if not views or not len(views[0]):
+            return None
+        return int(views[0][0]), float(views[1][0]), float(views[2][0])
+
+
+def seed_from_db(ring, db_name, limit=None):
+    """Loads the newest `limit` ticks per coin from SQLite (collector start-up)."""
+    limit = limit or ring.capacity
+    conn = sqlite3.connect(db_name)
+    try:
+        coins = conn.execute("SELECT coin_id, symbol FROM coins ORDER BY coin_id").fetchall()
+        for coin_id, symbol in coins:
+            rows = conn.execute(
+                "SELECT ts, price, volume FROM ticks WHERE coin_id = ? ORDER BY ts DESC LIMIT ?",
+                (coin_id, limit)).fetchall()
+            for ts, price, volume in reversed(rows):
+                ring.append(symbol, ts, price, volume)
+    finally:
+        conn.close()
+
+
+_reader = None
+_reader_checked = 0.0
+
+
+def get_ring(check_interval=30):
+    """
+    This process's attached reader ring, or None while no collector has
+    created one. Every `check_interval` seconds the name is re-resolved so a
+    restarted collector's new segment is picked up.
+    """
+    global _reader, _reader_checked
+    now = time.time()
+    if _reader is not None and not _reader.retired and now - _reader_checked < check_interval:
+        return _reader
+    if _reader is None and now - _reader_checked < check_interval:
+        return None
+    _reader_checked = now
+    try:
+        fresh = TickRing.attach()
+    except (FileNotFoundError, ValueError):
+        fresh = None
+    if fresh is not None and _reader is not None and fresh.token == _reader.token and not _reader.retired:
+        fresh.close()
+        return _reader
+    if _reader is not None:
+        _reader.close()
+    _reader = fresh
+    return _reader
@@ -0,0 +1,230 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import metrics
+
+# Configuration
+TICK_STREAM_PORT = 8765
+TICK_STREAM_URL = os.getenv("TICK_STREAM_URL", f"http://127.0.0.1:{TICK_STREAM_PORT}")
+COALESCE_INTERVAL = 0.25  # Seconds; bursts inside this window collapse to the latest tick per coin
+KEEPALIVE_INTERVAL = 15   # Seconds between SSE comments on an idle stream
+
+SUBSCRIBERS = metrics.REGISTRY.gauge("tick_stream_subscribers", "Open SSE subscriptions.")
+EVENTS_SENT = metrics.REGISTRY.counter("tick_stream_events_total", "SSE tick events flushed to subscribers.")
+
+
+def tick_dict(row):
+    """(ts, symbol, price, volume, change_24h) row -> JSON-friendly dict."""
+    ts, symbol, price, volume, change = row
+    return {"symbol": symbol, "ts": ts, "price": price, "volume": volume, "change_24h": change}
+
+
+class Subscription:
+    """Per-subscriber mailbox holding only the newest tick per coin."""
+
+    def __init__(self, coins=None):
+        self.coins = {c.upper() for c in coins} if coins else None
+        self.pending = {}
+        self.cond = threading.Condition()
+
+    def offer(self, tick):
+        if self.coins is not None and tick["symbol"] not in self.coins:
+            return
+        with self.cond:
+            self.pending[tick["symbol"]] = tick
+            self.cond.notify()
+
+    def wait(self, timeout):
+        """Blocks until something is pending (or timeout); returns and clears it."""
+        with self.cond:
+            if not self.pending:
+                self.cond.wait(timeout)
+            batch, self.pending = self.pending, {}
+        return batch
+
+
+class TickHub:
+    """In-process pub/sub: the collector publishes, SSE handlers subscribe."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscriptions = set()
+        self.latest = {}
+
+    def subscribe(self, coins=None):
+        sub = Subscription(coins)
+        with self.lock:
+            self.subscriptions.add(sub)
+            SUBSCRIBERS.set(len(self.subscriptions))
+        return sub
+
+    def unsubscribe(self, sub):
+        with self.lock:
+            self.subscriptions.discard(sub)
+            SUBSCRIBERS.set(len(self.subscriptions))
+
+    def publish(self, ticks):
+        ticks = list(ticks)
+        with self.lock:
+            for tick in ticks:
+                self.latest[tick["symbol"]] = tick
+            subs = list(self.subscriptions)
+        for sub in subs:
+            for tick in ticks:
+                sub.offer(tick)
+
+    def publish_rows(self, rows):
+        self.publish(tick_dict(r) for r in rows)
+
+    def snapshot(self, coins=None):
+        with self.lock:
+            if not coins:
+                return dict(self.latest)
+            return {c: self.latest[c] for c in (s.upper() for s in coins) if c in self.latest}
+
+
+HUB = TickHub()
+
+
+# --- SSE SERVER ---
+
+class _StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def _coins(self):
+        raw = parse_qs(urlparse(self.path).query).get("coins", [""])[0]
+        return [c for c in raw.split(",") if c] or None
+
+    def _send_json(self, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/latest":
+            self._send_json(HUB.snapshot(self._coins()))
+        elif path == "/stream":
+            self._stream(self._coins())
+        else:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+    def _stream(self, coins):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        # Chunked framing lets clients read each event as soon as it is flushed
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        sub = HUB.subscribe(coins)
+        try:
+            # Late joiners get the current picture immediately
+            self._write_event(list(HUB.snapshot(coins).values()))
+            while True:
+                batch = sub.wait(KEEPALIVE_INTERVAL)
+                if batch:
+                    self._write_event(list(batch.values()))
+                    # Coalesce: ticks arriving during this pause collapse per coin
+                    time.sleep(COALESCE_INTERVAL)
+                else:
+                    self._write_chunk(b": keepalive\n\n")
+        except (BrokenPipeError, ConnectionResetError, OSError):
+            pass
+        finally:
+            HUB.unsubscribe(sub)
+
+    def _write_event(self, ticks):
+        if not ticks:
+            return
+        self._write_chunk(b"event: ticks\ndata: " + json.dumps(ticks).encode("utf-8") + b"\n\n")
+        EVENTS_SENT.inc()
+
+    def _write_chunk(self, payload):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(payload), payload))
+        self.wfile.flush()
+
+    def log_message(self, format, *args):
+        pass
+
+
+_server = None
+
+
+def start_server(port=TICK_STREAM_PORT, host="127.0.0.1"):
+    """Serves /stream (SSE, ?coins=BTC,ETH) and /latest (JSON) from a daemon thread."""
+    global _server
+    if _server is not None:
+        return _server.server_address[1]
+    try:
+        _server = ThreadingHTTPServer((host, port), _StreamHandler)
+    except OSError as e:
+        print(f"Tick stream disabled (port {port}): {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="tick-stream", daemon=True).start()
+    return _server.server_address[1]
+
+
+# --- CLIENT ---
+
+class LiveTicker:
+    """
+    Background SSE consumer holding the latest tick per coin. One instance
+    per dashboard process serves every session from memory.
+    """
+
+    def __init__(self, url=TICK_STREAM_URL, coins=None, on_ticks=None):
+        self.url = f"{url}/stream" + (f"?coins={','.join(coins)}" if coins else "")
+        self.on_ticks = on_ticks  # Optional callback(list of tick dicts), run on the ticker thread
+        self.latest = {}
+        self.connected = False
+        self.last_event = None
+        self.version = 0
+        self._thread = threading.Thread(target=self._run, name="live-ticker", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _run(self):
+        import requests
+        backoff = 1
+        while True:
+            try:
+                with requests.get(self.url, stream=True, timeout=(3, KEEPALIVE_INTERVAL * 2)) as resp:
+                    self.connected = resp.status_code == 200
+                    backoff = 1
+                    # chunk_size=None yields each chunked event as it arrives
+                    for line in resp.iter_lines(chunk_size=None, decode_unicode=True):
+                        if line and line.startswith("data: "):
+                            ticks = json.loads(line[6:])
+                            for tick in ticks:
+                                self.latest[tick["symbol"]] = tick
+                            self.last_event = time.time()
+                            self.version += 1
+                            if self.on_ticks is not None:
+                                self._dispatch(ticks)
+            except Exception:
+                pass
+            self.connected = False
+            time.sleep(backoff)
+            backoff = min(backoff * 2, 30)
+
+    def _dispatch(self, ticks):
+        try:
+            self.on_ticks(ticks)
+        except Exception as e:
+            print(f"Tick callback error: {e}")
+
+    def price(self, symbol):
+        tick = self.latest.get(symbol.upper())
+        return tick["price"] if tick else None